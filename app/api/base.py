@@ -4,20 +4,43 @@ from typing import Any, Dict, Optional
 
 import aiohttp
 
+from app.api.client import HTTPClient, http_client
+
 logger = logging.getLogger(__name__)
 
 
 class BaseAPIWrapper(ABC):
-    def __init__(self, base_url: str, timeout: int = 30) -> None:
+    """Wrappers share the pooled session of `client`, so they are cheap
+    to create and keep no connections of their own"""
+
+    def __init__(
+            self,
+            base_url: str,
+            api_key: Optional[str] = None,
+            timeout: Optional[float] = None,
+            client: HTTPClient = http_client
+    ) -> None:
         self.base_url: str = base_url.rstrip('/')
-        self.timeout: int = timeout
-        self.session: Optional[aiohttp.ClientSession] = None
+        self.api_key: Optional[str] = api_key
+        self.client: HTTPClient = client
+        # Overrides the timeout of the client for this API
+        self.timeout: Optional[aiohttp.ClientTimeout] = None
+        if timeout is not None:
+            self.timeout = aiohttp.ClientTimeout(total=timeout)
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        return self.client.session
+
+    def request(self, method: str, url: str, **kwargs: Any) -> Any:
+        """session.request with the timeout of this API, to be used as
+        `async with`"""
+        if self.timeout is not None:
+            kwargs.setdefault('timeout', self.timeout)
+        return self.session.request(method, url, **kwargs)
 
     async def __aenter__(self) -> 'BaseAPIWrapper':
         """Asynchronous Context Manager - Login"""
-        self.session = aiohttp.ClientSession(
-            timeout=aiohttp.ClientTimeout(total=self.timeout)
-        )
         return self
 
     async def __aexit__(
@@ -26,9 +49,8 @@ class BaseAPIWrapper(ABC):
             exc_val: Any,
             exc_tb: Any
     ) -> None:
-        """Asynchronous Context Manager - Exit"""
-        if self.session:
-            await self.session.close()
+        """Asynchronous Context Manager - Exit, the shared session stays
+        open"""
 
     @abstractmethod
     async def make_request(
@@ -40,9 +62,13 @@ class BaseAPIWrapper(ABC):
         """Abstract method for executing queries"""
         pass
 
-    async def get(self, endpoint: str) -> Dict[str, Any]:
+    async def get(
+            self,
+            endpoint: str,
+            data: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
         """GET queri"""
-        return await self.make_request('GET', endpoint)
+        return await self.make_request('GET', endpoint, data)
 
     async def post(
             self,
@@ -0,0 +1,126 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import (
+    Any, Awaitable, Callable, Dict, Generic, Hashable, Tuple, TypeVar
+)
+
+from app.utils.metrics import api_cache_lookups, api_cache_refresh_errors
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+HIT = 'hit'
+STALE = 'stale'
+MISS = 'miss'
+COALESCED = 'coalesced'
+
+
+class ResponseCache(Generic[T]):
+    """TTL + LRU cache of external API responses with
+    stale-while-revalidate.
+
+    A response is fresh for `ttl` seconds, then served stale for up to
+    `stale_ttl` more while one background call refreshes it. Concurrent
+    misses for a key share one upstream call, like ChatAdminCache.
+    Responses `cacheable` rejects, such as errors, are returned but not
+    kept; a failed refresh keeps the stale response until it expires.
+    """
+
+    def __init__(
+            self,
+            name: str,
+            ttl: float = 600.0,
+            stale_ttl: float = 1800.0,
+            maxsize: int = 1000,
+            cacheable: Callable[[T], bool] = lambda response: True,
+            clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        self.name: str = name
+        self.ttl: float = ttl
+        self.stale_ttl: float = stale_ttl
+        self.maxsize: int = maxsize
+        self.cacheable: Callable[[T], bool] = cacheable
+        self.clock: Callable[[], float] = clock
+        # key -> (fresh until, stale until, response)
+        self._items: 'OrderedDict[Hashable, Tuple[float, float, T]]' = (
+            OrderedDict()
+        )
+        self._loading: Dict[Hashable, asyncio.Future] = {}
+        self._lookups: Dict[str, Any] = {
+            result: api_cache_lookups.labels(name, result)
+            for result in (HIT, STALE, MISS, COALESCED)
+        }
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    async def get(self, key: Hashable,
+                  load: Callable[[], Awaitable[T]]) -> T:
+        """The cached response for `key`, calling `load` for a new one
+        when it is missing or stale"""
+        now = self.clock()
+        item = self._items.get(key)
+        if item is not None:
+            fresh_until, stale_until, response = item
+            if now < fresh_until:
+                self._items.move_to_end(key)
+                self._lookups[HIT].inc()
+                return response
+            if now < stale_until:
+                self._items.move_to_end(key)
+                self._lookups[STALE].inc()
+                if key not in self._loading:
+                    self._load(key, load)
+                return response
+            del self._items[key]
+
+        future = self._loading.get(key)
+        if future is None:
+            self._lookups[MISS].inc()
+            future = self._load(key, load)
+        else:
+            self._lookups[COALESCED].inc()
+        # A cancelled waiter must not cancel the call shared with others
+        return await asyncio.shield(future)
+
+    def invalidate(self, key: Hashable) -> None:
+        self._loading.pop(key, None)
+        self._items.pop(key, None)
+
+    def clear(self) -> None:
+        self._loading.clear()
+        self._items.clear()
+
+    def _load(self, key: Hashable,
+              load: Callable[[], Awaitable[T]]) -> asyncio.Future:
+        future = asyncio.ensure_future(load())
+        self._loading[key] = future
+        future.add_done_callback(lambda done: self._store(key, done))
+        return future
+
+    def _store(self, key: Hashable, future: asyncio.Future) -> None:
+        if self._loading.get(key) is not future:
+            # Invalidated while loading
+            return
+        del self._loading[key]
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is None and self.cacheable(future.result()):
+            now = self.clock()
+            self._items[key] = (
+                now + self.ttl, now + self.ttl + self.stale_ttl,
+                future.result()
+            )
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+        elif key in self._items:
+            api_cache_refresh_errors.labels(self.name).inc()
+            logger.warning(
+                f"Refresh of {self.name} {key} failed, serving the stale "
+                f"response: {error or future.result()}"
+            )
@@ -0,0 +1,66 @@
+import asyncio
+import logging
+from typing import Optional
+
+import aiohttp
+
+from app.data.config import HTTPConfig, config
+
+logger = logging.getLogger(__name__)
+
+
+class HTTPClient:
+    """One aiohttp session for every external API of the process.
+
+    The connector keeps connections to each host open between calls, so
+    only the first call to a host pays for the TCP and TLS handshakes,
+    and caches DNS answers. The session is opened on startup by
+    BotManager, or on first use, and closed on shutdown.
+    """
+
+    def __init__(self, settings: HTTPConfig) -> None:
+        self.settings: HTTPConfig = settings
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = self._open()
+        return self._session
+
+    def _open(self) -> aiohttp.ClientSession:
+        settings = self.settings
+        connector = aiohttp.TCPConnector(
+            limit=settings.pool_size,
+            limit_per_host=settings.pool_size_per_host,
+            keepalive_timeout=settings.keepalive_timeout,
+            ttl_dns_cache=settings.dns_cache_ttl,
+            use_dns_cache=settings.dns_cache_ttl > 0,
+        )
+        return aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(
+                total=settings.timeout, connect=settings.connect_timeout
+            )
+        )
+
+    async def start(self) -> None:
+        """Opens the session ahead of the first call"""
+        if self._session is None or self._session.closed:
+            self._session = self._open()
+        logger.info(
+            f"HTTP client ready: {self.settings.pool_size} connections, "
+            f"{self.settings.pool_size_per_host} per host"
+        )
+
+    async def close(self) -> None:
+        if self._session is None or self._session.closed:
+            return
+        await self._session.close()
+        # Lets the transports of TLS connections close before the loop
+        # does, see the aiohttp docs on graceful shutdown
+        await asyncio.sleep(0.25)
+        self._session = None
+
+
+http_client = HTTPClient(config.http)
@@ -1,5 +1,6 @@
 import logging
-from typing import Dict, Any
+import time
+from typing import Any, Dict, Optional
 
 from app.api.base import BaseAPIWrapper
 from app.data.config import config
@@ -8,29 +9,51 @@ logger = logging.getLogger(__name__)
 
 
 class CurrencyAPIWrapper(BaseAPIWrapper):
-    def __init__(self, api_key: str = None):
+    def __init__(self, api_key: Optional[str] = None):
         super().__init__(
             api_key=api_key or config.api.currency_api_key,
             base_url="https://api.exchangerate-api.com/v4"
         )
 
     async def make_request(self, method: str, endpoint: str,
-                           data: Dict[str, Any] = None) -> Dict[str, Any]:
+                           data: Optional[Dict[str, Any]] = None
+                           ) -> Dict[str, Any]:
         """Make a request to the Currencies API"""
         try:
-            url = f"{self.base_url}/{endpoint}"
-            params = data or {}
+            url = self.build_url(endpoint)
+            params = dict(data or {})
 
-            async with self.session.request(method, url, params=params) as response:
+            async with self.request(method, url, params=params) as response:
                 if response.status == 200:
                     return await response.json()
                 else:
                     return {'error': f'HTTP {response.status}'}
         except Exception as e:
-            return self.handle_error(e)
-
-    async def get_exchange_rate(self, from_currency: str, to_currency: str) -> Dict[str, Any]:
-        return await self.get(f"latest/{from_currency.upper()}")
+            return await self.handle_error(e)
+
+    async def get_exchange_rate(self, from_currency: str,
+                                to_currency: str) -> Dict[str, Any]:
+        """Rate of the pair from the snapshot currency_rates keeps; the
+        API is asked only while no rates are loaded yet"""
+        # app.api.rates builds on this module
+        from app.api.rates import currency_rates
+
+        if currency_rates.snapshot is None:
+            await currency_rates.refresh()
+        snapshot = currency_rates.snapshot
+        if snapshot is None:
+            return {'error': 'Currency rates are not loaded yet'}
+        source, target = from_currency.upper(), to_currency.upper()
+        if source not in snapshot or target not in snapshot:
+            return {'error': f'Unknown currency: {source} or {target}'}
+        return {
+            'base': source,
+            'target': target,
+            'rate': snapshot.rate(source, target),
+            'date': time.strftime(
+                '%Y-%m-%d', time.gmtime(snapshot.updated_at)
+            ),
+        }
 
     async def get_currencies(self) -> Dict[str, Any]:
         return await self.get("latest/USD")
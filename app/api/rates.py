@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import time
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.api.currency import CurrencyAPIWrapper
+from app.data.config import config
+from app.utils.metrics import currency_refresh_errors
+
+logger = logging.getLogger(__name__)
+
+
+class RatesSnapshot:
+    """Exchange rates of one payload as a matrix of cross rates.
+
+    Row i, column j holds the units of currency j one unit of currency i
+    buys, in one flat array of doubles: a conversion is two dict lookups
+    and a multiplication. The snapshot is never changed, a refresh
+    builds a new one.
+    """
+
+    __slots__ = ('codes', 'index', 'matrix', 'fetched_at', 'updated_at')
+
+    def __init__(self, rates: Dict[str, float], fetched_at: float,
+                 updated_at: Optional[float] = None) -> None:
+        codes = sorted(code for code, rate in rates.items() if rate > 0)
+        if not codes:
+            raise ValueError("No rates in the payload")
+        per_base = [float(rates[code]) for code in codes]
+        self.codes: Tuple[str, ...] = tuple(codes)
+        self.index: Dict[str, int] = {
+            code: i for i, code in enumerate(codes)
+        }
+        self.matrix: array = array('d', [
+            to / source for source in per_base for to in per_base
+        ])
+        # When the payload was received and when the provider last
+        # updated it, Unix time
+        self.fetched_at: float = fetched_at
+        self.updated_at: float = updated_at or fetched_at
+
+    def __contains__(self, code: str) -> bool:
+        return code in self.index
+
+    def rate(self, source: str, target: str) -> float:
+        """Units of `target` per unit of `source`, KeyError for an
+        unknown code"""
+        return self.matrix[
+            self.index[source] * len(self.codes) + self.index[target]
+        ]
+
+    def convert(self, amount: float, source: str, target: str) -> float:
+        return amount * self.rate(source, target)
+
+    def convert_many(self, amount: float, source: str,
+                     targets: Iterable[str]) -> List[float]:
+        """`amount` of `source` in every currency of `targets`"""
+        n = len(self.codes)
+        row = self.index[source] * n
+        index, matrix = self.index, self.matrix
+        return [amount * matrix[row + index[target]] for target in targets]
+
+
+class CurrencyRates:
+    """Keeps a snapshot of all exchange rates, refreshed every `interval`
+    seconds in the background.
+
+    One payload for a base currency is enough for every pair, so
+    conversions never wait for the API. A failed refresh keeps the
+    previous snapshot and is retried after `retry_interval`; replies
+    show how old the rates are.
+    """
+
+    def __init__(
+            self,
+            api: CurrencyAPIWrapper,
+            base: str = 'USD',
+            interval: float = 3600.0,
+            retry_interval: float = 60.0
+    ) -> None:
+        self.api: CurrencyAPIWrapper = api
+        self.base: str = base
+        self.interval: float = interval
+        self.retry_interval: float = retry_interval
+        self.snapshot: Optional[RatesSnapshot] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def age(self) -> Optional[float]:
+        """Seconds since the provider updated the rates"""
+        if self.snapshot is None:
+            return None
+        return max(0.0, time.time() - self.snapshot.updated_at)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def refresh(self) -> bool:
+        """Fetches the rates, keeping the snapshot on failure"""
+        payload = await self.api.get(f"latest/{self.base}")
+        try:
+            if 'error' in payload:
+                raise ValueError(payload['error'])
+            snapshot = RatesSnapshot(
+                payload['rates'],
+                fetched_at=time.time(),
+                updated_at=payload.get('time_last_updated')
+            )
+        except (KeyError, TypeError, ValueError) as e:
+            currency_refresh_errors.inc()
+            logger.warning(
+                f"Failed to refresh currency rates, keeping the previous "
+                f"ones: {e}"
+            )
+            return False
+        self.snapshot = snapshot
+        logger.debug(f"Loaded rates of {len(snapshot.codes)} currencies")
+        return True
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                refreshed = await self.refresh()
+            except Exception as e:
+                logger.error(f"Currency rates refresh crashed: {e}")
+                refreshed = False
+            await asyncio.sleep(
+                self.interval if refreshed else self.retry_interval
+            )
+
+
+currency_rates = CurrencyRates(
+    CurrencyAPIWrapper(),
+    base=config.api.currency_base,
+    interval=config.api.currency_refresh_interval,
+    retry_interval=config.api.currency_retry_interval
+)
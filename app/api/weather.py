@@ -1,37 +1,68 @@
 import logging
-from typing import Dict, Any
+from typing import Any, Dict, Optional
 
 from app.api.base import BaseAPIWrapper
+from app.api.cache import ResponseCache
 from app.data.config import config
 
 logger = logging.getLogger(__name__)
 
 
+def normalize_city(city: str) -> str:
+    """'  москва ' and 'Москва' are one cache entry"""
+    return ' '.join(city.split()).casefold()
+
+
 class WeatherAPIWrapper(BaseAPIWrapper):
-    def __init__(self, api_key: str = None):
+    """Weather and forecasts share one response cache keyed by the
+    endpoint, the normalized city and the units"""
+
+    def __init__(self, api_key: Optional[str] = None,
+                 cache: Optional[ResponseCache] = None):
         super().__init__(
             api_key=api_key or config.api.weather_api_key,
             base_url="https://api.openweathermap.org/data/2.5"
         )
+        if cache is None:
+            cache = ResponseCache(
+                'weather',
+                ttl=config.api.weather_cache_ttl,
+                stale_ttl=config.api.weather_cache_stale,
+                maxsize=config.api.weather_cache_size,
+                # Errors and unknown cities are asked again next time
+                cacheable=lambda response: 'error' not in response
+            )
+        self.cache: ResponseCache = cache
 
     async def make_request(self, method: str, endpoint: str,
-                           data: Dict[str, Any] = None) -> Dict[str, Any]:
+                           data: Optional[Dict[str, Any]] = None
+                           ) -> Dict[str, Any]:
         """Make a request to the Weather API"""
         try:
-            url = f"{self.base_url}/{endpoint}"
-            params = data or {}
+            url = self.build_url(endpoint)
+            params = dict(data or {})
             params['appid'] = self.api_key
 
-            async with self.session.request(method, url, params=params) as response:
+            async with self.request(method, url, params=params) as response:
                 if response.status == 200:
                     return await response.json()
                 else:
                     return {'error': f'HTTP {response.status}'}
         except Exception as e:
-            return self.handle_error(e)
+            return await self.handle_error(e)
+
+    async def _cached(self, endpoint: str, city: str,
+                      units: str) -> Dict[str, Any]:
+        city = normalize_city(city)
+        return await self.cache.get(
+            (endpoint, city, units),
+            lambda: self.get(endpoint, {'q': city, 'units': units})
+        )
 
-    async def get_weather(self, city: str) -> Dict[str, Any]:
-        return await self.get('weather', {'q': city, 'units': 'metric'})
+    async def get_weather(self, city: str,
+                          units: str = 'metric') -> Dict[str, Any]:
+        return await self._cached('weather', city, units)
 
-    async def get_forecast(self, city: str) -> Dict[str, Any]:
-        return await self.get('forecast', {'q': city, 'units': 'metric'})
+    async def get_forecast(self, city: str,
+                           units: str = 'metric') -> Dict[str, Any]:
+        return await self._cached('forecast', city, units)
@@ -1,98 +1,279 @@
-import logging
-from datetime import datetime
-from typing import List, Optional
-
-from aiogram import Bot, Dispatcher, types
-from aiogram.utils import executor
-
-from app.data.config import config
-from loader import bot, dp
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+import os
+import sys
+
+# Enabled before the other imports, so that it times them; the imports
+# below are deliberately late
+from app.utils.profiling import startup_profiler
+
+startup_profiler.enable_from(sys.argv, os.environ)
+
+import asyncio  # noqa: E402
+import logging  # noqa: E402
+from dataclasses import replace  # noqa: E402
+from datetime import datetime  # noqa: E402
+from typing import TYPE_CHECKING, List, Optional, Union  # noqa: E402
+
+from aiogram import Dispatcher, types  # noqa: E402
+from aiogram.utils import executor  # noqa: E402
+from aiogram.utils.executor import Executor  # noqa: E402
+
+from app.api.client import http_client  # noqa: E402
+from app.api.rates import currency_rates  # noqa: E402
+from app.data.config import LoggingConfig, config  # noqa: E402
+from app.database import (  # noqa: E402
+    activity_buffer, broadcast, db_executor, user_changes, users
 )
+from app.models import User  # noqa: E402
+from app.utils.broadcast import Broadcaster  # noqa: E402
+from app.utils.metrics import start_metrics_server  # noqa: E402
+from app.utils.misc.logging import setup_logging, stop_logging  # noqa: E402
+from app.utils.misc.shutdown import ShutdownReport  # noqa: E402
+from app.utils.misc.updates import describe_update  # noqa: E402
+from app.utils.misc.webhook import TelegramWebhookHandler  # noqa: E402
+from app.utils.outbound import ScheduledBot  # noqa: E402
+from app.utils.polling import OffsetStore, Poller  # noqa: E402
+from app.utils.scheduling import ChatOrderedDispatcher  # noqa: E402
+from app.supervisor import Supervisor, worker_socket  # noqa: E402
+from app.utils.sharding.worker import ShardWorker  # noqa: E402
+from loader import bot, dp  # noqa: E402
+
+if TYPE_CHECKING:
+    from app.middleware.throttling import ThrottlingMiddleware
+
 logger = logging.getLogger(__name__)
 
-
-def setup_logging() -> None:
-    logging.basicConfig(
-        level=getattr(logging, config.logging.level.upper()),
-        format=config.logging.format,
-        handlers=[
-            logging.FileHandler(config.logging.file),
-            logging.StreamHandler()
-        ]
-    )
+# Seconds queued updates get to finish on shutdown
+DRAIN_TIMEOUT = 10.0
+
+# Configuring allowed_updates for aiogram 2.x
+ALLOWED_UPDATES: List[str] = [
+    'message',
+    'edited_message',
+    'channel_post',
+    'edited_channel_post',
+    'inline_query',
+    'chosen_inline_result',
+    'callback_query',
+    'shipping_query',
+    'pre_checkout_query',
+    'poll',
+    'poll_answer',
+    'my_chat_member',
+    'chat_member',
+    'chat_join_request'
+]
 
 
 class BotManager:
-    def __init__(self, bot: Bot, dp: Dispatcher) -> None:
-        self.bot: Bot = bot
+    def __init__(self, bot: ScheduledBot, dp: Dispatcher) -> None:
+        self.bot: ScheduledBot = bot
         self.dp: Dispatcher = dp
         self.start_time: Optional[datetime] = None
+        self.throttling: Optional['ThrottlingMiddleware'] = None
+        # Polling or the shard worker, whichever feeds the dispatcher
+        self.intake: Optional[Union[Poller, ShardWorker]] = None
+        # Background import of the lazy command modules
+        self.warm_up: Optional[asyncio.Task] = None
+        self.broadcaster: Optional[Broadcaster] = None
+        # Background build of the broadcast segments
+        self.segments: Optional[asyncio.Task] = None
 
     async def on_startup(self, dp: Dispatcher) -> None:
         self.start_time = datetime.now()
         logger.info("Bot starting up...")
+        profile = startup_profiler.phase
 
         try:
-            await self.register_handlers()
-            logger.info("Handlers registered successfully")
-
-            await self.setup_middleware()
-            logger.info("Middleware setup completed")
-
-            await self.setup_filters()
-            logger.info("Filters setup completed")
-
-            await self.setup_error_handlers()
-            logger.info("Error handlers setup completed")
+            with profile('BotManager.on_startup'):
+                activity_buffer.start()
+                await http_client.start()
+                if config.api.currency_refresh_interval > 0:
+                    currency_rates.start()
+
+                if config.metrics.enabled:
+                    port = config.metrics.port
+                    if config.sharding.is_worker:
+                        port += config.sharding.worker_index
+                    with profile('metrics server'):
+                        start_metrics_server(port)
+
+                with profile('register_handlers'):
+                    await self.register_handlers()
+                logger.info("Handlers registered successfully")
+
+                with profile('setup_middleware'):
+                    await self.setup_middleware()
+                logger.info("Middleware setup completed")
+
+                with profile('setup_filters'):
+                    await self.setup_filters()
+                logger.info("Filters setup completed")
+
+                with profile('setup_error_handlers'):
+                    await self.setup_error_handlers()
+                logger.info("Error handlers setup completed")
+
+                with profile('setup_broadcast'):
+                    await self.setup_broadcast()
+
+                # Sharded workers get updates from the supervisor
+                if config.bot.use_webhook and not config.sharding.is_worker:
+                    with profile('setup_webhook'):
+                        await self.setup_webhook()
+
+                # Runs once updates are flowing, startup does not wait
+                if config.handlers.lazy and config.handlers.warmup_delay >= 0:
+                    self.warm_up = asyncio.create_task(
+                        self.dp.message_handlers.warm_up(
+                            config.handlers.warmup_delay
+                        )
+                    )
 
             logger.info(f"Bot started successfully at {self.start_time}")
 
         except Exception as e:
             logger.error(f"Error during startup: {e}")
             raise
+        finally:
+            startup_profiler.finish()
 
     async def on_shutdown(self, dp: Dispatcher) -> None:
+        """Drains the work in progress, then closes resources in order.
+
+        Polling and shard workers stop reading on the signal and the
+        webhook server closes its socket before this runs. Updates
+        already received get until DRAIN_TIMEOUT to finish while the bot
+        session is still open for their replies; buffered writes go to
+        the database before its connections close.
+        """
         logger.info("Bot shutting down...")
+        report = ShutdownReport(DRAIN_TIMEOUT)
 
         try:
-            # Closing Connections
-            await self.bot.session.close()
-            logger.info("Bot session closed")
-
-            # Additional cleaning if needed
+            with report.stage('intake'):
+                if self.intake:
+                    self.intake.stop()
+                if self.warm_up:
+                    self.warm_up.cancel()
+                if self.segments:
+                    self.segments.cancel()
+
+            # Sends in flight finish while the outbound scheduler still
+            # runs, the rest of the broadcast resumes on the next start
+            with report.stage('broadcast'):
+                if self.broadcaster:
+                    await self.broadcaster.close(timeout=report.remaining())
+
+            with report.stage('updates') as stage:
+                if isinstance(self.dp, ChatOrderedDispatcher):
+                    pending = self.dp.pending
+                    stage.aborted = await self.dp.close(
+                        timeout=report.remaining()
+                    )
+                    stage.drained = pending - stage.aborted
+                    # Done by now, saves the polling offset
+                    if self.intake:
+                        await self.intake.close(timeout=report.remaining())
+                elif self.intake:
+                    in_flight = self.intake.in_flight
+                    stage.aborted = await self.intake.close(
+                        timeout=report.remaining()
+                    )
+                    stage.drained = in_flight - stage.aborted
+
+            # Replies of the handlers above are queued here until
+            # their rate limit budget allows
+            with report.stage('outbound') as stage:
+                if self.bot.outbound:
+                    pending = self.bot.outbound.pending
+                    stage.aborted = await self.bot.outbound.close(
+                        timeout=report.remaining()
+                    )
+                    stage.drained = pending - stage.aborted
+
+            # After the handlers, which may still call external APIs
+            with report.stage('http client'):
+                await currency_rates.close()
+                await http_client.close()
+
+            with report.stage('throttling'):
+                if self.throttling:
+                    await self.throttling.close()
+
+            with report.stage('bot session'):
+                await self.bot.session.close()
+
+            with report.stage('activity buffer') as stage:
+                stage.drained = await activity_buffer.stop()
+                stage.aborted = activity_buffer.pending
+
+            with report.stage('database'):
+                await db_executor.close(User._meta.database)
+
+            report.log()
             if self.start_time:
                 uptime = datetime.now() - self.start_time
                 logger.info(f"Bot stopped. Uptime: {uptime}")
 
         except Exception as e:
             logger.error(f"Error during shutdown: {e}")
+        finally:
+            # Last step, so every record above reaches the log file
+            stop_logging()
+
+    async def setup_webhook(self) -> None:
+        """Points Telegram to WEBHOOK_URL, last so that updates arrive
+        only when everything is ready"""
+        await self.bot.set_webhook(
+            config.bot.webhook_url,
+            allowed_updates=ALLOWED_UPDATES,
+            max_connections=config.bot.webhook_max_connections,
+            secret_token=config.bot.webhook_secret,
+            # Updates queued while the bot restarted are kept by default
+            drop_pending_updates=config.polling.skip_updates
+        )
+        logger.info(f"Webhook set to {config.bot.webhook_url}")
+
+    async def setup_broadcast(self) -> None:
+        """Resumes the broadcast a restart interrupted, in one process
+        only when sharded"""
+        from app.handlers.users.message.commands.broadcast import (
+            broadcast_handler
+        )
+
+        await broadcast.setup()
+        self.broadcaster = broadcast_handler.broadcaster
+        # Built ahead of the first broadcast, which would wait for it
+        self.segments = asyncio.create_task(
+            broadcast.segment_index.refresh()
+        )
+        if config.sharding.is_worker and config.sharding.worker_index != 0:
+            return
+        self.broadcaster.resume(self.bot)
 
     async def register_handlers(self) -> None:
         try:
-            from app.handlers.users.message.commands.start import StartCommandHandler
-            from app.handlers.users.message.commands.profile import ProfileCommandHandler
-            from app.handlers.users.message.commands.ban_user import BanUserCommandHandler
-            from app.handlers.users.message.commands.unban_user import UnbanUserCommandHandler
-            from app.handlers.users.message.commands.warn_user import WarnUserCommandHandler
-            from app.handlers.users.message.commands.weather import WeatherCommandHandler
-            from app.handlers.users import EchoMessageHandler
-
-            # Creating handler instances for automatic registration
-            handlers: List[object] = [
-                StartCommandHandler(self.dp),
-                ProfileCommandHandler(self.dp),
-                BanUserCommandHandler(self.dp),
-                UnbanUserCommandHandler(self.dp),
-                WarnUserCommandHandler(self.dp),
-                WeatherCommandHandler(self.dp),
-                EchoMessageHandler(self.dp),
-            ]
-
-            logger.info(f"Registered {len(handlers)} handlers")
+            # Handler modules register themselves on import, a second
+            # instance here would only add a copy the router skips
+            from app.handlers import groups, users  # noqa: F401
+            from app.handlers.groups.chat_member import ChatMemberUpdateHandler
+            from app.handlers.users.message import commands
+
+            if config.handlers.lazy:
+                self.dp.message_handlers.lazy(commands.manifest())
+                commands.load_eager()
+                logger.info(
+                    f"Declared {len(commands.COMMANDS)} lazy commands"
+                )
+            else:
+                commands.load_all()
+
+            ChatMemberUpdateHandler(self.dp)
+
+            logger.info(
+                f"Registered {len(self.dp.message_handlers.handlers)} "
+                f"message handlers"
+            )
 
         except Exception as e:
             logger.error(f"Error registering handlers: {e}")
@@ -100,13 +281,14 @@ class BotManager:
 
     async def setup_middleware(self) -> None:
         try:
-            from app.middleware import LoggingMiddleware
-            from app.middleware.throttling import ThrottlingMiddleware
             from app.middleware.admin import AdminMiddleware
             from app.middleware.database import DatabaseMiddleware
+            from app.middleware.logging import LoggingMiddleware
+            from app.middleware.throttling import ThrottlingMiddleware
 
             self.dp.middleware.setup(LoggingMiddleware())
-            self.dp.middleware.setup(ThrottlingMiddleware(rate_limit=0.5))
+            self.throttling = ThrottlingMiddleware()
+            self.dp.middleware.setup(self.throttling)
             self.dp.middleware.setup(AdminMiddleware())
             self.dp.middleware.setup(DatabaseMiddleware())
 
@@ -129,8 +311,12 @@ class BotManager:
                     update: types.Update,
                     exception: Exception
             ) -> bool:
-                logger.error(f"Update: {update}")
-                logger.error(f"Exception: {exception}")
+                logger.error(
+                    f"Error handling {describe_update(update)}: "
+                    f"{type(exception).__name__}: {exception}"
+                )
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(f"Update: {update}")
                 return True
 
             logger.info("Error handlers setup completed")
@@ -141,33 +327,106 @@ class BotManager:
 
 bot_manager = BotManager(bot, dp)
 
-setup_logging()
 
-if __name__ == '__main__':
-    logger.info("Starting bot...")
-
-    # Configuring allowed_updates for aiogram 2.x
-    allowed_updates = [
-        'message',
-        'edited_message',
-        'channel_post',
-        'edited_channel_post',
-        'inline_query',
-        'chosen_inline_result',
-        'callback_query',
-        'shipping_query',
-        'pre_checkout_query',
-        'poll',
-        'poll_answer',
-        'my_chat_member',
-        'chat_member',
-        'chat_join_request'
-    ]
-
-    executor.start_polling(
-        dispatcher=dp,
+def logging_settings() -> LoggingConfig:
+    """Workers log to their own file, rotation is not safe across
+    processes"""
+    if not config.sharding.is_worker:
+        return config.logging
+    root, ext = os.path.splitext(config.logging.file)
+    return replace(
+        config.logging,
+        file=f'{root}.worker-{config.sharding.worker_index}{ext}'
+    )
+
+
+setup_logging(logging_settings())
+
+
+def start_webhook() -> None:
+    """Serves updates on WEBHOOK_HOST:WEBHOOK_PORT.
+
+    The webhook is left in place on shutdown, so Telegram keeps the
+    updates that arrive while the bot restarts.
+    """
+    runner = Executor(dp)
+    runner.on_startup(bot_manager.on_startup)
+    runner.on_shutdown(bot_manager.on_shutdown)
+    runner.start_webhook(
+        webhook_path=config.bot.webhook_path,
+        request_handler=TelegramWebhookHandler,
+        host=config.bot.webhook_host,
+        port=config.bot.webhook_port,
+        # A line per update; LoggingMiddleware already logs them
+        access_log=None
+    )
+
+
+def start_polling() -> None:
+    """Long polling that resumes from the saved offset after a restart"""
+    poller = Poller(
+        dp,
+        store=OffsetStore(config.polling.offset_file),
+        allowed_updates=ALLOWED_UPDATES,
+        timeout=config.polling.timeout,
+        max_in_flight=config.polling.max_in_flight,
+        skip_updates=config.polling.skip_updates
+    )
+    bot_manager.intake = poller
+    executor.start(
+        dp,
+        poller.run(),
+        on_startup=bot_manager.on_startup,
+        on_shutdown=bot_manager.on_shutdown
+    )
+
+
+def start_worker() -> None:
+    """Serves the shard given by SHARD_WORKER_INDEX"""
+    worker = ShardWorker(
+        dp,
+        worker_socket(config.sharding.worker_index),
+        on_event=lambda event: users.forget(event.get('users', ()))
+    )
+    # Users changed here are dropped from the caches of the other workers
+    user_changes.publish = lambda user_ids: worker.publish(
+        {'users': user_ids}
+    )
+    bot_manager.intake = worker
+    executor.start(
+        dp,
+        worker.serve(),
         on_startup=bot_manager.on_startup,
-        on_shutdown=bot_manager.on_shutdown,
-        allowed_updates=allowed_updates,
-        skip_updates=True
+        on_shutdown=bot_manager.on_shutdown
     )
+
+
+def start_supervisor() -> None:
+    supervisor = Supervisor(bot, config.sharding.workers, ALLOWED_UPDATES)
+    try:
+        asyncio.run(supervisor.run())
+    finally:
+        stop_logging()
+
+
+if __name__ == '__main__':
+    sharded = config.sharding.is_worker or config.sharding.workers > 1
+    if sharded and config.dispatcher.mode != 'ordered':
+        # A worker gets the updates of a chat in order, only the ordered
+        # dispatcher handles them in that order
+        sys.exit("WORKERS above 1 requires DISPATCH_MODE=ordered")
+
+    if config.sharding.is_worker:
+        logger.info(f"Starting worker {config.sharding.worker_index}...")
+        start_worker()
+    elif config.sharding.workers > 1:
+        logger.info(
+            f"Starting supervisor with {config.sharding.workers} workers..."
+        )
+        start_supervisor()
+    elif config.bot.use_webhook:
+        logger.info("Starting bot...")
+        start_webhook()
+    else:
+        logger.info("Starting bot...")
+        start_polling()
@@ -1,6 +1,6 @@
 import os
 from dataclasses import dataclass
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 
 from dotenv import load_dotenv
 
@@ -16,6 +16,13 @@ class DatabaseConfig:
     username: Optional[str] = os.getenv('DB_USERNAME')
     password: Optional[str] = os.getenv('DB_PASSWORD')
     name: Optional[str] = os.getenv('DB_NAME')
+    # Threads running ORM calls; SQLite always uses a single writer thread
+    pool_size: int = int(os.getenv('DB_POOL_SIZE', '4'))
+    # Write-behind of activity timestamps and stats counters
+    flush_interval: float = float(os.getenv('DB_FLUSH_INTERVAL', '5'))
+    flush_size: int = int(os.getenv('DB_FLUSH_SIZE', '1000'))
+    user_cache_size: int = int(os.getenv('USER_CACHE_SIZE', '10000'))
+    user_cache_ttl: float = float(os.getenv('USER_CACHE_TTL', '60'))
 
 
 @dataclass
@@ -34,6 +41,12 @@ class LoggingConfig:
     format: str = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
     max_size: int = int(os.getenv('LOG_MAX_SIZE', '10485760'))  # 10MB
     backup_count: int = int(os.getenv('LOG_BACKUP_COUNT', '5'))
+    json: bool = os.getenv('LOG_JSON', 'false').lower() == 'true'
+    sample_rate: float = float(os.getenv('LOG_SAMPLE_RATE', '1.0'))
+    rate_limit: int = int(os.getenv('LOG_RATE_LIMIT', '20'))
+    logger_rate_limit: int = int(os.getenv('LOG_LOGGER_RATE_LIMIT', '0'))
+    rate_period: float = float(os.getenv('LOG_RATE_PERIOD', '60'))
+    slow_request: float = float(os.getenv('LOG_SLOW_REQUEST', '1.0'))
 
 
 @dataclass
@@ -54,12 +67,27 @@ class BotConfig:
 
     webhook_url: Optional[str] = os.getenv('WEBHOOK_URL')
     webhook_path: str = os.getenv('WEBHOOK_PATH', '/webhook')
+    webhook_host: str = os.getenv('WEBHOOK_HOST', '0.0.0.0')
     webhook_port: int = int(os.getenv('WEBHOOK_PORT', '8000'))
+    webhook_secret: Optional[str] = os.getenv('WEBHOOK_SECRET') or None
+    webhook_max_connections: int = int(
+        os.getenv('WEBHOOK_MAX_CONNECTIONS', '40')
+    )
+
+    @property
+    def use_webhook(self) -> bool:
+        """Webhook mode is on when WEBHOOK_URL is set"""
+        return bool(self.webhook_url)
 
 
 @dataclass
 class AdminConfig:
     owner_ids: List[int] = None
+    # Cached admin lists of group chats used by AdminOrOwnerFilter
+    chat_admins_ttl: float = float(os.getenv('CHAT_ADMINS_TTL', '300'))
+    chat_admins_cache_size: int = int(
+        os.getenv('CHAT_ADMINS_CACHE_SIZE', '10000')
+    )
 
     def __post_init__(self):
         if self.owner_ids is None:
@@ -72,6 +100,176 @@ class AdminConfig:
                 self.owner_ids = []
 
 
+@dataclass
+class ThrottlingConfig:
+    backend: str = os.getenv('THROTTLE_BACKEND', 'memory')
+    redis_timeout: float = float(os.getenv('THROTTLE_REDIS_TIMEOUT', '0.05'))
+    strategy: str = os.getenv('THROTTLE_STRATEGY', 'sliding_window')
+    user_limit: int = int(os.getenv('THROTTLE_USER_LIMIT', '2'))
+    user_period: float = float(os.getenv('THROTTLE_USER_PERIOD', '1'))
+    chat_limit: int = int(os.getenv('THROTTLE_CHAT_LIMIT', '20'))
+    chat_period: float = float(os.getenv('THROTTLE_CHAT_PERIOD', '60'))
+    max_keys: int = int(os.getenv('THROTTLE_MAX_KEYS', '100000'))
+    # command -> (limit, period), e.g. THROTTLE_COMMAND_LIMITS=weather:3/60
+    command_limits: Dict[str, Tuple[int, float]] = None
+
+    def __post_init__(self):
+        if self.command_limits is None:
+            self.command_limits = {}
+            for item in os.getenv('THROTTLE_COMMAND_LIMITS', '').split(','):
+                if not item.strip():
+                    continue
+                command, rate = item.split(':')
+                limit, period = rate.split('/')
+                self.command_limits[command.strip().lower()] = (
+                    int(limit), float(period)
+                )
+
+
+@dataclass
+class MetricsConfig:
+    enabled: bool = os.getenv('ENABLE_METRICS', 'false').lower() == 'true'
+    port: int = int(os.getenv('METRICS_PORT', '9090'))
+
+
+@dataclass
+class PollingConfig:
+    # Long polling timeout of getUpdates, seconds
+    timeout: int = int(os.getenv('POLL_TIMEOUT', '25'))
+    # Fetched updates not handled yet above which polling pauses
+    max_in_flight: int = int(os.getenv('POLL_MAX_IN_FLIGHT', '10000'))
+    # Offset to resume from after a restart
+    offset_file: str = os.getenv('POLL_OFFSET_FILE', 'data/polling_offset')
+    # Drop updates that arrived while the bot was down, in webhook mode
+    # too
+    skip_updates: bool = os.getenv(
+        'POLL_SKIP_UPDATES', 'false'
+    ).lower() == 'true'
+
+
+@dataclass
+class DispatcherConfig:
+    # 'ordered': updates of a chat run one by one, chats run in parallel;
+    # 'default': aiogram's task per update without ordering
+    mode: str = os.getenv('DISPATCH_MODE', 'ordered')
+    concurrency: int = int(os.getenv('DISPATCH_CONCURRENCY', '64'))
+    # Admission control of the ordered mode: plain messages are shed
+    # while the backlog is between the watermarks, everything above
+    # max_pending; messages older than max_age seconds are never handled
+    high_watermark: int = int(os.getenv('DISPATCH_HIGH_WATERMARK', '5000'))
+    low_watermark: int = int(os.getenv('DISPATCH_LOW_WATERMARK', '1000'))
+    max_pending: int = int(os.getenv('DISPATCH_MAX_PENDING', '20000'))
+    max_age: float = float(os.getenv('DISPATCH_MAX_AGE', '60'))
+    # Chats in an FSM scenario are classified as such for state_ttl
+    # seconds after their last state change, at most state_maxsize
+    state_ttl: float = float(os.getenv('DISPATCH_STATE_TTL', '86400'))
+    state_maxsize: int = int(os.getenv('DISPATCH_STATE_MAXSIZE', '100000'))
+    # Turns per round of each scheduling class, e.g. 'admin:8,text:1';
+    # classes not listed keep their defaults
+    weights: Dict[str, int] = None
+
+    def __post_init__(self):
+        if self.weights is None:
+            self.weights = {}
+            for item in os.getenv('DISPATCH_WEIGHTS', '').split(','):
+                if item.strip():
+                    name, weight = item.split(':')
+                    self.weights[name.strip()] = int(weight)
+
+
+@dataclass
+class ShardingConfig:
+    # Worker processes; above 1 bot.py starts the supervisor
+    workers: int = int(os.getenv('WORKERS', '1'))
+    socket_dir: str = os.getenv('SHARD_SOCKET_DIR', '/tmp/aiogram-bot-shards')
+    # Frames buffered per worker before the ingress waits
+    queue_size: int = int(os.getenv('SHARD_QUEUE_SIZE', '10000'))
+    # Set by the supervisor in the environment of each worker
+    worker_index: Optional[int] = (
+        int(os.environ['SHARD_WORKER_INDEX'])
+        if os.getenv('SHARD_WORKER_INDEX') else None
+    )
+
+    @property
+    def is_worker(self) -> bool:
+        return self.worker_index is not None
+
+
+@dataclass
+class OutboundConfig:
+    # Send through the rate limiting scheduler
+    enabled: bool = os.getenv('OUTBOUND_ENABLED', 'true').lower() == 'true'
+    # Messages per second for the whole bot, split between shard workers
+    global_rate: float = float(os.getenv('OUTBOUND_GLOBAL_RATE', '30'))
+    # Messages per second to one private chat and the burst allowed
+    chat_rate: float = float(os.getenv('OUTBOUND_CHAT_RATE', '1'))
+    chat_burst: float = float(os.getenv('OUTBOUND_CHAT_BURST', '3'))
+    # Messages per minute to one group or channel
+    group_rate: float = float(os.getenv('OUTBOUND_GROUP_RATE', '20'))
+    # Retries of a send answered with RetryAfter
+    max_retries: int = int(os.getenv('OUTBOUND_MAX_RETRIES', '3'))
+
+
+@dataclass
+class BroadcastConfig:
+    # Sends in flight at once, the outbound scheduler sets the pace
+    concurrency: int = int(os.getenv('BROADCAST_CONCURRENCY', '20'))
+    # Recipient ids read per query
+    page_size: int = int(os.getenv('BROADCAST_PAGE_SIZE', '1000'))
+    # Seconds between checkpoints and progress updates for the admin
+    interval: float = float(os.getenv('BROADCAST_INTERVAL', '5'))
+    checkpoint_file: str = os.getenv(
+        'BROADCAST_CHECKPOINT_FILE', 'data/broadcast.json'
+    )
+
+
+@dataclass
+class HTTPConfig:
+    # Connections open at once to all external APIs and to one host
+    pool_size: int = int(os.getenv('HTTP_POOL_SIZE', '100'))
+    pool_size_per_host: int = int(os.getenv('HTTP_POOL_SIZE_PER_HOST', '10'))
+    # Seconds an idle connection stays open for the next call
+    keepalive_timeout: float = float(os.getenv('HTTP_KEEPALIVE_TIMEOUT', '60'))
+    # Seconds a resolved address is reused, 0 disables the DNS cache
+    dns_cache_ttl: int = int(os.getenv('HTTP_DNS_CACHE_TTL', '300'))
+    # Seconds a call may take in total and to connect
+    timeout: float = float(os.getenv('HTTP_TIMEOUT', '30'))
+    connect_timeout: float = float(os.getenv('HTTP_CONNECT_TIMEOUT', '10'))
+
+
+@dataclass
+class APIConfig:
+    weather_api_key: Optional[str] = os.getenv('WEATHER_API_KEY')
+    currency_api_key: Optional[str] = os.getenv('CURRENCY_API_KEY')
+    # Seconds a weather or forecast answer is reused, then served stale
+    # for up to weather_cache_stale more while it is refreshed
+    weather_cache_ttl: float = float(os.getenv('WEATHER_CACHE_TTL', '600'))
+    weather_cache_stale: float = float(
+        os.getenv('WEATHER_CACHE_STALE', '1800')
+    )
+    weather_cache_size: int = int(os.getenv('WEATHER_CACHE_SIZE', '1000'))
+    # One table of rates for this currency gives every pair
+    currency_base: str = os.getenv('CURRENCY_BASE', 'USD').upper()
+    # Seconds between refreshes of the table, 0 disables them, and
+    # after a failed one
+    currency_refresh_interval: float = float(
+        os.getenv('CURRENCY_REFRESH_INTERVAL', '3600')
+    )
+    currency_retry_interval: float = float(
+        os.getenv('CURRENCY_RETRY_INTERVAL', '60')
+    )
+
+
+@dataclass
+class HandlersConfig:
+    # Import command modules on the first use of a command instead of
+    # at startup
+    lazy: bool = os.getenv('HANDLERS_LAZY', 'false').lower() == 'true'
+    # Seconds after startup until the lazy modules not used yet are
+    # imported in the background; negative disables the warm-up
+    warmup_delay: float = float(os.getenv('HANDLERS_WARMUP_DELAY', '10'))
+
+
 class Config:
     def __init__(self):
         self.bot = BotConfig()
@@ -79,6 +277,16 @@ class Config:
         self.database = DatabaseConfig()
         self.redis = RedisConfig()
         self.logging = LoggingConfig()
+        self.throttling = ThrottlingConfig()
+        self.metrics = MetricsConfig()
+        self.polling = PollingConfig()
+        self.dispatcher = DispatcherConfig()
+        self.sharding = ShardingConfig()
+        self.handlers = HandlersConfig()
+        self.outbound = OutboundConfig()
+        self.broadcast = BroadcastConfig()
+        self.http = HTTPConfig()
+        self.api = APIConfig()
 
         self.chat_id = os.getenv('CHAT_ID', 'YOUR_CHAT_ID_HERE')
         self.debug = os.getenv('DEBUG', 'false').lower() == 'true'
@@ -125,6 +333,7 @@ class Config:
 /status - Статус бота
 /ping - Проверить соединение
 /uptime - Время работы бота
+/convert - Конвертер валют
 
 <b>Поддержка:</b> {support}
 """.format(support=self.bot.support)
@@ -0,0 +1,22 @@
+from . import broadcast, users
+from .cache import UserCache, user_cache
+from .changes import UserChanges, user_changes
+from .context import begin_update, db_stats, end_update
+from .executor import DatabaseExecutor, db_executor
+from .write_behind import ActivityBuffer, activity_buffer
+
+__all__ = [
+    'ActivityBuffer',
+    'DatabaseExecutor',
+    'UserCache',
+    'UserChanges',
+    'activity_buffer',
+    'begin_update',
+    'broadcast',
+    'db_executor',
+    'db_stats',
+    'end_update',
+    'user_cache',
+    'user_changes',
+    'users',
+]
@@ -0,0 +1,107 @@
+"""
+Recipients of broadcasts and the users the bot cannot write to.
+
+Recipients come from segments of users kept as bitsets by
+segment_index: a target of a broadcast is a combination of segments.
+Code changing a user row calls segment_index.touch, like it invalidates
+the user cache, and user_changes.changed: the index of the shard worker
+running a broadcast learns about bans and blocks handled in the others.
+"""
+from datetime import datetime
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from app.data.config import config
+from app.database.changes import user_changes
+from app.database.executor import db_executor
+from app.models import User
+from app.models.blocked_user import BlockedUser
+from app.utils.broadcast import Segment, SegmentIndex, SegmentRecipients
+
+# Days within which a user counts as active or new
+RECENT_DAYS = 7
+
+SEGMENTS: Dict[str, Segment] = {
+    # Users a message can reach at all
+    'reachable': Segment(
+        (User.is_banned == False)  # noqa: E712
+        & (User.is_bot == False)  # noqa: E712
+        & User.user_id.not_in(BlockedUser.select(BlockedUser.user_id))
+    ),
+    'active': Segment(field=User.last_activity, days=RECENT_DAYS),
+    'active_month': Segment(field=User.last_activity, days=30),
+    'new': Segment(field=User.created_at, days=RECENT_DAYS),
+    'has_username': Segment(
+        User.username.is_null(False) & (User.username != '')
+    ),
+    'lang_ru': Segment(User.language_code.startswith('ru')),
+    'lang_en': Segment(User.language_code.startswith('en')),
+    'admins': Segment(User.user_id.in_(config.admin.owner_ids)),
+}
+
+# Target of a broadcast -> who gets it, as shown to the admin
+TARGETS: Dict[str, str] = {
+    'all': 'всем пользователям',
+    'active': f'активным за {RECENT_DAYS} дней',
+    'new': f'новым за {RECENT_DAYS} дней',
+    'admins': 'администраторам',
+    'ru': 'русскоязычным',
+    'en': 'англоязычным',
+}
+
+# Target -> segments its users are in all of, and segments they are in
+# none of
+TARGET_SEGMENTS: Dict[str, Tuple[Sequence[str], Sequence[str]]] = {
+    'all': (['reachable'], []),
+    'active': (['reachable', 'active'], []),
+    'new': (['reachable', 'new'], []),
+    'admins': (['reachable', 'admins'], []),
+    'ru': (['reachable', 'lang_ru'], []),
+    'en': (['reachable', 'lang_en'], []),
+}
+
+segment_index = SegmentIndex(
+    User.select(), User.id, User.user_id, SEGMENTS, db_executor.run
+)
+
+# SQLite allows 999 bound parameters per statement, a row takes two
+CHUNK_SIZE = 400
+
+
+def recipients(target: str) -> SegmentRecipients:
+    """Users of the target who can get a message"""
+    if target not in TARGET_SEGMENTS:
+        raise ValueError(f"Unknown broadcast target: {target}")
+    include, exclude = TARGET_SEGMENTS[target]
+    return segment_index.recipients(include, exclude)
+
+
+def _mark_blocked(user_ids: List[int]) -> None:
+    now = datetime.now()
+    for i in range(0, len(user_ids), CHUNK_SIZE):
+        BlockedUser.insert_many(
+            [(user_id, now) for user_id in user_ids[i:i + CHUNK_SIZE]],
+            fields=[BlockedUser.user_id, BlockedUser.blocked_at]
+        ).on_conflict_ignore().execute()
+
+
+async def setup() -> None:
+    """Creates the table of blocked users if it is missing"""
+    await db_executor.run(BlockedUser.create_table, safe=True)
+
+
+async def mark_blocked(user_ids: Iterable[int]) -> None:
+    """Excludes the users from broadcasts until they unblock the bot"""
+    user_ids = list(user_ids)
+    if user_ids:
+        await db_executor.run(_mark_blocked, user_ids)
+        for user_id in user_ids:
+            segment_index.touch(user_id)
+        user_changes.changed(user_ids)
+
+
+async def unmark_blocked(user_id: int) -> None:
+    await db_executor.run(
+        BlockedUser.delete().where(BlockedUser.user_id == user_id).execute
+    )
+    segment_index.touch(user_id)
+    user_changes.changed([user_id])
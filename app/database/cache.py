@@ -0,0 +1,73 @@
+import copy
+import time
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+from app.data.config import config
+from app.models import User
+
+
+class UserCache:
+    """Process-wide TTL + LRU cache of User rows keyed by Telegram id.
+
+    Missing users are cached as None too, so repeated events of unknown
+    users do not hit the database. Code changing a row must call
+    `invalidate` or `set`; other shard workers learn about it through
+    user_changes. Every `get` returns a copy of its own, so concurrent
+    updates never change each other's instance.
+    """
+
+    def __init__(self, maxsize: int = 10_000, ttl: float = 60.0,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.maxsize: int = maxsize
+        self.ttl: float = ttl
+        self.clock: Callable[[], float] = clock
+        self._items: 'OrderedDict[int, Tuple[float, Optional[User]]]' = (
+            OrderedDict()
+        )
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, user_id: int) -> Tuple[bool, Optional[User]]:
+        """Returns (found, user)"""
+        item = self._items.get(user_id)
+        if item is None:
+            return False, None
+
+        expires_at, user = item
+        if expires_at <= self.clock():
+            del self._items[user_id]
+            return False, None
+
+        self._items.move_to_end(user_id)
+        return True, copy_user(user)
+
+    def set(self, user_id: int, user: Optional[User]) -> None:
+        self._items[user_id] = (self.clock() + self.ttl, copy_user(user))
+        self._items.move_to_end(user_id)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def invalidate(self, user_id: int) -> None:
+        self._items.pop(user_id, None)
+
+    def clear(self) -> None:
+        self._items.clear()
+
+
+def copy_user(user: Optional[User]) -> Optional[User]:
+    """The row with field values of its own"""
+    if user is None:
+        return None
+    clone = copy.copy(user)
+    clone.__data__ = dict(user.__data__)
+    clone._dirty = set(user._dirty)
+    clone.__rel__ = {}
+    return clone
+
+
+user_cache = UserCache(
+    maxsize=config.database.user_cache_size,
+    ttl=config.database.user_cache_ttl
+)
@@ -0,0 +1,21 @@
+from typing import Callable, Iterable, List, Optional
+
+
+class UserChanges:
+    """Passes on the ids of users whose rows changed in this process.
+
+    A shard worker sets `publish` to send them to the other workers,
+    whose caches would otherwise keep the old rows, ban state included,
+    until they expire, and whose segment index would keep sending
+    broadcasts by them. Without sharding there is nobody to tell.
+    """
+
+    def __init__(self) -> None:
+        self.publish: Optional[Callable[[List[int]], None]] = None
+
+    def changed(self, user_ids: Iterable[int]) -> None:
+        if self.publish is not None:
+            self.publish(list(user_ids))
+
+
+user_changes = UserChanges()
@@ -0,0 +1,54 @@
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from app.models import User
+
+
+@dataclass
+class UpdateContext:
+    """Identity map and query counter of a single update"""
+    users: Dict[int, Optional[User]] = field(default_factory=dict)
+    queries: int = 0
+
+
+@dataclass
+class DatabaseStats:
+    updates: int = 0
+    update_queries: int = 0
+    identity_hits: int = 0
+    cache_hits: int = 0
+    cache_misses: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.cache_hits + self.cache_misses
+        return self.cache_hits / lookups if lookups else 0.0
+
+    @property
+    def queries_per_update(self) -> float:
+        return self.update_queries / self.updates if self.updates else 0.0
+
+
+db_stats = DatabaseStats()
+
+_current: ContextVar[Optional[UpdateContext]] = ContextVar(
+    'db_update_context', default=None
+)
+
+
+def begin_update() -> UpdateContext:
+    """Starts a fresh identity map for the update being processed"""
+    context = UpdateContext()
+    _current.set(context)
+    return context
+
+
+def end_update(context: UpdateContext) -> None:
+    db_stats.updates += 1
+    db_stats.update_queries += context.queries
+    _current.set(None)
+
+
+def current_update() -> Optional[UpdateContext]:
+    return _current.get()
@@ -0,0 +1,73 @@
+import asyncio
+import functools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+
+from app.data.config import config
+from app.database.context import current_update
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+
+class DatabaseExecutor:
+    """Runs blocking ORM calls on a dedicated bounded thread pool.
+
+    Peewee keeps one connection per thread, so the pool size is also the
+    connection count. SQLite allows a single writer at a time, so it gets
+    one thread that serializes all access instead of fighting for the
+    database lock.
+    """
+
+    def __init__(self, max_workers: int = 4) -> None:
+        self.max_workers: int = max_workers
+        self._executor: ThreadPoolExecutor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix='db'
+        )
+
+    async def run(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Runs func(*args, **kwargs) in the pool and awaits the result"""
+        context = current_update()
+        if context:
+            context.queries += 1
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(func, *args, **kwargs)
+        )
+
+    async def close(self, database: Any, timeout: float = 5.0) -> int:
+        """Closes the peewee connection of every pool thread, then stops
+        the pool. Returns the number of connections closed."""
+        # Connections are thread local: a barrier makes every thread of
+        # the pool take exactly one of the calls
+        barrier = threading.Barrier(self.max_workers, timeout=timeout)
+
+        def close_connection() -> bool:
+            try:
+                barrier.wait()
+            except threading.BrokenBarrierError:
+                pass
+            return database.close()
+
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(*[
+            loop.run_in_executor(self._executor, close_connection)
+            for _ in range(self.max_workers)
+        ], return_exceptions=True)
+        self.shutdown()
+        return sum(1 for result in results if result is True)
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+        logger.info("Database executor stopped")
+
+
+db_executor = DatabaseExecutor(
+    max_workers=1 if config.database.type == 'sqlite'
+    else config.database.pool_size
+)
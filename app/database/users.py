@@ -0,0 +1,185 @@
+"""
+Awaitable access to user rows.
+
+Each helper runs its whole ORM work in one hop to the database executor,
+so handlers never touch the database from the event loop.
+"""
+from datetime import datetime
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from aiogram import types
+
+from app.database.broadcast import segment_index
+from app.database.cache import user_cache
+from app.database.changes import user_changes
+from app.database.context import current_update, db_stats
+from app.database.executor import db_executor
+from app.models import User, UserSettings, UserStats
+
+
+def _create_or_update_user(tg_user: types.User) -> Tuple[User, bool]:
+    now = datetime.now()
+    db_user = User.get_or_none(User.user_id == tg_user.id)
+
+    if db_user:
+        db_user.username = tg_user.username
+        db_user.first_name = tg_user.first_name
+        db_user.last_name = tg_user.last_name
+        db_user.language_code = tg_user.language_code
+        db_user.updated_at = now
+        db_user.last_activity = now
+        db_user.save()
+        return db_user, False
+
+    db_user = User.create(
+        user_id=tg_user.id,
+        username=tg_user.username,
+        first_name=tg_user.first_name,
+        last_name=tg_user.last_name,
+        language_code=tg_user.language_code,
+        is_bot=tg_user.is_bot,
+        created_at=now,
+        updated_at=now,
+        last_activity=now
+    )
+    UserSettings.create(user=db_user)
+    UserStats.create(user=db_user)
+    return db_user, True
+
+
+def _register_user(tg_user: types.User) -> Tuple[User, bool]:
+    db_user, created = User.get_or_create(
+        user_id=tg_user.id,
+        defaults={
+            'first_name': tg_user.first_name,
+            'last_name': tg_user.last_name,
+            'username': tg_user.username,
+            'language_code': tg_user.language_code,
+            'is_bot': tg_user.is_bot
+        }
+    )
+    if created:
+        UserSettings.create(user=db_user)
+        UserStats.create(user=db_user)
+    return db_user, created
+
+
+def _change(db_user: User, method: Callable[[User], None]) -> None:
+    # The instance may come from the cache and miss changes made since,
+    # saving it would write them back: the method runs on the current
+    # row, whose values then replace the instance's
+    current = User.get_by_id(db_user.id)
+    method(current)
+    db_user.__data__.update(current.__data__)
+    db_user._dirty.clear()
+
+
+def _count_users() -> Tuple[int, int]:
+    today_start = datetime.now().replace(
+        hour=0, minute=0, second=0, microsecond=0
+    )
+    total = User.select().count()
+    active_today = User.select().where(
+        User.last_activity >= today_start
+    ).count()
+    return total, active_today
+
+
+async def get_user(user_id: int) -> Optional[User]:
+    """Resolves the user from the update, the cache or the database"""
+    context = current_update()
+    if context and user_id in context.users:
+        db_stats.identity_hits += 1
+        return context.users[user_id]
+
+    found, db_user = user_cache.get(user_id)
+    if found:
+        db_stats.cache_hits += 1
+    else:
+        db_stats.cache_misses += 1
+        db_user = await db_executor.run(
+            User.get_or_none, User.user_id == user_id
+        )
+        user_cache.set(user_id, db_user)
+
+    if context:
+        context.users[user_id] = db_user
+    return db_user
+
+
+async def get_user_by_username(username: str) -> Optional[User]:
+    db_user = await db_executor.run(User.get_or_none, User.username == username)
+    if db_user:
+        user_cache.set(db_user.user_id, db_user)
+    return db_user
+
+
+async def get_stats(db_user: User) -> Optional[UserStats]:
+    return await db_executor.run(
+        UserStats.get_or_none, UserStats.user == db_user
+    )
+
+
+async def get_recent_users(limit: int = 10) -> List[User]:
+    query = User.select().order_by(User.created_at.desc()).limit(limit)
+    return await db_executor.run(list, query)
+
+
+async def count_users() -> Tuple[int, int]:
+    """Returns (total users, users active today)"""
+    return await db_executor.run(_count_users)
+
+
+async def create_or_update_user(tg_user: types.User) -> Tuple[User, bool]:
+    """Creates the user with settings and stats or refreshes the profile"""
+    db_user, created = await db_executor.run(_create_or_update_user, tg_user)
+    _remember(db_user)
+    return db_user, created
+
+
+async def register_user(tg_user: types.User) -> Tuple[User, bool]:
+    db_user, created = await db_executor.run(_register_user, tg_user)
+    _remember(db_user)
+    return db_user, created
+
+
+async def ban(db_user: User) -> None:
+    await db_executor.run(_change, db_user, User.ban)
+    invalidate(db_user.user_id)
+
+
+async def unban(db_user: User) -> None:
+    await db_executor.run(_change, db_user, User.unban)
+    invalidate(db_user.user_id)
+
+
+async def add_warning(db_user: User) -> None:
+    await db_executor.run(_change, db_user, User.add_warning)
+    invalidate(db_user.user_id)
+
+
+def invalidate(user_id: int) -> None:
+    """Drops the user from the cache and the current identity map"""
+    user_cache.invalidate(user_id)
+    segment_index.touch(user_id)
+    user_changes.changed([user_id])
+    context = current_update()
+    if context:
+        context.users.pop(user_id, None)
+
+
+def forget(user_ids: Iterable[int]) -> None:
+    """Drops users changed by another shard worker from the cache, the
+    segment index reads their rows again"""
+    for user_id in user_ids:
+        user_cache.invalidate(user_id)
+        segment_index.touch(user_id)
+
+
+def _remember(db_user: User) -> None:
+    user_cache.set(db_user.user_id, db_user)
+    segment_index.touch(db_user.user_id)
+    user_changes.changed([db_user.user_id])
+    context = current_update()
+    if context:
+        context.users[db_user.user_id] = db_user
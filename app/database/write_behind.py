@@ -0,0 +1,160 @@
+import asyncio
+import logging
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from peewee import Case
+
+from app.data.config import config
+from app.database.executor import db_executor
+from app.models import User, UserStats
+
+logger = logging.getLogger(__name__)
+
+# SQLite allows 999 bound parameters per statement, a row takes three
+CHUNK_SIZE = 300
+
+
+def _chunks(items: List, size: int = CHUNK_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class ActivityBuffer:
+    """Write-behind buffer for last_activity and stats counters.
+
+    Updates are coalesced per user in memory and written as one bulk
+    UPDATE per column on an interval, when the buffer grows past
+    `max_pending` users or on shutdown.
+    """
+
+    def __init__(self, flush_interval: float = 5.0,
+                 max_pending: int = 1000) -> None:
+        self.flush_interval: float = flush_interval
+        self.max_pending: int = max_pending
+        self._activity: Dict[int, datetime] = {}
+        self._counters: Dict[int, Counter] = defaultdict(Counter)
+        self._task: Optional[asyncio.Task] = None
+        self._flushing: Optional[asyncio.Task] = None
+
+    @property
+    def pending(self) -> int:
+        return len(self._activity.keys() | self._counters.keys())
+
+    def touch(self, db_user: User, when: Optional[datetime] = None) -> None:
+        """Records user activity"""
+        when = when or datetime.now()
+        # Keeps the instance of the update in sync with what will be
+        # written
+        db_user.last_activity = when
+        self._activity[db_user.id] = when
+        self._check_size()
+
+    def increment(self, db_user: User, field: str, delta: int = 1) -> None:
+        """Adds delta to a UserStats counter, e.g. messages_sent"""
+        self._counters[db_user.id][field] += delta
+        self._check_size()
+
+    def _check_size(self) -> None:
+        # Upper bound of pending users, cheap enough for every event
+        size = len(self._activity) + len(self._counters)
+        if size >= self.max_pending and not self._flushing:
+            self._flushing = asyncio.get_running_loop().create_task(self.flush())
+            self._flushing.add_done_callback(self._flush_done)
+
+    def _flush_done(self, task: asyncio.Task) -> None:
+        self._flushing = None
+
+    async def flush(self) -> int:
+        """Writes the buffered values, returns the number of users"""
+        if not self._activity and not self._counters:
+            return 0
+
+        activity, self._activity = self._activity, {}
+        counters, self._counters = self._counters, defaultdict(Counter)
+
+        try:
+            await db_executor.run(self._write, activity, counters)
+        except Exception as e:
+            logger.error(f"Error flushing activity buffer: {e}")
+            self._restore(activity, counters)
+            return 0
+
+        users = len(activity.keys() | counters.keys())
+        logger.debug(f"Flushed activity of {users} users")
+        return users
+
+    def _restore(self, activity: Dict[int, datetime],
+                 counters: Dict[int, Counter]) -> None:
+        """Puts back values of a failed flush, keeping newer ones"""
+        for user_pk, when in activity.items():
+            self._activity.setdefault(user_pk, when)
+        for user_pk, deltas in counters.items():
+            self._counters[user_pk].update(deltas)
+
+    @staticmethod
+    def _write(activity: Dict[int, datetime],
+               counters: Dict[int, Counter]) -> None:
+        with User._meta.database.atomic():
+            for chunk in _chunks(list(activity.items())):
+                User.update(
+                    last_activity=Case(User.id, chunk)
+                ).where(
+                    User.id.in_([user_pk for user_pk, _ in chunk])
+                ).execute()
+
+            if not counters:
+                return
+
+            # Stats rows are created on registration, older users may miss one
+            existing = {
+                stats.user_id for stats in UserStats.select(UserStats.user)
+                .where(UserStats.user.in_(list(counters)))
+            }
+            missing = [pk for pk in counters if pk not in existing]
+            if missing:
+                UserStats.insert_many(
+                    [{'user': user_pk} for user_pk in missing]
+                ).execute()
+
+            fields = {field for deltas in counters.values() for field in deltas}
+            for field in fields:
+                column = getattr(UserStats, field)
+                deltas = [
+                    (user_pk, values[field])
+                    for user_pk, values in counters.items() if values[field]
+                ]
+                for chunk in _chunks(deltas):
+                    UserStats.update(
+                        {column: column + Case(UserStats.user, chunk, 0)}
+                    ).where(
+                        UserStats.user.in_([user_pk for user_pk, _ in chunk])
+                    ).execute()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+            logger.info(
+                f"Activity buffer started, flush every {self.flush_interval}s"
+            )
+
+    async def stop(self) -> int:
+        """Stops the periodic flush and writes everything left"""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        if self._flushing:
+            await self._flushing
+        return await self.flush()
+
+
+activity_buffer = ActivityBuffer(
+    flush_interval=config.database.flush_interval,
+    max_pending=config.database.flush_size
+)
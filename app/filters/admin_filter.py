@@ -1,7 +1,13 @@
+import logging
+
 from aiogram import types
 from aiogram.dispatcher.filters import BoundFilter
+from aiogram.utils.exceptions import TelegramAPIError
 
 from app.data.config import config
+from app.utils.misc.chat_admins import chat_admins
+
+logger = logging.getLogger(__name__)
 
 
 class AdminFilter(BoundFilter):
@@ -31,11 +37,19 @@ class AdminOrOwnerFilter(BoundFilter):
         if message.from_user.id in config.admin.owner_ids:
             return True
 
-        # Проверка на владельца чата (для групп)
+        # Проверка на владельца чата (для групп) по кэшу администраторов
         if message.chat.type in ['group', 'supergroup']:
-            chat_member = await message.bot.get_chat_member(
-                message.chat.id, message.from_user.id
-            )
-            return chat_member.status in ['creator', 'administrator']
+            try:
+                return await chat_admins.is_admin(
+                    message.bot, message.chat.id, message.from_user.id
+                )
+            except TelegramAPIError as e:
+                logger.warning(
+                    f"Failed to load admins of chat {message.chat.id}: {e}"
+                )
+                chat_member = await message.bot.get_chat_member(
+                    message.chat.id, message.from_user.id
+                )
+                return chat_member.status in ['creator', 'administrator']
 
         return False
@@ -1,13 +1,26 @@
 import logging
 from abc import ABC, abstractmethod
-from typing import List
+from typing import Any, Awaitable, Callable, List
 
 from aiogram import types
 from aiogram.dispatcher import Dispatcher
 
+from app.data.config import config
+from app.utils.metrics import timed
+
 logger = logging.getLogger(__name__)
 
 
+def instrumented(
+        handler: Callable[..., Awaitable[Any]],
+        name: str
+) -> Callable[..., Awaitable[Any]]:
+    """Оборачивает обработчик замером времени, если метрики включены"""
+    if config.metrics.enabled:
+        return timed(handler, name)
+    return handler
+
+
 class BaseCommandHandler(ABC):
     """Базовый класс для обработчиков команд"""
 
@@ -28,7 +41,7 @@ class BaseCommandHandler(ABC):
     def register_handlers(self) -> None:
         """Регистрирует обработчики команд"""
         self.dp.register_message_handler(
-            self.handle,
+            instrumented(self.handle, self.__class__.__name__),
             commands=[self.get_command()],
             chat_type='private'
         )
@@ -55,7 +68,7 @@ class BaseMessageHandler(ABC):
     def register_handlers(self) -> None:
         """Регистрирует обработчики сообщений"""
         self.dp.register_message_handler(
-            self.handle,
+            instrumented(self.handle, self.__class__.__name__),
             content_types=self.get_content_types()
         )
         content_types = self.get_content_types()
@@ -84,7 +97,7 @@ class BaseCallbackHandler(ABC):
     def register_handlers(self) -> None:
         """Регистрирует обработчики callback"""
         self.dp.register_callback_query_handler(
-            self.handle,
+            instrumented(self.handle, self.__class__.__name__),
             lambda c: c.data == self.get_callback_data()
         )
         callback_data = self.get_callback_data()
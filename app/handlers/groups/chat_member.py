@@ -0,0 +1,56 @@
+import logging
+
+from aiogram import types
+from aiogram.dispatcher import Dispatcher
+
+from app.database import broadcast
+from app.utils.misc.chat_admins import ADMIN_STATUSES, chat_admins
+
+logger = logging.getLogger(__name__)
+
+
+class ChatMemberUpdateHandler:
+    """Поддерживает кэш администраторов групп и список пользователей,
+    заблокировавших бота, в актуальном состоянии"""
+
+    def __init__(self, dp: Dispatcher) -> None:
+        self.dp: Dispatcher = dp
+        self.register_handlers()
+
+    async def handle_chat_member(
+            self,
+            update: types.ChatMemberUpdated
+    ) -> None:
+        """Применяет изменение роли участника к кэшу"""
+        old_status = update.old_chat_member.status
+        new_status = update.new_chat_member.status
+        if old_status in ADMIN_STATUSES or new_status in ADMIN_STATUSES:
+            chat_admins.update_member(
+                update.chat.id, update.new_chat_member.user.id, new_status
+            )
+            logger.info(
+                f"Admin status of {update.new_chat_member.user.id} in chat "
+                f"{update.chat.id} changed: {old_status} -> {new_status}"
+            )
+
+    async def handle_my_chat_member(
+            self,
+            update: types.ChatMemberUpdated
+    ) -> None:
+        """Сбрасывает кэш чата при изменении статуса самого бота и
+        отмечает пользователей, заблокировавших бота"""
+        if update.chat.type in ['group', 'supergroup']:
+            chat_admins.invalidate(update.chat.id)
+        elif update.chat.type == 'private':
+            status = update.new_chat_member.status
+            if status == types.ChatMemberStatus.KICKED:
+                await broadcast.mark_blocked([update.chat.id])
+                logger.info(f"User {update.chat.id} blocked the bot")
+            elif status == types.ChatMemberStatus.MEMBER:
+                await broadcast.unmark_blocked(update.chat.id)
+
+    def register_handlers(self) -> None:
+        """Регистрирует обработчики изменений участников чата"""
+        self.dp.register_chat_member_handler(self.handle_chat_member)
+        self.dp.register_my_chat_member_handler(self.handle_my_chat_member)
+        logger.info("Registered chat member update handlers")
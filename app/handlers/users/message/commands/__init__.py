@@ -1,25 +1,64 @@
-# Импорт всех команд для автоматической регистрации
-from . import about
-from . import ban_user
-from . import commands
-from . import echo
-from . import feedback
-from . import help
-from . import menu
-from . import ping
-from . import profile
-from . import register
-from . import settings
-from . import start
-from . import stats
-from . import status
-from . import support
-from . import unban_user
-from . import uptime
-from . import users
-from . import version
-from . import warn_user
-from . import weather
+"""
+Команды пользователей. Модули регистрируют свои обработчики при импорте:
+load_all импортирует все сразу, в ленивом режиме модуль команды
+импортируется при первом ее использовании (см. MessageRouter.lazy)
+"""
+from importlib import import_module
+from typing import Dict
+
+# Команда -> модуль, который ее обрабатывает
+COMMANDS: Dict[str, str] = {
+    'about': 'about',
+    'ban_user': 'ban_user',
+    'broadcast': 'broadcast',
+    'commands': 'commands',
+    'convert': 'convert',
+    'feedback': 'feedback',
+    'help': 'help',
+    'menu': 'menu',
+    'ping': 'ping',
+    'profile': 'profile',
+    'register': 'register',
+    'settings': 'settings',
+    'start': 'start',
+    'stats': 'stats',
+    'status': 'status',
+    'support': 'support',
+    'unban_user': 'unban_user',
+    'uptime': 'uptime',
+    'users': 'users',
+    'version': 'version',
+    'warn_user': 'warn_user',
+    'weather': 'weather',
+    'weather_help': 'weather',
+}
+
+# Модули, нужные с первого сообщения: без команд, а также с обработчиками
+# состояний FSM и callback-кнопок, которые маршрутизатор не сопоставит с
+# командой (сценарий мог начаться до перезапуска бота)
+EAGER = ['echo', 'register', 'broadcast']
+
+
+def manifest() -> Dict[str, str]:
+    """Команды с полными именами их модулей для MessageRouter.lazy"""
+    return {
+        command: f'{__name__}.{module}'
+        for command, module in COMMANDS.items()
+    }
+
+
+def load_eager() -> None:
+    """Импортирует модули из EAGER"""
+    for module in EAGER:
+        import_module(f'{__name__}.{module}')
+
+
+def load_all() -> None:
+    """Импортирует все модули команд"""
+    load_eager()
+    for module in dict.fromkeys(COMMANDS.values()):
+        import_module(f'{__name__}.{module}')
+
 
 __all__ = [
     'start',
@@ -38,9 +77,11 @@ __all__ = [
     'echo',
     'ban_user',
     'unban_user',
+    'broadcast',
     'warn_user',
     'stats',
     'users',
     'register',
-    'weather'
+    'weather',
+    'convert'
 ]
@@ -4,9 +4,9 @@ from aiogram import types
 from aiogram.types import ParseMode
 
 from app.data.config import config
+from app.database import users
 from app.handlers.base_handler import BaseCommandHandler
 from app.loader import dp
-from app.models import User
 
 logger = logging.getLogger(__name__)
 
@@ -40,7 +40,7 @@ class BanUserCommandHandler(BaseCommandHandler):
             if target.startswith('@'):
                 # По username
                 username = target[1:]
-                user = User.get_or_none(User.username == username)
+                user = await users.get_user_by_username(username)
                 if not user:
                     await message.answer(
                         f"❌ Пользователь @{username} не найден в базе данных!"
@@ -55,7 +55,7 @@ class BanUserCommandHandler(BaseCommandHandler):
                     await message.answer("❌ Неверный формат ID пользователя!")
                     return
 
-                user = User.get_or_none(User.user_id == user_id)
+                user = await users.get_user(user_id)
                 if not user:
                     await message.answer(
                         f"❌ Пользователь с ID {user_id} не найден в базе данных!"
@@ -80,7 +80,7 @@ class BanUserCommandHandler(BaseCommandHandler):
                 return
 
             # Баним пользователя
-            user.ban()
+            await users.ban(user)
 
             # Логируем действие
             logger.info(
@@ -0,0 +1,259 @@
+"""
+Рассылка администратора: /broadcast -> сообщение -> получатели ->
+подтверждение. Сообщение копируется получателям в фоне, ход рассылки
+обновляется в сообщении администратора
+"""
+import logging
+from datetime import timedelta
+
+from aiogram import Bot, types
+from aiogram.dispatcher import Dispatcher, FSMContext
+from aiogram.types import ParseMode
+from aiogram.utils.exceptions import MessageNotModified
+
+from app.data.config import config
+from app.database import broadcast
+from app.handlers.base_handler import BaseCommandHandler
+from app.keyboards.inline.keyboards import AdminKeyboards, UtilityKeyboards
+from app.loader import dp
+from app.states.admin.broadcast import BroadcastStates
+from app.utils.broadcast import (
+    ABORTED, CANCELLED, FINISHED, RUNNING, BroadcastCheckpoint,
+    BroadcastJob, Broadcaster
+)
+
+logger = logging.getLogger(__name__)
+
+TITLES = {
+    RUNNING: '📢 Идет рассылка',
+    FINISHED: '✅ Рассылка завершена',
+    CANCELLED: '⏹ Рассылка остановлена',
+    ABORTED: '❌ Рассылка прервана из-за ошибки',
+}
+
+
+def format_duration(seconds: float) -> str:
+    return str(timedelta(seconds=round(seconds)))
+
+
+def format_progress(job: BroadcastJob, rate: float) -> str:
+    """Текст сообщения о ходе рассылки"""
+    # Получатели определяются при запуске, пришедшие позже ее не получают.
+    # Возобновленная после перезапуска рассылка определяет их заново, и
+    # обработанных может стать больше, чем было получателей
+    total = max(job.total, job.done)
+    percent = job.done / total * 100 if total else 100.0
+    lines = [
+        f"<b>{TITLES[job.state]}</b>",
+        "",
+        f"<b>Получатели:</b> {broadcast.TARGETS[job.target]}",
+        f"<b>Обработано:</b> {job.done} из {total} ({percent:.1f}%)",
+        f"• Доставлено: {job.sent}",
+        f"• Заблокировали бота: {job.blocked}",
+        f"• Ошибки: {job.failed}",
+        "",
+        f"<b>Скорость:</b> {rate:.1f} сообщ./с",
+    ]
+    if job.state == RUNNING and rate > 0:
+        remaining = format_duration((total - job.done) / rate)
+        lines.append(f"<b>Осталось:</b> ~{remaining}")
+    else:
+        lines.append(f"<b>Время:</b> {format_duration(job.elapsed)}")
+    return "\n".join(lines)
+
+
+async def report_progress(bot: Bot, job: BroadcastJob, rate: float) -> None:
+    """Обновляет сообщение о ходе рассылки у администратора"""
+    if job.progress_message_id is None:
+        return
+    keyboard = None
+    if job.state == RUNNING:
+        keyboard = AdminKeyboards.get_broadcast_progress_keyboard()
+    try:
+        await bot.edit_message_text(
+            format_progress(job, rate),
+            chat_id=job.admin_chat_id,
+            message_id=job.progress_message_id,
+            parse_mode=ParseMode.HTML,
+            reply_markup=keyboard
+        )
+    except MessageNotModified:
+        pass
+
+
+class BroadcastCommandHandler(BaseCommandHandler):
+    """Обработчик команды /broadcast и шагов подготовки рассылки"""
+
+    def __init__(self, dp: Dispatcher) -> None:
+        self.broadcaster: Broadcaster = Broadcaster(
+            store=BroadcastCheckpoint(config.broadcast.checkpoint_file),
+            recipients=broadcast.recipients,
+            mark_blocked=broadcast.mark_blocked,
+            on_progress=report_progress,
+            concurrency=config.broadcast.concurrency,
+            page_size=config.broadcast.page_size,
+            interval=config.broadcast.interval
+        )
+        super().__init__(dp)
+
+    def get_command(self) -> str:
+        return "broadcast"
+
+    def register_handlers(self) -> None:
+        """Регистрирует команду и шаги рассылки"""
+        super().register_handlers()
+        self.dp.register_message_handler(
+            self.handle_cancel, commands=['cancel'], state=BroadcastStates
+        )
+        self.dp.register_message_handler(
+            self.handle_message,
+            content_types=types.ContentType.ANY,
+            state=BroadcastStates.waiting_for_message
+        )
+        self.dp.register_callback_query_handler(
+            self.handle_target,
+            lambda c: c.data.startswith('broadcast_'),
+            state=BroadcastStates.waiting_for_target
+        )
+        self.dp.register_callback_query_handler(
+            self.handle_confirm,
+            text='confirm_broadcast',
+            state=BroadcastStates.waiting_for_confirmation
+        )
+        self.dp.register_callback_query_handler(
+            self.handle_cancel_callback, text='cancel', state=BroadcastStates
+        )
+        self.dp.register_callback_query_handler(
+            self.handle_stop, text='broadcast_stop'
+        )
+
+    def busy(self) -> bool:
+        """Рассылка идет здесь или ждет перезапуска в другом процессе"""
+        if self.broadcaster.running:
+            return True
+        job = self.broadcaster.store.load()
+        return job is not None and job.state == RUNNING
+
+    async def handle(self, message: types.Message, state: FSMContext):
+        """Обработчик команды /broadcast"""
+        if message.from_user.id not in config.admin.owner_ids:
+            await message.answer("❌ У вас нет прав администратора!")
+            return
+
+        if self.busy():
+            await message.answer(
+                "⏳ Рассылка уже идет. Дождитесь ее окончания или "
+                "остановите ее кнопкой под сообщением о ходе рассылки."
+            )
+            return
+
+        await BroadcastStates.waiting_for_message.set()
+        await message.answer(
+            "📢 Отправьте сообщение для рассылки: текст, фото, видео или "
+            "любое другое. Получатели увидят его копию.\n\n"
+            "/cancel - отмена"
+        )
+
+    async def handle_message(self, message: types.Message,
+                             state: FSMContext):
+        """Запоминает сообщение и предлагает выбрать получателей"""
+        await state.update_data(
+            from_chat_id=message.chat.id, message_id=message.message_id
+        )
+        await BroadcastStates.waiting_for_target.set()
+        await message.answer(
+            "👥 Кому отправить рассылку?",
+            reply_markup=AdminKeyboards.get_broadcast_target_keyboard()
+        )
+
+    async def handle_target(self, callback_query: types.CallbackQuery,
+                            state: FSMContext):
+        """Считает получателей и просит подтверждение"""
+        await callback_query.answer()
+        target = callback_query.data[len('broadcast_'):]
+        if target not in broadcast.TARGETS:
+            return
+
+        # Сразу после запуска индекс сегментов может еще строиться
+        total = await broadcast.recipients(target).count()
+        await state.update_data(target=target)
+        await BroadcastStates.waiting_for_confirmation.set()
+        await callback_query.message.edit_text(
+            f"📢 Отправить рассылку {broadcast.TARGETS[target]}?\n"
+            f"Получателей: {total}",
+            reply_markup=UtilityKeyboards.get_confirm_keyboard('broadcast')
+        )
+
+    async def handle_confirm(self, callback_query: types.CallbackQuery,
+                             state: FSMContext):
+        """Запускает рассылку"""
+        data = await state.get_data()
+        await state.finish()
+        if self.busy():
+            await callback_query.answer(
+                "Рассылка уже идет", show_alert=True
+            )
+            return
+
+        job = BroadcastJob(
+            from_chat_id=data['from_chat_id'],
+            message_id=data['message_id'],
+            target=data['target'],
+            admin_chat_id=callback_query.message.chat.id,
+            progress_message_id=callback_query.message.message_id
+        )
+        self.broadcaster.start(callback_query.bot, job)
+        await callback_query.message.edit_text(
+            format_progress(job, 0.0),
+            parse_mode=ParseMode.HTML,
+            reply_markup=AdminKeyboards.get_broadcast_progress_keyboard()
+        )
+        await callback_query.answer("Рассылка запущена")
+        logger.info(
+            f"Broadcast to {job.target} started by "
+            f"{callback_query.from_user.id}"
+        )
+
+    async def handle_stop(self, callback_query: types.CallbackQuery):
+        """Останавливает идущую рассылку"""
+        if callback_query.from_user.id not in config.admin.owner_ids:
+            await callback_query.answer("❌ У вас нет прав администратора!")
+            return
+        if not self.broadcaster.running:
+            # Рассылка, прерванная сбоем процесса, осталась в файле
+            # состояния и не дает начать новую до перезапуска
+            job = self.broadcaster.store.load()
+            if job is not None and job.state == RUNNING:
+                self.broadcaster.store.clear()
+                await callback_query.answer(
+                    "Рассылка не шла, ее сохраненное состояние сброшено"
+                )
+                logger.info(
+                    f"Stale broadcast to {job.target} cleared by "
+                    f"{callback_query.from_user.id}"
+                )
+                return
+            await callback_query.answer("Рассылка не идет")
+            return
+        self.broadcaster.cancel()
+        await callback_query.answer(
+            "Останавливаю: отправляемые сейчас сообщения еще уйдут"
+        )
+        logger.info(f"Broadcast stopped by {callback_query.from_user.id}")
+
+    async def handle_cancel(self, message: types.Message,
+                            state: FSMContext):
+        """Отменяет подготовку рассылки"""
+        await state.finish()
+        await message.answer("❌ Рассылка отменена")
+
+    async def handle_cancel_callback(self,
+                                     callback_query: types.CallbackQuery,
+                                     state: FSMContext):
+        await state.finish()
+        await callback_query.message.edit_text("❌ Рассылка отменена")
+        await callback_query.answer()
+
+
+# Создаем экземпляр хэндлера для автоматической регистрации
+broadcast_handler = BroadcastCommandHandler(dp)
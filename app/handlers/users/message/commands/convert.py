@@ -0,0 +1,105 @@
+"""
+Команда /convert: пересчет суммы в другие валюты по курсам, которые
+currency_rates загружает в фоне, без запросов к API
+"""
+import logging
+from typing import List
+
+from aiogram import types
+from aiogram.types import ParseMode
+from aiogram.utils.markdown import quote_html
+
+from app.api.rates import currency_rates
+from app.loader import dp
+
+logger = logging.getLogger(__name__)
+
+# Больше валют в одном запросе не пересчитывается
+MAX_TARGETS = 10
+
+USAGE = (
+    "💱 <b>Конвертер валют</b>\n\n"
+    "Использование: <code>/convert [сумма] [из] [в ...]</code>\n\n"
+    "Примеры:\n"
+    "• <code>/convert 100 USD EUR</code>\n"
+    "• <code>/convert 2500 RUB USD EUR CNY</code>"
+)
+
+
+def format_age(seconds: float) -> str:
+    """Давность курсов: '5 мин', '3 ч 20 мин', '2 дн'"""
+    minutes = int(seconds // 60)
+    if minutes < 1:
+        return "меньше минуты"
+    if minutes < 60:
+        return f"{minutes} мин"
+    hours, minutes = divmod(minutes, 60)
+    if hours < 24:
+        return f"{hours} ч {minutes} мин"
+    return f"{hours // 24} дн"
+
+
+def format_amount(amount: float) -> str:
+    # У мелких сумм сохраняются значащие цифры
+    if abs(amount) >= 1 or amount == 0:
+        return f"{amount:,.2f}".replace(',', ' ')
+    return f"{amount:.6g}"
+
+
+class ConvertCommand:
+    """Обработчик команды /convert"""
+
+    @staticmethod
+    async def handle(message: types.Message):
+        args: List[str] = message.get_args().split()
+        if len(args) < 3:
+            await message.answer(USAGE, parse_mode=ParseMode.HTML)
+            return
+
+        try:
+            amount = float(args[0].replace(',', '.'))
+        except ValueError:
+            await message.answer(
+                "❌ Сумма должна быть числом: "
+                f"<code>{quote_html(args[0])}</code>",
+                parse_mode=ParseMode.HTML
+            )
+            return
+
+        snapshot = currency_rates.snapshot
+        if snapshot is None:
+            await message.answer(
+                "⏳ Курсы валют еще загружаются, попробуйте через минуту."
+            )
+            return
+
+        source = args[1].upper()
+        targets = list(dict.fromkeys(
+            code.upper() for code in args[2:2 + MAX_TARGETS]
+        ))
+        unknown = [
+            code for code in [source, *targets] if code not in snapshot
+        ]
+        if unknown:
+            await message.answer(
+                f"❌ Неизвестные валюты: {quote_html(', '.join(unknown))}"
+            )
+            return
+
+        converted = snapshot.convert_many(amount, source, targets)
+        lines = [f"💱 <b>{format_amount(amount)} {source}</b>", ""]
+        lines.extend(
+            f"= <b>{format_amount(value)}</b> {target}"
+            for target, value in zip(targets, converted)
+        )
+        lines.append("")
+        lines.append(
+            f"<i>Курсы обновлены {format_age(currency_rates.age)} назад</i>"
+        )
+        await message.answer("\n".join(lines), parse_mode=ParseMode.HTML)
+
+
+# Регистрация обработчика
+@dp.message_handler(commands=['convert'])
+async def convert_cmd(message: types.Message):
+    await ConvertCommand.handle(message)
@@ -1,11 +1,15 @@
-  import logging
+import logging
+from typing import Optional
 
 from aiogram import types
+from aiogram.dispatcher.webhook import SendMessage
 from aiogram.types import ParseMode
 
+from app.database import activity_buffer, users
 from app.handlers.base_handler import BaseMessageHandler
 from app.loader import dp
-from app.models import User, UserStats
+from app.models import User
+from app.utils.misc.webhook import answer
 
 logger = logging.getLogger(__name__)
 
@@ -16,39 +20,43 @@ class EchoMessageHandler(BaseMessageHandler):
     def get_content_types(self) -> list:
         return ['text']
 
-    async def handle(self, message: types.Message):
-        """Обработчик всех текстовых сообщений"""
+    async def handle(
+            self,
+            message: types.Message,
+            db_user: Optional[User] = None
+    ) -> Optional[SendMessage]:
+        """Обработчик всех текстовых сообщений.
+
+        Ответ возвращается через answer: в режиме webhook он уходит прямо
+        в ответе на запрос Telegram.
+        """
         user = message.from_user
 
         try:
+            # Пользователя передает DatabaseMiddleware
+            if db_user is None:
+                db_user = await users.get_user(user.id)
+
             # Проверяем, забанен ли пользователь
-            db_user = User.get_or_none(User.user_id == user.id)
             if db_user and db_user.is_banned:
-                await message.answer("🚫 Вы заблокированы в боте.")
-                return
+                return await answer(message, "🚫 Вы заблокированы в боте.")
 
-            # Обновляем статистику сообщений
+            # Обновляем статистику сообщений (активность отмечает middleware)
             if db_user:
-                stats = UserStats.get_or_none(UserStats.user == db_user)
-                if stats:
-                    stats.increment_messages()
-                else:
-                    # Создаем статистику, если её нет
-                    stats = UserStats.create(user=db_user)
-                    stats.increment_messages()
-
-                # Обновляем время последней активности
-                db_user.update_activity()
+                activity_buffer.increment(db_user, 'messages_sent')
 
             # Простой эхо-ответ
-            await message.answer(
+            return await answer(
+                message,
                 f"💬 <b>Эхо:</b> {message.text}",
                 parse_mode=ParseMode.HTML
             )
 
         except Exception as e:
             logger.error(f"Error in echo handler: {e}")
-            await message.answer("❌ Произошла ошибка при обработке сообщения")
+            return await answer(
+                message, "❌ Произошла ошибка при обработке сообщения"
+            )
 
 
 # Создаем экземпляр хэндлера для автоматической регистрации
@@ -1,4 +1,5 @@
 import logging
+from typing import Optional
 
 from aiogram import types
 from aiogram.types import ParseMode
@@ -6,7 +7,8 @@ from aiogram.types import ParseMode
 from app.data.config import config
 from app.handlers.base_handler import BaseCommandHandler
 from app.loader import dp
-from app.models import User, UserStats
+from app.models import User
+from app.database import users
 
 logger = logging.getLogger(__name__)
 
@@ -17,17 +19,18 @@ class ProfileCommandHandler(BaseCommandHandler):
     def get_command(self) -> str:
         return "profile"
 
-    async def handle(self, message: types.Message):
+    async def handle(self, message: types.Message, db_user: Optional[User] = None):
         """Обработчик команды /profile - показывает профиль пользователя"""
         user = message.from_user
 
         try:
-            # Получаем данные из БД
-            db_user = User.get_or_none(User.user_id == user.id)
+            # Пользователя передает DatabaseMiddleware
+            if db_user is None:
+                db_user = await users.get_user(user.id)
 
             if db_user:
                 # Получаем статистику
-                stats = UserStats.get_or_none(UserStats.user == db_user)
+                stats = await users.get_stats(db_user)
 
                 # Определяем статус пользователя
                 user_status = (
@@ -6,7 +6,7 @@ from aiogram.dispatcher import FSMContext
 
 from app.keyboards.inline.keyboards import MainKeyboards
 from app.loader import dp
-from app.models import User, UserSettings, UserStats
+from app.database import users
 from app.states.user.registration import RegistrationStates
 
 
@@ -17,19 +17,8 @@ class RegisterCommand:
     @dp.message_handler(commands=['register'])
     async def handle(message: types.Message, state: FSMContext):
         """Обработчик команды /register"""
-        user_id = message.from_user.id
-
         # Проверяем, не зарегистрирован ли уже пользователь
-        user, created = User.get_or_create(
-            user_id=user_id,
-            defaults={
-                'first_name': message.from_user.first_name,
-                'last_name': message.from_user.last_name,
-                'username': message.from_user.username,
-                'language_code': message.from_user.language_code,
-                'is_bot': message.from_user.is_bot
-            }
-        )
+        user, created = await users.register_user(message.from_user)
 
         if not created:
             await message.answer(
@@ -37,10 +26,6 @@ class RegisterCommand:
             )
             return
 
-        # Создаем настройки и статистику для нового пользователя
-        UserSettings.create(user=user)
-        UserStats.create(user=user)
-
         # Начинаем процесс регистрации
         await state.set_state(RegistrationStates.waiting_for_name)
 
@@ -88,11 +73,8 @@ class RegisterCommand:
         # Получаем все данные
         data = await state.get_data()
 
-        # Обновляем пользователя в БД
-        user_id = message.from_user.id
-        user = User.get(User.user_id == user_id)
-
         # Здесь можно добавить дополнительные поля в модель User
+        # user = await users.get_user(message.from_user.id)
         # user.age = data.get('age')
         # user.city = data.get('city')
         # user.save()
@@ -114,19 +96,3 @@ class RegisterCommand:
             parse_mode=types.ParseMode.HTML,
             reply_markup=MainKeyboards.get_main_keyboard()
         )
-
-
-# Регистрация обработчиков состояний
-@dp.message_handler(state=RegistrationStates.waiting_for_name)
-async def name_handler(message: types.Message, state: FSMContext):
-    await RegisterCommand.process_name(message, state)
-
-
-@dp.message_handler(state=RegistrationStates.waiting_for_age)
-async def age_handler(message: types.Message, state: FSMContext):
-    await RegisterCommand.process_age(message, state)
-
-
-@dp.message_handler(state=RegistrationStates.waiting_for_city)
-async def city_handler(message: types.Message, state: FSMContext):
-    await RegisterCommand.process_city(message, state)
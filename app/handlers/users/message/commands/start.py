@@ -1,14 +1,13 @@
 import logging
-from datetime import datetime
 
 from aiogram import types
 from aiogram.types import ParseMode
 
 from app.data.config import config
+from app.database import users
 from app.handlers.base_handler import BaseCommandHandler
 from app.keyboards.inline.keyboards import MainKeyboards
 from app.loader import dp
-from app.models import User, UserSettings, UserStats
 
 logger = logging.getLogger(__name__)
 
@@ -53,40 +52,12 @@ class StartCommandHandler(BaseCommandHandler):
     async def _create_or_update_user(self, user: types.User):
         """Создает или обновляет пользователя в базе данных"""
         try:
-            # Проверяем, существует ли пользователь
-            db_user = User.get_or_none(User.user_id == user.id)
-
-            if db_user:
-                # Обновляем существующего пользователя
-                db_user.username = user.username
-                db_user.first_name = user.first_name
-                db_user.last_name = user.last_name
-                db_user.language_code = user.language_code
-                db_user.updated_at = datetime.now()
-                db_user.last_activity = datetime.now()
-                db_user.save()
-                logger.info(f"Updated user {user.id} in database")
-            else:
-                # Создаем нового пользователя
-                db_user = User.create(
-                    user_id=user.id,
-                    username=user.username,
-                    first_name=user.first_name,
-                    last_name=user.last_name,
-                    language_code=user.language_code,
-                    is_bot=user.is_bot,
-                    created_at=datetime.now(),
-                    updated_at=datetime.now(),
-                    last_activity=datetime.now()
-                )
-
-                # Создаем настройки пользователя
-                UserSettings.create(user=db_user)
-
-                # Создаем статистику пользователя
-                UserStats.create(user=db_user)
+            db_user, created = await users.create_or_update_user(user)
 
+            if created:
                 logger.info(f"Created new user {user.id} in database")
+            else:
+                logger.info(f"Updated user {user.id} in database")
 
         except Exception as e:
             logger.error(f"Error creating/updating user {user.id}: {e}")
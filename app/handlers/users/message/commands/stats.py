@@ -5,6 +5,7 @@ from aiogram import types
 from aiogram.types import ParseMode
 
 from app.data.config import config
+from app.database import db_executor, db_stats, user_cache
 from app.loader import dp
 from app.models import User, UserStats
 
@@ -22,50 +23,27 @@ class StatsCommand:
             return
 
         try:
-            # Получаем статистику
-            total_users = User.select().count()
-
-            # Активные сегодня
-            today_start = datetime.now().replace(
-                hour=0, minute=0, second=0, microsecond=0
-            )
-            active_today = User.select().where(
-                User.last_activity >= today_start
-            ).count()
-
-            # Активные за неделю
-            week_ago = datetime.now() - timedelta(days=7)
-            active_week = User.select().where(
-                User.last_activity >= week_ago
-            ).count()
-
-            # Забаненные пользователи
-            banned_users = User.select().where(User.is_banned).count()
-
-            # Получаем общую статистику сообщений
-            total_messages = sum(
-                stats.messages_sent for stats in UserStats.select()
-            )
-            total_commands = sum(
-                stats.commands_used for stats in UserStats.select()
-            )
-            total_files = sum(
-                stats.files_sent for stats in UserStats.select()
-            )
+            # Получаем статистику в потоке БД
+            counters = await db_executor.run(StatsCommand._collect_stats)
 
             stats_text = f"""
 <b>📊 Статистика бота</b>
 
 <b>Пользователи:</b>
-• Всего: {total_users}
-• Активных сегодня: {active_today}
-• Активных за неделю: {active_week}
-• Забаненных: {banned_users}
+• Всего: {counters['total_users']}
+• Активных сегодня: {counters['active_today']}
+• Активных за неделю: {counters['active_week']}
+• Забаненных: {counters['banned_users']}
 
 <b>Активность:</b>
-• Сообщений отправлено: {total_messages}
-• Команд использовано: {total_commands}
-• Файлов отправлено: {total_files}
+• Сообщений отправлено: {counters['total_messages']}
+• Команд использовано: {counters['total_commands']}
+• Файлов отправлено: {counters['total_files']}
+
+<b>Кэш пользователей:</b>
+• Записей: {len(user_cache)}
+• Попаданий: {db_stats.hit_rate:.1%}
+• Запросов к БД на обновление: {db_stats.queries_per_update:.2f}
 
 <b>Система:</b>
 • База данных: ✅ Активна
@@ -84,6 +62,50 @@ class StatsCommand:
             logger.error(f"Error getting stats: {e}")
             await message.answer("❌ Ошибка при получении статистики")
 
+    @staticmethod
+    def _collect_stats() -> dict:
+        """Собирает счетчики из БД (выполняется вне event loop)"""
+        # Получаем статистику
+        total_users = User.select().count()
+
+        # Активные сегодня
+        today_start = datetime.now().replace(
+            hour=0, minute=0, second=0, microsecond=0
+        )
+        active_today = User.select().where(
+            User.last_activity >= today_start
+        ).count()
+
+        # Активные за неделю
+        week_ago = datetime.now() - timedelta(days=7)
+        active_week = User.select().where(
+            User.last_activity >= week_ago
+        ).count()
+
+        # Забаненные пользователи
+        banned_users = User.select().where(User.is_banned).count()
+
+        # Получаем общую статистику сообщений
+        total_messages = sum(
+            stats.messages_sent for stats in UserStats.select()
+        )
+        total_commands = sum(
+            stats.commands_used for stats in UserStats.select()
+        )
+        total_files = sum(
+            stats.files_sent for stats in UserStats.select()
+        )
+
+        return {
+            'total_users': total_users,
+            'active_today': active_today,
+            'active_week': active_week,
+            'banned_users': banned_users,
+            'total_messages': total_messages,
+            'total_commands': total_commands,
+            'total_files': total_files,
+        }
+
 
 # Регистрация обработчика
 @dp.message_handler(commands=['stats'], chat_type='private')
@@ -6,7 +6,7 @@ from aiogram import types
 from aiogram.types import ParseMode
 
 from app.loader import dp
-from app.models import User
+from app.database import users
 
 logger = logging.getLogger(__name__)
 
@@ -30,13 +30,7 @@ class StatusCommand:
             disk_total_gb = disk.total // (1024 ** 3)
 
             # Получаем статистику пользователей
-            total_users = User.select().count()
-            today_start = datetime.now().replace(
-                hour=0, minute=0, second=0, microsecond=0
-            )
-            active_users = User.select().where(
-                User.last_activity >= today_start
-            ).count()
+            total_users, active_users = await users.count_users()
 
             status_text = f"""
 <b>📊 Статус бота</b>
@@ -4,9 +4,9 @@ from aiogram import types
 from aiogram.types import ParseMode
 
 from app.data.config import config
+from app.database import users
 from app.handlers.base_handler import BaseCommandHandler
 from app.loader import dp
-from app.models import User
 
 logger = logging.getLogger(__name__)
 
@@ -39,7 +39,7 @@ class UnbanUserCommandHandler(BaseCommandHandler):
             if target.startswith('@'):
                 # По username
                 username = target[1:]
-                user = User.get_or_none(User.username == username)
+                user = await users.get_user_by_username(username)
                 if not user:
                     await message.answer(
                         f"❌ Пользователь @{username} не найден в базе данных!"
@@ -54,7 +54,7 @@ class UnbanUserCommandHandler(BaseCommandHandler):
                     await message.answer("❌ Неверный формат ID пользователя!")
                     return
 
-                user = User.get_or_none(User.user_id == user_id)
+                user = await users.get_user(user_id)
                 if not user:
                     await message.answer(
                         f"❌ Пользователь с ID {user_id} не найден в базе данных!"
@@ -72,7 +72,7 @@ class UnbanUserCommandHandler(BaseCommandHandler):
                 return
 
             # Разбаниваем пользователя
-            user.unban()
+            await users.unban(user)
 
             # Логируем действие
             logger.info(
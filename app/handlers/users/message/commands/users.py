@@ -1,12 +1,11 @@
 import logging
-from datetime import datetime
 
 from aiogram import types
 from aiogram.types import ParseMode
 
 from app.data.config import config
+from app.database import users
 from app.loader import dp
-from app.models import User
 
 logger = logging.getLogger(__name__)
 
@@ -23,7 +22,7 @@ class UsersCommand:
 
         try:
             # Получаем последних 10 пользователей
-            recent_users = User.select().order_by(User.created_at.desc()).limit(10)
+            recent_users = await users.get_recent_users(10)
 
             users_text = "<b>👥 Последние пользователи</b>\n\n"
 
@@ -40,13 +39,7 @@ class UsersCommand:
                 )
 
             # Добавляем общую статистику
-            total_users = User.select().count()
-            today_start = datetime.now().replace(
-                hour=0, minute=0, second=0, microsecond=0
-            )
-            active_users = User.select().where(
-                User.last_activity >= today_start
-            ).count()
+            total_users, active_users = await users.count_users()
 
             users_text += f"""
 <b>📊 Общая статистика:</b>
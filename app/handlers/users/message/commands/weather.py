@@ -1,12 +1,43 @@
 """
 Команда /weather с использованием API wrapper
 """
+import logging
+from datetime import datetime
+from typing import Any, Dict, Optional
+
 from aiogram import types
+from aiogram.utils.markdown import quote_html
 
 from app.api.weather import WeatherAPIWrapper
 from app.data.config import config
 from app.loader import dp
 from app.models import User
+from app.database import activity_buffer, users
+
+logger = logging.getLogger(__name__)
+
+# Один экземпляр на процесс: запросы идут через общий пул соединений
+weather_api = WeatherAPIWrapper()
+
+
+def summarize(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Поля ответа OpenWeatherMap, которые показываются пользователю"""
+    main = data.get('main', {})
+    description = (data.get('weather') or [{}])[0].get('description')
+    updated_at = None
+    if 'dt' in data:
+        # Время измерения: ответ мог быть взят из кэша
+        updated_at = datetime.fromtimestamp(data['dt']).strftime(
+            '%d.%m.%Y %H:%M'
+        )
+    return {
+        'temp': main.get('temp'),
+        'feels_like': main.get('feels_like'),
+        'humidity': main.get('humidity'),
+        'wind_speed': data.get('wind', {}).get('speed'),
+        'description': description,
+        'updated_at': updated_at,
+    }
 
 
 class WeatherCommand:
@@ -14,10 +45,10 @@ class WeatherCommand:
 
     @staticmethod
     @dp.message_handler(commands=['weather'])
-    async def handle(message: types.Message):
+    async def handle(message: types.Message, db_user: Optional[User] = None):
         """Обработчик команды /weather"""
         # Проверяем, есть ли API ключ
-        if not hasattr(config, 'weather_api_key') or not config.weather_api_key:
+        if not config.api.weather_api_key:
             await message.answer(
                 "❌ Сервис погоды временно недоступен.\n"
                 "Обратитесь к администратору."
@@ -39,24 +70,27 @@ class WeatherCommand:
             return
 
         city = args.strip()
+        # Город вставляется в HTML-разметку ответов
+        city_html = quote_html(city)
 
         # Отправляем сообщение о загрузке
         loading_msg = await message.answer(
-            f"🌤 Получаю прогноз погоды для <b>{city}</b>...",
+            f"🌤 Получаю прогноз погоды для <b>{city_html}</b>...",
             parse_mode='HTML'
         )
 
         try:
-            # Создаем экземпляр API wrapper
-            weather_api = WeatherAPIWrapper(api_key=config.weather_api_key)
-
             # Получаем данные о погоде
             weather_data = await weather_api.get_weather(city)
 
-            if weather_data:
+            if weather_data and 'error' not in weather_data:
+                weather_data = {
+                    key: 'N/A' if value is None else value
+                    for key, value in summarize(weather_data).items()
+                }
                 # Формируем ответ
                 response = f"""
-🌤 <b>Прогноз погоды для {city}</b>
+🌤 <b>Прогноз погоды для {city_html}</b>
 
 🌡 <b>Температура:</b> {weather_data.get('temp', 'N/A')}°C
 🌡 <b>Ощущается как:</b> {weather_data.get('feels_like', 'N/A')}°C
@@ -72,21 +106,23 @@ class WeatherCommand:
 
                 # Обновляем статистику пользователя
                 try:
-                    user = User.get(User.user_id == message.from_user.id)
-                    user.update_activity()
-                except Exception as e:
-                    print(f"Error updating user activity: {e}")
+                    user = db_user or await users.get_user(message.from_user.id)
+                    if user:
+                        activity_buffer.touch(user)
+                except Exception:
+                    logger.exception("Error updating user activity")
 
             else:
                 await loading_msg.edit_text(
-                    f"❌ Не удалось получить прогноз погоды для <b>{city}</b>.\n"
+                    f"❌ Не удалось получить прогноз погоды для <b>{city_html}</b>.\n"
                     "Проверьте правильность названия города.",
                     parse_mode='HTML'
                 )
 
         except Exception as e:
             await loading_msg.edit_text(
-                f"❌ Ошибка при получении прогноза погоды:\n<code>{str(e)}</code>",
+                "❌ Ошибка при получении прогноза погоды:\n"
+                f"<code>{quote_html(str(e))}</code>",
                 parse_mode='HTML'
             )
 
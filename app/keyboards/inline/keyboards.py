@@ -157,6 +157,38 @@ class AdminKeyboards:
         ]
         return KeyboardBuilder.create_keyboard(buttons)
 
+    @staticmethod
+    def get_broadcast_target_keyboard() -> InlineKeyboardMarkup:
+        """Клавиатура выбора получателей рассылки"""
+        buttons = [
+            [
+                {'text': '📢 Всем пользователям', 'callback_data': 'broadcast_all'},
+                {'text': '👥 Только активным', 'callback_data': 'broadcast_active'}
+            ],
+            [
+                {'text': '🆕 Новым пользователям', 'callback_data': 'broadcast_new'},
+                {'text': '👑 Администраторам', 'callback_data': 'broadcast_admins'}
+            ],
+            [
+                {'text': '🇷🇺 Русскоязычным', 'callback_data': 'broadcast_ru'},
+                {'text': '🇬🇧 Англоязычным', 'callback_data': 'broadcast_en'}
+            ],
+            [
+                {'text': '❌ Отмена', 'callback_data': 'cancel'}
+            ]
+        ]
+        return KeyboardBuilder.create_keyboard(buttons)
+
+    @staticmethod
+    def get_broadcast_progress_keyboard() -> InlineKeyboardMarkup:
+        """Клавиатура под сообщением о ходе рассылки"""
+        buttons = [
+            [
+                {'text': '⏹ Остановить рассылку', 'callback_data': 'broadcast_stop'}
+            ]
+        ]
+        return KeyboardBuilder.create_keyboard(buttons)
+
     @staticmethod
     def get_backup_keyboard() -> InlineKeyboardMarkup:
         """Клавиатура для резервных копий"""
@@ -6,6 +6,12 @@ from aiogram.contrib.fsm_storage.memory import MemoryStorage
 from aiogram.contrib.fsm_storage.redis import RedisStorage2
 
 from app.data.config import config
+from app.utils.outbound import OutboundScheduler, ScheduledBot
+from app.utils.profiling import startup_profiler
+from app.utils.routing import RoutedDispatcher
+from app.utils.scheduling import (
+    AdmissionController, ChatOrderedDispatcher, StateTracker, UpdateClassifier
+)
 
 logger = logging.getLogger(__name__)
 
@@ -33,9 +39,21 @@ class BotLoader:
             logger.info("Using Memory storage")
 
     def setup_bot(self) -> None:
-        self.bot = Bot(
+        outbound = None
+        if config.outbound.enabled:
+            outbound = OutboundScheduler(
+                # Every worker sends for its own chats with its own budget
+                global_rate=config.outbound.global_rate
+                / max(config.sharding.workers, 1),
+                chat_rate=config.outbound.chat_rate,
+                chat_burst=config.outbound.chat_burst,
+                group_rate=config.outbound.group_rate / 60,
+                max_retries=config.outbound.max_retries
+            )
+        self.bot = ScheduledBot(
             token=config.bot.token,
-            parse_mode=types.ParseMode.HTML
+            parse_mode=types.ParseMode.HTML,
+            outbound=outbound
         )
         logger.info("Bot initialized")
 
@@ -43,15 +61,46 @@ class BotLoader:
         if self.bot is None or self.storage is None:
             raise RuntimeError("Bot and storage must be initialized first")
 
-        self.dp = Dispatcher(self.bot, storage=self.storage)
-        logger.info("Dispatcher initialized")
+        if config.dispatcher.mode == 'ordered':
+            admission = AdmissionController(
+                high_watermark=config.dispatcher.high_watermark,
+                low_watermark=config.dispatcher.low_watermark,
+                max_pending=config.dispatcher.max_pending,
+                max_age=config.dispatcher.max_age,
+                admins=config.admin.owner_ids
+            )
+            states = StateTracker(
+                maxsize=config.dispatcher.state_maxsize,
+                ttl=config.dispatcher.state_ttl
+            )
+            states.attach(self.storage)
+            classifier = UpdateClassifier(
+                admins=config.admin.owner_ids,
+                states=states
+            )
+            self.dp = ChatOrderedDispatcher(
+                self.bot,
+                storage=self.storage,
+                concurrency=config.dispatcher.concurrency,
+                admission=admission,
+                classifier=classifier,
+                weights=config.dispatcher.weights
+            )
+        else:
+            self.dp = RoutedDispatcher(self.bot, storage=self.storage)
+        logger.info(f"Dispatcher initialized ({config.dispatcher.mode} mode)")
 
     def initialize(self) -> Tuple[Bot, Dispatcher]:
         logger.info("Starting basic bot initialization...")
-
-        self.setup_storage()
-        self.setup_bot()
-        self.setup_dispatcher()
+        profile = startup_profiler.phase
+
+        with profile('BotLoader.initialize'):
+            with profile('setup_storage'):
+                self.setup_storage()
+            with profile('setup_bot'):
+                self.setup_bot()
+            with profile('setup_dispatcher'):
+                self.setup_dispatcher()
 
         if self.bot is None or self.dp is None:
             raise RuntimeError("Failed to initialize bot or dispatcher")
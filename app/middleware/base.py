@@ -1,47 +1,138 @@
 import logging
+import sys
 import time
-from typing import Any, Awaitable, Callable, Dict, Union
+from typing import Any, Dict, List, Union
 
-from aiogram import BaseMiddleware
+from aiogram.dispatcher.handler import CancelHandler
+from aiogram.dispatcher.middlewares import BaseMiddleware
 from aiogram.types import Message, CallbackQuery
 
+from app.data.config import config
+from app.utils.metrics import event_label, middleware_latency
+
 logger = logging.getLogger(__name__)
 
 
 class BaseCustomMiddleware(BaseMiddleware):
+    """Runs pre_process before the handler of a message or callback
+    query and post_process after it.
+
+    aiogram 2 triggers on_process_* once the filters of a handler
+    passed, and on_post_process_* from a finally clause: post_process
+    runs also when the handler raised or a middleware cancelled it, for
+    every update whose pre_process completed.
+    """
+
     def __init__(self) -> None:
         super().__init__()
         self.name: str = self.__class__.__name__
+        # Key of the update data holding [started, pre_done]
+        self.timing_key: str = f'_{self.name}_timing'
+
+    async def on_process_message(self, message: Message,
+                                 data: Dict[str, Any]) -> None:
+        await self.enter(message, data)
+
+    async def on_process_callback_query(self, call: CallbackQuery,
+                                        data: Dict[str, Any]) -> None:
+        await self.enter(call, data)
+
+    async def on_post_process_message(self, message: Message,
+                                      results: List[Any],
+                                      data: Dict[str, Any]) -> None:
+        await self.leave(message, results, data)
+
+    async def on_post_process_callback_query(self, call: CallbackQuery,
+                                             results: List[Any],
+                                             data: Dict[str, Any]) -> None:
+        await self.leave(call, results, data)
 
-    async def __call__(
+    async def enter(
             self,
-            handler: Callable[
-                [Union[Message, CallbackQuery], Dict[str, Any]],
-                Awaitable[Any]
-            ],
             event: Union[Message, CallbackQuery],
             data: Dict[str, Any]
-    ) -> Any:
-        """Basic method of calling middleware"""
-        start_time: float = time.time()
+    ) -> None:
+        # A handler raising SkipHandler triggers on_process_* again for
+        # the next one, the update is still pre-processed once
+        if self.timing_key in data:
+            return
 
+        timing = data[self.timing_key] = [time.perf_counter_ns(), 0]
         try:
             await self.pre_process(event, data)
-            result: Any = await handler(event, data)
-            await self.post_process(event, data, result)
-            return result
+        except CancelHandler:
+            raise
+        except Exception as e:
+            logger.error(f"Error in {self.name}: {e}")
+            raise
+        timing[1] = time.perf_counter_ns()
 
+    async def leave(
+            self,
+            event: Union[Message, CallbackQuery],
+            results: List[Any],
+            data: Dict[str, Any]
+    ) -> None:
+        timing = data.pop(self.timing_key, None)
+        if timing is None:
+            # No handler matched or an earlier middleware cancelled
+            return
+
+        started, pre_done = timing
+        handler_done: int = time.perf_counter_ns() if pre_done else 0
+        try:
+            if pre_done:
+                await self.post_process(event, data, results)
         except Exception as e:
             logger.error(f"Error in {self.name}: {e}")
             raise
         finally:
+            finished: int = time.perf_counter_ns()
+            if config.metrics.enabled:
+                self.record_latency(
+                    event, data, started, pre_done or finished,
+                    handler_done, finished
+                )
+
             # Runtime logging
-            execution_time: float = time.time() - start_time
-            if execution_time > 1.0:  # Logging slow requests
+            execution_time: float = (finished - started) / 1e9
+            if execution_time > config.logging.slow_request:
                 logger.warning(
                     f"Slow request in {self.name}: {execution_time:.2f}s"
                 )
 
+    @staticmethod
+    def handler_failed() -> bool:
+        """Whether post_process runs because the handler raised"""
+        error = sys.exc_info()[1]
+        return error is not None and not isinstance(error, CancelHandler)
+
+    def record_latency(
+            self,
+            event: Union[Message, CallbackQuery],
+            data: Dict[str, Any],
+            started: int,
+            pre_done: int,
+            handler_done: int,
+            finished: int
+    ) -> None:
+        """Observes pre_process, handler and post_process time"""
+        label = data.get('event_label')
+        if label is None:
+            label = data['event_label'] = event_label(event)
+
+        if handler_done:
+            middleware_latency.observe_phases(
+                (self.name, label),
+                pre_done - started,
+                handler_done - pre_done,
+                finished - handler_done
+            )
+        else:
+            middleware_latency.observe_phases(
+                (self.name, label), pre_done - started
+            )
+
     async def pre_process(
             self,
             event: Union[Message, CallbackQuery],
@@ -3,8 +3,8 @@ from typing import Any, Dict
 
 from aiogram.types import Message, CallbackQuery
 
+from app.database import activity_buffer, begin_update, end_update, users
 from app.middleware.base import BaseCustomMiddleware
-from app.models import User
 
 logger = logging.getLogger(__name__)
 
@@ -13,13 +13,15 @@ class DatabaseMiddleware(BaseCustomMiddleware):
     async def pre_process(self, event: Message | CallbackQuery, data: Dict[str, Any]):
         """Preprocessing with a database"""
         user_id = event.from_user.id
+        # Identity map shared by the middleware and handlers of this update
+        data['db_context'] = begin_update()
 
         try:
-            user = User.get_or_none(User.user_id == user_id)
+            user = await users.get_user(user_id)
             data['db_user'] = user
 
             if user:
-                user.update_activity()
+                activity_buffer.touch(user)
                 logger.debug(f"User activity updated: {user_id}")
 
         except Exception as e:
@@ -27,5 +29,9 @@ class DatabaseMiddleware(BaseCustomMiddleware):
             data['db_user'] = None
 
     async def post_process(self, event: Message | CallbackQuery, data: Dict[str, Any], result: Any):
-
-        pass
+        """Accounts database queries of the update and ends its identity
+        map. aiogram calls it from a finally clause, after a failed or
+        cancelled handler too."""
+        context = data.pop('db_context', None)
+        if context:
+            end_update(context)
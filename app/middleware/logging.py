@@ -1,15 +1,35 @@
 import logging
+import time
 from typing import Any, Dict
 
 from aiogram.types import Message, CallbackQuery
 
+from app.data.config import config
 from app.middleware.base import BaseCustomMiddleware
+from app.utils.misc.log_sampling import begin_sample, end_sample
 
 logger = logging.getLogger(__name__)
 
 
 class LoggingMiddleware(BaseCustomMiddleware):
+    """Logs incoming events.
+
+    With LOG_SAMPLE_RATE below 1 only that share of updates is logged
+    as it happens; the logs of the others are written only when they
+    fail or take longer than LOG_SLOW_REQUEST.
+    """
+
+    def __init__(self, sample_rate: float = config.logging.sample_rate,
+                 slow_request: float = config.logging.slow_request) -> None:
+        super().__init__()
+        self.sample_rate: float = sample_rate
+        self.slow_request: float = slow_request
+
     async def pre_process(self, event: Message | CallbackQuery, data: Dict[str, Any]):
+        if self.sample_rate < 1.0:
+            data['_log_sample'] = (
+                begin_sample(self.sample_rate), time.perf_counter()
+            )
         user = event.from_user
 
         if isinstance(event, Message):
@@ -24,4 +44,12 @@ class LoggingMiddleware(BaseCustomMiddleware):
             )
 
     async def post_process(self, event: Message | CallbackQuery, data: Dict[str, Any], result: Any):
-        logger.info(f"Handler completed successfully for {self.name}")
+        failed = self.handler_failed()
+        if not failed and logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Handler completed successfully for {self.name}")
+
+        sample = data.pop('_log_sample', None)
+        if sample is not None:
+            token, started = sample
+            slow = time.perf_counter() - started > self.slow_request
+            end_sample(token, keep=failed or slow)
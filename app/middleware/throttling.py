@@ -1,39 +1,105 @@
 import logging
-import time
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional
 
+from aiogram.dispatcher.handler import CancelHandler
 from aiogram.types import Message, CallbackQuery
 
+from app.data.config import config, ThrottlingConfig
 from app.middleware.base import BaseCustomMiddleware
+from app.utils.throttling import (
+    BaseThrottleBackend,
+    MemoryThrottleBackend,
+    ThrottleResult,
+)
+from app.utils.throttling.backends import Limit
 
 logger = logging.getLogger(__name__)
 
 
+def create_throttle_backend(settings: ThrottlingConfig) -> BaseThrottleBackend:
+    """Creates the backend selected by THROTTLE_BACKEND"""
+    local = MemoryThrottleBackend(settings.strategy, settings.max_keys)
+
+    if settings.backend == 'redis':
+        from redis import asyncio as aioredis
+
+        from app.utils.throttling.redis_backend import RedisThrottleBackend
+
+        redis = aioredis.Redis(
+            host=config.redis.host,
+            port=config.redis.port,
+            db=config.redis.db,
+            password=config.redis.password or None,
+            socket_timeout=settings.redis_timeout,
+            socket_connect_timeout=settings.redis_timeout
+        )
+        logger.info("Using Redis throttling backend")
+        return RedisThrottleBackend(
+            redis,
+            strategy=settings.strategy,
+            timeout=settings.redis_timeout,
+            fallback=local
+        )
+
+    return local
+
+
 class ThrottlingMiddleware(BaseCustomMiddleware):
-    def __init__(self, rate_limit: float = 0.5):
+    def __init__(
+            self,
+            settings: Optional[ThrottlingConfig] = None,
+            backend: Optional[BaseThrottleBackend] = None
+    ):
         super().__init__()
-        self.rate_limit = rate_limit
-        self.last_request = {}
+        self.settings: ThrottlingConfig = settings or config.throttling
+        self.backend: BaseThrottleBackend = (
+            backend or create_throttle_backend(self.settings)
+        )
+
+    def get_limits(
+            self,
+            event: Message | CallbackQuery
+    ) -> List[Limit]:
+        """Scopes, keys and rates that apply to the event"""
+        settings = self.settings
+        user_id = event.from_user.id
+        limits = [('user', user_id, settings.user_limit, settings.user_period)]
+
+        message = event if isinstance(event, Message) else event.message
+        if message and message.chat.type in ['group', 'supergroup']:
+            limits.append((
+                'chat', message.chat.id,
+                settings.chat_limit, settings.chat_period
+            ))
+
+        if isinstance(event, Message):
+            command = (event.get_command(pure=True) or '').lower()
+            if command in settings.command_limits:
+                limit, period = settings.command_limits[command]
+                limits.append((f'command:{command}', user_id, limit, period))
+
+        return limits
 
     async def pre_process(self, event: Message | CallbackQuery, data: Dict[str, Any]):
         """Checking the Frequency Limit"""
-        user_id = event.from_user.id
-        current_time = time.time()
-
-        # Checking the Frequency Limit
-        if user_id in self.last_request:
-            time_passed = current_time - self.last_request[user_id]
-            if time_passed < self.rate_limit:
-                if isinstance(event, Message):
-                    await event.answer(
-                        "⚠️ Слишком много запросов. Подождите немного."
-                    )
-                elif isinstance(event, CallbackQuery):
-                    await event.answer(
-                        "⚠️ Слишком много запросов. Подождите немного.",
-                        show_alert=True
-                    )
-                raise Exception("Rate limit exceeded")
-
-        # Updating the time of the last request
-        self.last_request[user_id] = current_time
+        result = await self.backend.check(self.get_limits(event))
+        if not result.allowed:
+            if result.notify:
+                await self.notify(event, result)
+            logger.debug(
+                f"Throttled {event.from_user.id}, "
+                f"retry after {result.retry_after:.2f}s"
+            )
+            raise CancelHandler()
+
+    async def notify(self, event: Message | CallbackQuery, result: ThrottleResult):
+        """Sends the notice once per throttled streak"""
+        text = "⚠️ Слишком много запросов. Подождите немного."
+
+        if isinstance(event, Message):
+            await event.answer(text)
+        elif isinstance(event, CallbackQuery):
+            await event.answer(text, show_alert=True)
+
+    async def close(self) -> None:
+        await self.backend.close()
@@ -0,0 +1,16 @@
+from datetime import datetime
+
+from peewee import BigIntegerField, DateTimeField, Model
+
+from app.models import User
+
+
+class BlockedUser(Model):
+    """Users the bot cannot write to: they blocked it, deleted their
+    account or never started it. Broadcasts skip them."""
+    user_id = BigIntegerField(primary_key=True)
+    blocked_at = DateTimeField(default=datetime.now)
+
+    class Meta:
+        database = User._meta.database
+        table_name = 'blocked_users'
@@ -0,0 +1,162 @@
+import asyncio
+import functools
+import logging
+import os
+import signal
+import sys
+from typing import Any, Dict, List, Optional, Union
+
+from aiogram import Bot
+
+from app.data.config import config
+from app.utils.polling import OffsetStore
+from app.utils.sharding.channel import WorkerChannel
+from app.utils.sharding.ingress import (
+    PollingIngress, ShardRouter, WebhookIngress
+)
+
+logger = logging.getLogger(__name__)
+
+WORKER_INDEX_ENV = 'SHARD_WORKER_INDEX'
+# Pause before restarting a worker that exited on its own
+RESTART_DELAY = 1.0
+# Time workers get to finish running updates before they are killed
+STOP_TIMEOUT = 30.0
+
+
+def worker_socket(index: int) -> str:
+    return os.path.join(config.sharding.socket_dir, f'worker-{index}.sock')
+
+
+class Supervisor:
+    """Runs the ingress and keeps WORKERS worker processes alive.
+
+    Workers are started with the same command line as the supervisor
+    and SHARD_WORKER_INDEX in their environment, which makes bot.py run
+    them as shard workers. The ingress routes every update by chat id,
+    so a chat always lands on the same worker and its FSM state stays
+    in that worker's storage. Events a worker publishes, such as the
+    users it changed, are passed on to the others.
+    """
+
+    def __init__(self, bot: Bot, workers: int,
+                 allowed_updates: Optional[List[str]] = None) -> None:
+        self.bot: Bot = bot
+        self.workers: int = workers
+        self.allowed_updates: Optional[List[str]] = allowed_updates
+        self.channels: List[WorkerChannel] = []
+        self.router: Optional[ShardRouter] = None
+        self.ingress: Optional[Union[PollingIngress, WebhookIngress]] = None
+        self._processes: Dict[int, asyncio.subprocess.Process] = {}
+        self._monitors: List[asyncio.Task] = []
+        self._stopping: bool = False
+
+    async def run(self) -> None:
+        stopped = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stopped.set)
+
+        os.makedirs(config.sharding.socket_dir, exist_ok=True)
+        for index in range(self.workers):
+            channel = WorkerChannel(
+                index, worker_socket(index), config.sharding.queue_size
+            )
+            channel.on_event = functools.partial(self.relay, index)
+            channel.start()
+            self.channels.append(channel)
+            self._monitors.append(asyncio.create_task(self._keep_alive(index)))
+
+        self.router = ShardRouter(self.channels)
+        self.ingress = self.create_ingress()
+        await self.ingress.start()
+        logger.info(f"Supervisor started {self.workers} workers")
+
+        try:
+            await stopped.wait()
+        finally:
+            await self.stop()
+
+    def create_ingress(self) -> Union[PollingIngress, WebhookIngress]:
+        if config.bot.use_webhook:
+            return WebhookIngress(
+                self.bot,
+                self.router,
+                url=config.bot.webhook_url,
+                path=config.bot.webhook_path,
+                host=config.bot.webhook_host,
+                port=config.bot.webhook_port,
+                secret=config.bot.webhook_secret,
+                allowed_updates=self.allowed_updates,
+                max_connections=config.bot.webhook_max_connections,
+                skip_updates=config.polling.skip_updates
+            )
+        return PollingIngress(
+            self.bot,
+            self.router,
+            self.allowed_updates,
+            timeout=config.polling.timeout,
+            store=OffsetStore(config.polling.offset_file),
+            skip_updates=config.polling.skip_updates
+        )
+
+    def relay(self, source: int, event: Dict[str, Any]) -> None:
+        for channel in self.channels:
+            if channel.index != source and not channel.post(event):
+                logger.warning(
+                    f"Worker {channel.index} is behind, event dropped"
+                )
+
+    async def stop(self) -> None:
+        """Stops taking updates, delivers the queued ones and lets the
+        workers finish before they exit"""
+        logger.info("Supervisor shutting down...")
+        self._stopping = True
+
+        if self.ingress:
+            await self.ingress.stop()
+        for channel in self.channels:
+            await channel.close()
+
+        for monitor in self._monitors:
+            monitor.cancel()
+        for process in self._processes.values():
+            if process.returncode is None:
+                process.terminate()
+
+        for index, process in self._processes.items():
+            try:
+                await asyncio.wait_for(process.wait(), STOP_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.warning(f"Worker {index} did not stop, killing it")
+                process.kill()
+                await process.wait()
+
+        session = await self.bot.get_session()
+        await session.close()
+        logger.info(f"Supervisor stopped, {self.router.routed} updates routed")
+
+    async def _keep_alive(self, index: int) -> None:
+        while not self._stopping:
+            process = await self._spawn(index)
+            code = await process.wait()
+            if self._stopping:
+                return
+            logger.error(
+                f"Worker {index} exited with code {code}, restarting"
+            )
+            await asyncio.sleep(RESTART_DELAY)
+
+    async def _spawn(self, index: int) -> asyncio.subprocess.Process:
+        env = dict(os.environ)
+        env[WORKER_INDEX_ENV] = str(index)
+        # sys.orig_argv keeps '-m module' intact, sys.argv does not
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, *sys.orig_argv[1:], env=env,
+            # SIGINT from the terminal goes to the supervisor only, it
+            # stops the workers in order
+            start_new_session=True
+        )
+        self._processes[index] = process
+        logger.info(f"Worker {index} started, pid {process.pid}")
+        return process
@@ -0,0 +1,25 @@
+from .engine import (
+    ABORTED, BroadcastCheckpoint, BroadcastJob, Broadcaster, CANCELLED,
+    FINISHED, RUNNING, Recipients
+)
+from .recipients import KeysetRecipients
+from .segments import (
+    Bitset, BitsetRecipients, Segment, SegmentIndex, SegmentRecipients
+)
+
+__all__ = [
+    'ABORTED',
+    'Bitset',
+    'BitsetRecipients',
+    'BroadcastCheckpoint',
+    'BroadcastJob',
+    'Broadcaster',
+    'CANCELLED',
+    'FINISHED',
+    'KeysetRecipients',
+    'RUNNING',
+    'Recipients',
+    'Segment',
+    'SegmentIndex',
+    'SegmentRecipients',
+]
@@ -0,0 +1,365 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from typing import Awaitable, Callable, Deque, List, Optional, Protocol
+
+from aiogram import Bot
+from aiogram.utils.exceptions import ChatNotFound, RetryAfter, Unauthorized
+
+from app.utils.outbound import bulk
+
+logger = logging.getLogger(__name__)
+
+# Outcomes of a send
+SENT = 'sent'
+BLOCKED = 'blocked'
+FAILED = 'failed'
+
+# States of a job
+RUNNING = 'running'
+FINISHED = 'finished'
+CANCELLED = 'cancelled'
+# Given up after MAX_RUNS failed runs
+ABORTED = 'aborted'
+
+# Tries of a send answered with RetryAfter, on top of the retries of the
+# outbound scheduler if the bot has one
+MAX_ATTEMPTS = 3
+# Runs of a broadcast that failed, such as on a database error, before
+# it is given up; the pause before the next one grows with each
+MAX_RUNS = 3
+RUN_RETRY_DELAY = 5.0
+
+
+class Recipients(Protocol):
+    """Recipient ids in a fixed order, a page at a time: `page` goes on
+    after the id `after`"""
+
+    async def count(self) -> int:
+        ...
+
+    async def page(self, after: Optional[int], limit: int) -> List[int]:
+        ...
+
+
+@dataclass
+class BroadcastJob:
+    # The message copied to every recipient
+    from_chat_id: int
+    message_id: int
+    target: str
+    # Where the admin sees the progress
+    admin_chat_id: int
+    progress_message_id: Optional[int] = None
+    state: str = RUNNING
+    # Recipients when the broadcast started
+    total: int = 0
+    # Every recipient up to this one, in the order of the recipients, is
+    # done; None before the first one
+    cursor: Optional[int] = None
+    # Outcomes of the recipients up to the cursor
+    sent: int = 0
+    blocked: int = 0
+    failed: int = 0
+    # Seconds spent sending, over all runs of the job
+    elapsed: float = 0.0
+    created_at: float = field(default_factory=time.time)
+
+    @property
+    def done(self) -> int:
+        return self.sent + self.blocked + self.failed
+
+
+class BroadcastCheckpoint:
+    """The running broadcast in a local JSON file.
+
+    Like the polling offset, the file is replaced atomically, a crash
+    leaves the previous checkpoint or the new one.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path: str = path
+
+    def load(self) -> Optional[BroadcastJob]:
+        try:
+            with open(self.path) as file:
+                return BroadcastJob(**json.load(file))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning(f"Ignoring unreadable checkpoint {self.path}: {e}")
+            return None
+
+    def save(self, job: BroadcastJob) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w') as file:
+            json.dump(asdict(job), file)
+        os.replace(temporary, self.path)
+
+    def clear(self) -> None:
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class Broadcaster:
+    """Copies a message to every recipient of a target, one broadcast at
+    a time.
+
+    Recipient ids are read a page at a time and sent by `concurrency`
+    workers inside bulk(): with the outbound scheduler the sends keep
+    Telegram's rate limits and give way to replies to users. Users the
+    bot cannot write to are passed to `mark_blocked`, so later
+    broadcasts skip them.
+
+    Sends finish out of order. The checkpoint holds the cursor, the id
+    up to which every send is done, with the counts of those sends, and
+    is saved every `interval` seconds and when the broadcast stops. A
+    broadcast restarted after a crash goes on after the saved cursor:
+    nobody is missed, the sends since that checkpoint go out again.
+    At most `window` sends are past the cursor at any time.
+
+    A run that fails is resumed the same way in the process, up to
+    MAX_RUNS runs; then the job is marked failed and its checkpoint
+    dropped, so a new broadcast can start.
+    """
+
+    def __init__(
+            self,
+            store: BroadcastCheckpoint,
+            recipients: Callable[[str], Recipients],
+            mark_blocked: Callable[[List[int]], Awaitable[None]],
+            on_progress: Optional[
+                Callable[[Bot, BroadcastJob, float], Awaitable[None]]
+            ] = None,
+            concurrency: int = 20,
+            page_size: int = 1000,
+            window: Optional[int] = None,
+            interval: float = 5.0
+    ) -> None:
+        self.store: BroadcastCheckpoint = store
+        self.recipients: Callable[[str], Recipients] = recipients
+        self.mark_blocked = mark_blocked
+        self.on_progress = on_progress
+        self.concurrency: int = concurrency
+        self.page_size: int = page_size
+        self.window: int = window or concurrency * 4
+        self.interval: float = interval
+        self.job: Optional[BroadcastJob] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping: bool = False
+        # [user id, outcome] of the sends past the cursor, in order
+        self._pending: Deque[list] = deque()
+        self._room: Optional[asyncio.Semaphore] = None
+        self._blocked: List[int] = []
+        # Clock time the current run started and job.elapsed at that time
+        self._started: float = 0.0
+        self._elapsed: float = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, bot: Bot, job: BroadcastJob) -> asyncio.Task:
+        if self.running:
+            raise RuntimeError("A broadcast is already running")
+        self.job = job
+        self._stopping = False
+        self._task = asyncio.create_task(self._run(bot, job))
+        return self._task
+
+    def resume(self, bot: Bot) -> Optional[BroadcastJob]:
+        """Starts the broadcast of the checkpoint, if one was running"""
+        job = self.store.load()
+        if job is None or job.state != RUNNING:
+            return None
+        logger.info(
+            f"Resuming broadcast to {job.target} after user {job.cursor}, "
+            f"{job.done}/{job.total} done"
+        )
+        self.start(bot, job)
+        return job
+
+    def cancel(self) -> None:
+        """Stops the broadcast for good, the sends in flight finish"""
+        if self.running:
+            self.job.state = CANCELLED
+            self._stopping = True
+
+    async def close(self, timeout: Optional[float] = None) -> None:
+        """Stops the broadcast until the next start, waiting up to
+        `timeout` for the sends in flight"""
+        if not self.running:
+            return
+        self._stopping = True
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), timeout)
+        except asyncio.TimeoutError:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def _run(self, bot: Bot, job: BroadcastJob) -> None:
+        for run in range(1, MAX_RUNS + 1):
+            try:
+                await self._run_once(bot, job)
+                break
+            except Exception:
+                if self._stopping:
+                    # Cancelled, or resumed by the next start
+                    logger.exception(f"Broadcast to {job.target} failed")
+                    break
+                if run == MAX_RUNS:
+                    logger.exception(
+                        f"Broadcast to {job.target} failed, giving up"
+                    )
+                    job.state = ABORTED
+                    await self._checkpoint(job)
+                    break
+                delay = RUN_RETRY_DELAY * run
+                logger.exception(
+                    f"Broadcast to {job.target} failed, resuming after "
+                    f"user {job.cursor} in {delay:.0f}s"
+                )
+                await asyncio.sleep(delay)
+
+        rate = job.done / job.elapsed if job.elapsed else 0.0
+        logger.info(
+            f"Broadcast to {job.target} {job.state}: {job.sent} sent, "
+            f"{job.blocked} blocked, {job.failed} failed in "
+            f"{job.elapsed:.0f}s ({rate:.1f}/s)"
+        )
+        await self._report(bot, job, rate)
+
+    async def _run_once(self, bot: Bot, job: BroadcastJob) -> None:
+        """Sends from the cursor on; the checkpoint is saved whatever
+        happens"""
+        self._pending.clear()
+        self._room = asyncio.Semaphore(self.window)
+        self._started = time.monotonic()
+        self._elapsed = job.elapsed
+        queue: asyncio.Queue = asyncio.Queue(self.concurrency)
+        workers = [
+            asyncio.create_task(self._work(bot, job, queue))
+            for _ in range(self.concurrency)
+        ]
+        ticker = asyncio.create_task(self._tick(bot, job))
+        try:
+            recipients = self.recipients(job.target)
+            if job.cursor is None:
+                job.total = await recipients.count()
+            await self._produce(recipients, queue)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+            if not self._stopping:
+                job.state = FINISHED
+        finally:
+            ticker.cancel()
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(ticker, *workers, return_exceptions=True)
+            await self._checkpoint(job)
+
+    async def _produce(self, recipients: Recipients,
+                       queue: asyncio.Queue) -> None:
+        after = self.job.cursor
+        while not self._stopping:
+            page = await recipients.page(after, self.page_size)
+            if not page:
+                return
+            for user_id in page:
+                # Bounds the sends past the cursor, and so the repeats
+                # after a crash
+                await self._room.acquire()
+                if self._stopping:
+                    return
+                entry = [user_id, None]
+                self._pending.append(entry)
+                await queue.put(entry)
+            after = page[-1]
+
+    async def _work(self, bot: Bot, job: BroadcastJob,
+                    queue: asyncio.Queue) -> None:
+        with bulk():
+            while True:
+                entry = await queue.get()
+                if entry is None:
+                    return
+                entry[1] = await self._send(bot, job, entry[0])
+                self._advance(job)
+
+    async def _send(self, bot: Bot, job: BroadcastJob, user_id: int) -> str:
+        for _ in range(MAX_ATTEMPTS):
+            try:
+                await bot.copy_message(
+                    user_id, job.from_chat_id, job.message_id
+                )
+                return SENT
+            except RetryAfter as e:
+                await asyncio.sleep(e.timeout)
+            except (Unauthorized, ChatNotFound):
+                # Blocked the bot, deleted the account or never started it
+                return BLOCKED
+            except Exception as e:
+                logger.debug(f"Broadcast to {user_id} failed: {e}")
+                return FAILED
+        return FAILED
+
+    def _advance(self, job: BroadcastJob) -> None:
+        """Moves the cursor over the sends done in order"""
+        while self._pending and self._pending[0][1] is not None:
+            user_id, outcome = self._pending.popleft()
+            self._room.release()
+            job.cursor = user_id
+            if outcome == SENT:
+                job.sent += 1
+            elif outcome == BLOCKED:
+                job.blocked += 1
+                self._blocked.append(user_id)
+            else:
+                job.failed += 1
+
+    async def _tick(self, bot: Bot, job: BroadcastJob) -> None:
+        done, updated = job.done, time.monotonic()
+        while True:
+            await asyncio.sleep(self.interval)
+            await self._checkpoint(job)
+            now = time.monotonic()
+            rate = (job.done - done) / (now - updated)
+            done, updated = job.done, now
+            await self._report(bot, job, rate)
+
+    async def _checkpoint(self, job: BroadcastJob) -> None:
+        job.elapsed = self._elapsed + time.monotonic() - self._started
+        # Marked before the cursor passes them in the file, a crash in
+        # between only sends to them again
+        blocked, self._blocked = self._blocked, []
+        try:
+            await self.mark_blocked(blocked)
+        except Exception as e:
+            logger.error(f"Failed to mark {len(blocked)} blocked users: {e}")
+            self._blocked.extend(blocked)
+        try:
+            if job.state == RUNNING:
+                self.store.save(job)
+            else:
+                self.store.clear()
+        except OSError as e:
+            logger.error(f"Failed to save the broadcast checkpoint: {e}")
+
+    async def _report(self, bot: Bot, job: BroadcastJob,
+                      rate: float) -> None:
+        if self.on_progress is None:
+            return
+        try:
+            await self.on_progress(bot, job, rate)
+        except Exception as e:
+            logger.warning(f"Failed to report broadcast progress: {e}")
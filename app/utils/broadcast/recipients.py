@@ -0,0 +1,36 @@
+from typing import Any, Awaitable, Callable, List, Optional
+
+from peewee import Field, Select
+
+
+class KeysetRecipients:
+    """Values of `key` over the rows of `query`, ascending, a page at a
+    time.
+
+    Each page asks for the values after the last one seen, the database
+    walks the index from there; nothing is held between pages, and a
+    broadcast resumes from any id. `key` must be unique, and so
+    indexed. `run` awaits a blocking call off the event loop, such as
+    db_executor.run.
+    """
+
+    def __init__(self, query: Select, key: Field,
+                 run: Callable[..., Awaitable[Any]]) -> None:
+        self.query: Select = query
+        self.key: Field = key
+        self.run: Callable[..., Awaitable[Any]] = run
+
+    def _page(self, after: Optional[int], limit: int) -> List[int]:
+        query = self.query
+        if after is not None:
+            query = query.where(self.key > after)
+        query = query.order_by(self.key).limit(limit).tuples()
+        return [row[0] for row in query]
+
+    async def count(self) -> int:
+        return await self.run(self.query.count)
+
+    async def page(self, after: Optional[int], limit: int) -> List[int]:
+        """Up to `limit` ids greater than `after`, from the first one if
+        `after` is None"""
+        return await self.run(self._page, after, limit)
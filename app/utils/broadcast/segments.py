@@ -0,0 +1,316 @@
+import asyncio
+import functools
+import logging
+import operator
+import time
+from array import array
+from datetime import datetime, timedelta
+from typing import (
+    Any, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, Set,
+    Tuple
+)
+
+from peewee import Expression, Field, Select
+
+logger = logging.getLogger(__name__)
+
+# Rows read per query while building the index, the event loop applies
+# each page in one step
+BUILD_PAGE = 10_000
+# SQLite allows 999 bound parameters per statement
+TOUCH_CHUNK = 900
+# Slots looked at per step when reading ids out of a bitset
+SCAN_SLOTS = 4096
+
+
+class Segment:
+    """Users matching a condition over their row, or whose `field` is
+    within the last `days` days. The window of the latter moves with
+    time, see SegmentIndex."""
+
+    def __init__(self, where: Optional[Expression] = None,
+                 field: Optional[Field] = None, days: int = 0) -> None:
+        if (where is None) == (field is None):
+            raise ValueError("A segment needs a condition or a field")
+        self.where: Optional[Expression] = where
+        self.field: Optional[Field] = field
+        self.days: int = days
+
+    def since(self, now: datetime) -> datetime:
+        return now - timedelta(days=self.days)
+
+    def condition(self, now: datetime) -> Expression:
+        if self.field is None:
+            return self.where
+        return self.field >= self.since(now)
+
+
+class Bitset:
+    """A bit per slot in a bytearray, cheap to change one bit of"""
+
+    __slots__ = ('data',)
+
+    def __init__(self, size: int = 0) -> None:
+        self.data: bytearray = bytearray((size >> 3) + 1)
+
+    def grow(self, size: int) -> None:
+        missing = (size >> 3) + 1 - len(self.data)
+        if missing > 0:
+            self.data.extend(bytes(missing))
+
+    def assign(self, slot: int, value: bool) -> None:
+        if value:
+            self.data[slot >> 3] |= 1 << (slot & 7)
+        else:
+            self.data[slot >> 3] &= ~(1 << (slot & 7)) & 0xFF
+
+    def to_int(self) -> int:
+        return int.from_bytes(self.data, 'little')
+
+
+class BitsetRecipients:
+    """User ids of the slots set in `bits`, in slot order, for
+    Broadcaster"""
+
+    def __init__(self, values: array, bits: int) -> None:
+        self.values: array = values
+        self.bits: int = bits
+        # Last id returned and the slot after it
+        self._last: Optional[int] = None
+        self._next: int = 0
+
+    async def count(self) -> int:
+        return self.bits.bit_count()
+
+    async def page(self, after: Optional[int], limit: int) -> List[int]:
+        if after is None:
+            slot = 0
+        elif after == self._last:
+            slot = self._next
+        else:
+            # A resumed broadcast, found once by a scan in C
+            slot = self.values.index(after) + 1
+
+        ids: List[int] = []
+        end = len(self.values)
+        while slot < end and len(ids) < limit:
+            chunk = (self.bits >> slot) & ((1 << SCAN_SLOTS) - 1)
+            while chunk and len(ids) < limit:
+                lowest = chunk & -chunk
+                found = slot + lowest.bit_length() - 1
+                ids.append(self.values[found])
+                chunk ^= lowest
+            if len(ids) < limit or not chunk:
+                slot += SCAN_SLOTS
+            else:
+                slot = found + 1
+        if ids:
+            self._last, self._next = ids[-1], found + 1
+        return ids
+
+
+class SegmentRecipients:
+    """Users in every segment of `include` and none of `exclude`,
+    combined when first asked for, after a refresh of the index"""
+
+    def __init__(self, index: 'SegmentIndex', include: Sequence[str],
+                 exclude: Sequence[str] = ()) -> None:
+        self.index: SegmentIndex = index
+        self.include: Sequence[str] = include
+        self.exclude: Sequence[str] = exclude
+        self._recipients: Optional[BitsetRecipients] = None
+
+    async def _resolve(self) -> BitsetRecipients:
+        if self._recipients is None:
+            await self.index.refresh()
+            self._recipients = BitsetRecipients(
+                self.index.values,
+                self.index.select(self.include, self.exclude)
+            )
+        return self._recipients
+
+    async def count(self) -> int:
+        return await (await self._resolve()).count()
+
+    async def page(self, after: Optional[int], limit: int) -> List[int]:
+        return await (await self._resolve()).page(after, limit)
+
+
+class SegmentIndex:
+    """Segments of users materialized as bitsets.
+
+    Every user has a slot, the primary key of its row: new users take
+    the next slots, so the index grows at the end and keeps its order.
+    `values` holds the user id of each slot and every segment a bitset
+    with the slots of its users. Segments combine as Python ints, a few
+    milliseconds for a million users, and their ids stream straight to
+    Broadcaster.
+
+    Membership is decided by the database: every segment's condition is
+    a column of the query reading the rows. The first refresh reads the
+    whole table, a page at a time. Later ones read only the rows added
+    since, the users passed to `touch`, and every `window_step` seconds
+    the rows that entered or left the window of a time segment, so
+    those segments lag by up to `window_step`.
+    """
+
+    def __init__(
+            self,
+            query: Select,
+            key: Field,
+            value: Field,
+            segments: Dict[str, Segment],
+            run: Callable[..., Awaitable[Any]],
+            window_step: float = 3600.0
+    ) -> None:
+        self.query: Select = query
+        self.key: Field = key
+        self.value: Field = value
+        self.segments: Dict[str, Segment] = segments
+        self.run: Callable[..., Awaitable[Any]] = run
+        self.window_step: float = window_step
+        self.values: array = array('q')
+        self.bitsets: Dict[str, Bitset] = {}
+        self.built: bool = False
+        self._ints: Dict[str, int] = {}
+        self._max_key: int = 0
+        self._touched: Set[int] = set()
+        # Time the windows of the time segments were last moved to
+        self._window_at: Optional[datetime] = None
+        self._lock: asyncio.Lock = asyncio.Lock()
+
+    def touch(self, user_id: int) -> None:
+        """The user's row changed, it is read again on the next refresh"""
+        self._touched.add(user_id)
+
+    def bits(self, name: str) -> int:
+        """Slots of the segment as an int, bit n for slot n"""
+        bits = self._ints.get(name)
+        if bits is None:
+            bits = self._ints[name] = self.bitsets[name].to_int()
+        return bits
+
+    def select(self, include: Sequence[str],
+               exclude: Sequence[str] = ()) -> int:
+        """Slots in every segment of `include` and none of `exclude`"""
+        bits = functools.reduce(operator.and_, map(self.bits, include))
+        for name in exclude:
+            bits &= ~self.bits(name)
+        return bits
+
+    def recipients(self, include: Sequence[str],
+                   exclude: Sequence[str] = ()) -> SegmentRecipients:
+        return SegmentRecipients(self, include, exclude)
+
+    async def refresh(self) -> None:
+        """Brings the segments up to date with the table"""
+        async with self._lock:
+            started = time.perf_counter()
+            now = datetime.now()
+            if not self.built:
+                await self._build(now)
+                logger.info(
+                    f"Segment index built: {len(self.values)} slots, "
+                    f"{len(self.segments)} segments in "
+                    f"{time.perf_counter() - started:.2f}s"
+                )
+                return
+
+            conditions = [self.key > self._max_key]
+            if (now - self._window_at).total_seconds() >= self.window_step:
+                conditions.extend(self._moved(self._window_at, now))
+                self._window_at = now
+            rows = await self.run(
+                self._read, functools.reduce(operator.or_, conditions), now
+            )
+            touched, self._touched = self._touched, set()
+            touched = list(touched)
+            for i in range(0, len(touched), TOUCH_CHUNK):
+                rows.extend(await self.run(
+                    self._read,
+                    self.value.in_(touched[i:i + TOUCH_CHUNK]),
+                    now
+                ))
+            self._apply(rows)
+            self._forget(set(touched) - {row[1] for row in rows})
+            logger.debug(
+                f"Segment index refreshed: {len(rows)} rows in "
+                f"{(time.perf_counter() - started) * 1000:.0f} ms"
+            )
+
+    def _moved(self, before: datetime, now: datetime) -> Iterable[Expression]:
+        """Rows whose time field left or entered a window since `before`"""
+        for segment in self.segments.values():
+            if segment.field is None:
+                continue
+            field = segment.field
+            yield (field >= segment.since(before)) & (
+                field < segment.since(now)
+            )
+            yield field >= before
+
+    def _read(self, where: Optional[Expression], now: datetime,
+              limit: Optional[int] = None) -> List[Tuple]:
+        columns = [self.key, self.value] + [
+            segment.condition(now) for segment in self.segments.values()
+        ]
+        query = self.query.select(*columns)
+        if where is not None:
+            query = query.where(where)
+        query = query.order_by(self.key)
+        if limit:
+            query = query.limit(limit)
+        return list(query.tuples())
+
+    async def _build(self, now: datetime) -> None:
+        # Touches from here on may concern rows already read
+        self._touched = set()
+        self.values = array('q')
+        self.bitsets = {name: Bitset() for name in self.segments}
+        self._max_key = 0
+        while True:
+            rows = await self.run(
+                self._read, self.key > self._max_key, now, BUILD_PAGE
+            )
+            if not rows:
+                break
+            self._apply(rows)
+        self._window_at = now
+        self.built = True
+
+    def _apply(self, rows: List[Tuple]) -> None:
+        if not rows:
+            return
+        size = max(self._max_key, max(row[0] for row in rows)) + 1
+        if size > len(self.values):
+            self.values.frombytes(bytes(
+                self.values.itemsize * (size - len(self.values))
+            ))
+        bitsets = list(self.bitsets.values())
+        for bitset in bitsets:
+            bitset.grow(size)
+        datas = [bitset.data for bitset in bitsets]
+        values = self.values
+        for row in rows:
+            slot = row[0]
+            values[slot] = row[1]
+            index, bit = slot >> 3, 1 << (slot & 7)
+            for data, member in zip(datas, row[2:]):
+                if member:
+                    data[index] |= bit
+                else:
+                    data[index] &= ~bit & 0xFF
+        self._max_key = size - 1
+        self._ints.clear()
+
+    def _forget(self, user_ids: Set[int]) -> None:
+        """Clears the slots of touched users whose rows are gone"""
+        for user_id in user_ids:
+            try:
+                slot = self.values.index(user_id)
+            except ValueError:
+                continue
+            for bitset in self.bitsets.values():
+                bitset.assign(slot, False)
+        if user_ids:
+            self._ints.clear()
@@ -2,7 +2,9 @@ import logging
 from typing import Callable, Any
 
 from aiogram import Dispatcher
-from aiogram.types import Message, CallbackQuery
+from aiogram.types import Message, CallbackQuery, Update
+
+from app.utils.misc.updates import describe_update
 
 logger = logging.getLogger(__name__)
 
@@ -86,7 +88,8 @@ async def shutdown_database_hook():
 
 
 async def message_logging_hook(message: Message):
-    logger.info(f"Message from {message.from_user.id}: {message.text}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Message from {message.from_user.id}: {message.text}")
 
 
 async def callback_logging_hook(callback: CallbackQuery):
@@ -94,7 +97,10 @@ async def callback_logging_hook(callback: CallbackQuery):
 
 
 async def error_logging_hook(error: Exception, update: Any):
-    logger.error(f"Error occurred: {error} in update: {update}")
+    summary = (
+        describe_update(update) if isinstance(update, Update) else update
+    )
+    logger.error(f"Error occurred: {error} in {summary}")
 
 
 def setup_hooks(dp: Dispatcher) -> EventHooks:
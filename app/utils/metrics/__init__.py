@@ -0,0 +1,55 @@
+import logging
+
+from prometheus_client import start_http_server
+
+from .api import (
+    api_cache_lookups,
+    api_cache_refresh_errors,
+    currency_refresh_errors,
+)
+from .latency import (
+    LatencyRecorder,
+    event_label,
+    handler_latency,
+    middleware_latency,
+    timed,
+)
+from .outbound import (
+    outbound_queued,
+    outbound_retry_after,
+    outbound_wait,
+)
+from .scheduling import (
+    pending_updates,
+    update_latency,
+    update_wait,
+    updates_shed,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def start_metrics_server(port: int) -> None:
+    """Exposes /metrics for Prometheus on the given port"""
+    start_http_server(port)
+    logger.info(f"Metrics server started on port {port}")
+
+
+__all__ = [
+    'api_cache_lookups',
+    'api_cache_refresh_errors',
+    'currency_refresh_errors',
+    'LatencyRecorder',
+    'event_label',
+    'handler_latency',
+    'middleware_latency',
+    'outbound_queued',
+    'outbound_retry_after',
+    'outbound_wait',
+    'pending_updates',
+    'start_metrics_server',
+    'timed',
+    'update_latency',
+    'update_wait',
+    'updates_shed',
+]
@@ -0,0 +1,21 @@
+from prometheus_client import Counter
+
+api_cache_lookups = Counter(
+    'bot_api_cache_lookups',
+    'Lookups in the caches of external API responses by result: hit, '
+    'stale (served while refreshed), miss, coalesced (joined a miss '
+    'in flight)',
+    ['cache', 'result']
+)
+
+api_cache_refresh_errors = Counter(
+    'bot_api_cache_refresh_errors',
+    'Failed background refreshes of stale responses, served stale '
+    'meanwhile',
+    ['cache']
+)
+
+currency_refresh_errors = Counter(
+    'bot_currency_refresh_errors',
+    'Failed refreshes of the currency rates, the previous ones are kept'
+)
@@ -0,0 +1,19 @@
+from prometheus_client import Counter, Gauge
+
+from .latency import LatencyRecorder
+
+outbound_queued = Gauge(
+    'bot_outbound_queued',
+    'Sends waiting for their rate limit budget or in flight'
+)
+
+outbound_retry_after = Counter(
+    'bot_outbound_retry_after',
+    'RetryAfter answers from Telegram'
+)
+
+outbound_wait = LatencyRecorder(
+    'bot_outbound_wait_seconds',
+    'Time sends wait for their rate limit budget by priority',
+    ['priority']
+)
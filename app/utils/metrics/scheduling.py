@@ -0,0 +1,28 @@
+from prometheus_client import Counter, Gauge
+
+from .latency import LatencyRecorder
+
+# Shedding only happens under overload, a locked counter is cheap enough
+updates_shed = Counter(
+    'bot_updates_shed',
+    'Updates dropped by admission control',
+    ['reason', 'kind']
+)
+
+pending_updates = Gauge(
+    'bot_pending_updates',
+    'Updates queued in the dispatcher and not finished yet'
+)
+
+update_wait = LatencyRecorder(
+    'bot_update_wait_seconds',
+    'Time updates spend queued in the dispatcher by scheduling class',
+    ['class']
+)
+
+update_latency = LatencyRecorder(
+    'bot_update_latency_seconds',
+    'Time from the arrival of an update to the end of its handling '
+    'by scheduling class',
+    ['class']
+)
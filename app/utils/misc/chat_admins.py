@@ -0,0 +1,113 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Tuple
+
+from aiogram import Bot
+
+from app.data.config import config
+
+logger = logging.getLogger(__name__)
+
+ADMIN_STATUSES = frozenset(('creator', 'administrator'))
+
+
+class ChatAdminCache:
+    """TTL + LRU cache of chat administrators.
+
+    A miss loads the whole admin list of the chat with one
+    getChatAdministrators call, every member check in that chat is then
+    a dict lookup. Concurrent misses for a chat share one request.
+    chat_member updates keep cached chats current; Telegram sends them
+    only to bots that are admins themselves, otherwise the TTL bounds
+    how long a changed role stays unnoticed.
+    """
+
+    def __init__(self, ttl: float = 300.0, maxsize: int = 10_000,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.ttl: float = ttl
+        self.maxsize: int = maxsize
+        self.clock: Callable[[], float] = clock
+        # chat id -> (expires at, user id -> status)
+        self._chats: 'OrderedDict[int, Tuple[float, Dict[int, str]]]' = (
+            OrderedDict()
+        )
+        self._loading: Dict[int, asyncio.Future] = {}
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def __len__(self) -> int:
+        return len(self._chats)
+
+    async def get_admins(self, bot: Bot, chat_id: int) -> Dict[int, str]:
+        """Returns user id -> status of the chat administrators"""
+        item = self._chats.get(chat_id)
+        if item is not None:
+            expires_at, admins = item
+            if expires_at > self.clock():
+                self._chats.move_to_end(chat_id)
+                self.hits += 1
+                return admins
+            del self._chats[chat_id]
+
+        self.misses += 1
+        future = self._loading.get(chat_id)
+        if future is None:
+            future = asyncio.ensure_future(self._fetch(bot, chat_id))
+            self._loading[chat_id] = future
+            future.add_done_callback(
+                lambda done: self._store(chat_id, done)
+            )
+        # A cancelled waiter must not cancel the request shared with others
+        return await asyncio.shield(future)
+
+    async def is_admin(self, bot: Bot, chat_id: int, user_id: int) -> bool:
+        admins = await self.get_admins(bot, chat_id)
+        return user_id in admins
+
+    def update_member(self, chat_id: int, user_id: int, status: str) -> None:
+        """Applies a role change to a cached chat"""
+        # A list requested before the change must not be cached
+        self._loading.pop(chat_id, None)
+        item = self._chats.get(chat_id)
+        if item is None:
+            return
+
+        admins = item[1]
+        if status in ADMIN_STATUSES:
+            admins[user_id] = status
+        else:
+            admins.pop(user_id, None)
+
+    def invalidate(self, chat_id: int) -> None:
+        self._loading.pop(chat_id, None)
+        self._chats.pop(chat_id, None)
+
+    def clear(self) -> None:
+        self._chats.clear()
+
+    async def _fetch(self, bot: Bot, chat_id: int) -> Dict[int, str]:
+        members = await bot.get_chat_administrators(chat_id)
+        return {member.user.id: member.status for member in members}
+
+    def _store(self, chat_id: int, future: asyncio.Future) -> None:
+        if self._loading.get(chat_id) is not future:
+            # Invalidated while loading
+            return
+        del self._loading[chat_id]
+        if future.cancelled() or future.exception() is not None:
+            return
+
+        admins = future.result()
+        self._chats[chat_id] = (self.clock() + self.ttl, admins)
+        self._chats.move_to_end(chat_id)
+        while len(self._chats) > self.maxsize:
+            self._chats.popitem(last=False)
+        logger.debug(f"Loaded {len(admins)} admins of chat {chat_id}")
+
+
+chat_admins = ChatAdminCache(
+    ttl=config.admin.chat_admins_ttl,
+    maxsize=config.admin.chat_admins_cache_size
+)
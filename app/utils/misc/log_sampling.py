@@ -0,0 +1,145 @@
+import logging
+import random
+import threading
+from collections import OrderedDict, deque
+from contextvars import ContextVar, Token
+from typing import Deque, Hashable, Optional
+
+from app.utils.throttling.limiter import SlidingWindowLimiter
+
+# Records of an unsampled update kept in case it fails or turns out slow
+MAX_BUFFERED = 20
+
+
+class RateLimitFilter(logging.Filter):
+    """Caps identical lines and lines per logger within a period.
+
+    A line is identified by its logger, level and text, or by a
+    `log_key` passed in `extra` when the text contains varying parts.
+    The next line that gets through after a suppressed streak carries
+    the number of dropped ones.
+    """
+
+    def __init__(self, per_key: int, per_logger: int = 0,
+                 period: float = 60.0, max_keys: int = 10_000) -> None:
+        super().__init__()
+        self.period: float = period
+        self.max_keys: int = max_keys
+        self._keys: Optional[SlidingWindowLimiter] = (
+            SlidingWindowLimiter(per_key, period, max_keys=max_keys)
+            if per_key > 0 else None
+        )
+        self._loggers: Optional[SlidingWindowLimiter] = (
+            SlidingWindowLimiter(per_logger, period, max_keys=max_keys)
+            if per_logger > 0 else None
+        )
+        self._suppressed: 'OrderedDict[Hashable, int]' = OrderedDict()
+        # Records come from the event loop and from executor threads
+        self._lock: threading.Lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = getattr(record, 'log_key', None)
+        if key is None:
+            key = (record.name, record.levelno, record.getMessage())
+        else:
+            key = (record.name, key)
+
+        keys, loggers = self._keys, self._loggers
+        with self._lock:
+            if keys is not None and not keys.hit(key).allowed:
+                self._suppress(key)
+                return False
+            if loggers is not None and not loggers.hit(record.name).allowed:
+                self._suppress(record.name)
+                return False
+
+            dropped = self._suppressed.pop(key, 0)
+            dropped_by_logger = self._suppressed.pop(record.name, 0)
+
+        if dropped:
+            self._annotate(record, f"{dropped} identical lines suppressed")
+        if dropped_by_logger:
+            self._annotate(
+                record, f"{dropped_by_logger} lines of the logger suppressed"
+            )
+        return True
+
+    def _suppress(self, key: Hashable) -> None:
+        self._suppressed[key] = self._suppressed.pop(key, 0) + 1
+        if len(self._suppressed) > self.max_keys:
+            self._suppressed.popitem(last=False)
+
+    def _annotate(self, record: logging.LogRecord, note: str) -> None:
+        record.msg = f"{record.getMessage()} [{note}]"
+        record.args = None
+
+
+class UpdateSample:
+    """Sampling decision and held back records of one update"""
+    __slots__ = ('sampled', 'buffer')
+
+    def __init__(self, sampled: bool) -> None:
+        self.sampled: bool = sampled
+        self.buffer: Deque[logging.LogRecord] = deque(maxlen=MAX_BUFFERED)
+
+
+_sample: ContextVar[Optional[UpdateSample]] = ContextVar(
+    'log_sample', default=None
+)
+
+
+class SamplingFilter(logging.Filter):
+    """Head-based sampling of update logs.
+
+    Records below WARNING of an update that was not picked are held in
+    the update's buffer. A WARNING or above inside the update, or
+    `end_sample(keep=True)`, writes the buffer out, so failing and slow
+    updates keep their whole trail. Records outside of an update pass.
+    """
+
+    def __init__(self, handler: logging.Handler) -> None:
+        super().__init__()
+        self.handler: logging.Handler = handler
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        sample = _sample.get()
+        if sample is None or sample.sampled:
+            return True
+
+        if record.levelno < logging.WARNING:
+            sample.buffer.append(record)
+            return False
+
+        self.replay(sample)
+        return True
+
+    def replay(self, sample: UpdateSample) -> None:
+        sample.sampled = True
+        while sample.buffer:
+            self.handler.handle(sample.buffer.popleft())
+
+
+_filter: Optional[SamplingFilter] = None
+
+
+def install_sampling(handler: logging.Handler) -> SamplingFilter:
+    """Adds the sampling filter to the handler, before any rate limit so
+    that held back records are counted only once they are written"""
+    global _filter
+    _filter = SamplingFilter(handler)
+    handler.addFilter(_filter)
+    return _filter
+
+
+def begin_sample(rate: float) -> Token:
+    """Decides whether the current update is logged"""
+    sampled = rate >= 1.0 or random.random() < rate
+    return _sample.set(UpdateSample(sampled))
+
+
+def end_sample(token: Token, keep: bool = False) -> None:
+    """Writes the held back records when keep is set, drops them otherwise"""
+    sample = _sample.get()
+    _sample.reset(token)
+    if keep and sample and not sample.sampled and _filter:
+        _filter.replay(sample)
@@ -1,5 +1,137 @@
+import json
 import logging
+import queue
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Any, Dict, List, Optional
 
-logging.basicConfig(format=u'%(message)s',
-                    level=logging.INFO,
-                    )
+from app.data.config import LoggingConfig
+from app.utils.misc.log_sampling import RateLimitFilter, install_sampling
+
+_listener: Optional[QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, for log collectors"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload: Dict[str, Any] = {
+            'time': datetime.fromtimestamp(
+                record.created, tz=timezone.utc
+            ).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            payload['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            payload['exception'] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False)
+
+
+class LogQueueHandler(QueueHandler):
+    """QueueHandler that only merges the message with its arguments.
+
+    The stock handler runs a formatter in the calling thread; here the
+    real formatting is left to the listener thread, the event loop only
+    pays for getMessage() and a queue put.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            # Tracebacks hold frames that may change before the listener
+            # gets to them
+            record.exc_text = logging.Formatter().formatException(
+                record.exc_info
+            )
+            record.exc_info = None
+        return record
+
+
+def create_handlers(settings: LoggingConfig) -> List[logging.Handler]:
+    formatter = (
+        JsonFormatter() if settings.json
+        else logging.Formatter(settings.format)
+    )
+    handlers: List[logging.Handler] = [
+        RotatingFileHandler(
+            settings.file,
+            maxBytes=settings.max_size,
+            backupCount=settings.backup_count,
+            encoding='utf-8'
+        ),
+        logging.StreamHandler(),
+    ]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return handlers
+
+
+def create_queue_handler(log_queue: 'queue.SimpleQueue[logging.LogRecord]',
+                         settings: LoggingConfig) -> LogQueueHandler:
+    """Queue handler with sampling and rate limits applied before a record
+    is queued, so dropped records cost nothing on the listener"""
+    handler = LogQueueHandler(log_queue)
+    if settings.sample_rate < 1.0:
+        install_sampling(handler)
+    if settings.rate_limit > 0 or settings.logger_rate_limit > 0:
+        handler.addFilter(RateLimitFilter(
+            per_key=settings.rate_limit,
+            per_logger=settings.logger_rate_limit,
+            period=settings.rate_period
+        ))
+    return handler
+
+
+def setup_logging(settings: LoggingConfig) -> QueueListener:
+    """Routes the root logger through a queue to a background thread.
+
+    Handlers attached to the root logger are replaced, so calling it
+    again reconfigures logging instead of duplicating output.
+    """
+    global _listener
+    stop_logging()
+
+    log_queue: 'queue.SimpleQueue[logging.LogRecord]' = queue.SimpleQueue()
+    _listener = QueueListener(
+        log_queue, *create_handlers(settings), respect_handler_level=True
+    )
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+    root.addHandler(create_queue_handler(log_queue, settings))
+    root.setLevel(getattr(logging, settings.level.upper(), logging.INFO))
+
+    _listener.start()
+    return _listener
+
+
+def stop_logging() -> None:
+    """Writes out queued records and closes the handlers.
+
+    Records logged afterwards, during the rest of the shutdown, go
+    straight to stderr instead of a queue nobody reads.
+    """
+    global _listener
+    if _listener is None:
+        return
+
+    root = logging.getLogger()
+    direct = logging.StreamHandler()
+    for handler in _listener.handlers:
+        if type(handler) is logging.StreamHandler:
+            direct.setFormatter(handler.formatter)
+    for handler in root.handlers[:]:
+        if isinstance(handler, LogQueueHandler):
+            root.removeHandler(handler)
+    root.addHandler(direct)
+
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
@@ -0,0 +1,72 @@
+import logging
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterator, List
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ShutdownStage:
+    name: str
+    drained: int = 0
+    aborted: int = 0
+    elapsed: float = 0.0
+    failed: bool = False
+
+
+class ShutdownReport:
+    """Timing and outcome of the shutdown stages under one deadline.
+
+    Each stage runs in `stage()`, which times it and logs an exception
+    instead of raising it, so a failing stage does not skip the ones
+    after it. Stages waiting for work take `remaining()` as their
+    timeout, the whole drain then fits in `timeout` seconds.
+    """
+
+    def __init__(self, timeout: float) -> None:
+        self.timeout: float = timeout
+        self.started: float = time.monotonic()
+        self.stages: List[ShutdownStage] = []
+
+    def remaining(self) -> float:
+        return max(0.0, self.started + self.timeout - time.monotonic())
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[ShutdownStage]:
+        stage = ShutdownStage(name)
+        self.stages.append(stage)
+        started = time.monotonic()
+        try:
+            yield stage
+        except Exception as e:
+            stage.failed = True
+            logger.error(f"Shutdown stage {name} failed: {e}")
+        finally:
+            stage.elapsed = time.monotonic() - started
+
+    @property
+    def drained(self) -> int:
+        return sum(stage.drained for stage in self.stages)
+
+    @property
+    def aborted(self) -> int:
+        return sum(stage.aborted for stage in self.stages)
+
+    def log(self) -> None:
+        for stage in self.stages:
+            status = 'failed' if stage.failed else 'done'
+            logger.info(
+                f"Shutdown {stage.name}: {status} in {stage.elapsed:.2f}s, "
+                f"{stage.drained} drained, {stage.aborted} aborted"
+            )
+        elapsed = time.monotonic() - self.started
+        summary = (
+            f"Shutdown took {elapsed:.2f}s: {self.drained} drained, "
+            f"{self.aborted} aborted"
+        )
+        if self.aborted or any(stage.failed for stage in self.stages):
+            logger.warning(summary)
+        else:
+            logger.info(summary)
@@ -0,0 +1,71 @@
+from typing import Optional
+
+from aiogram import types
+
+# Length of the message text or callback data kept in update summaries
+SUMMARY_TEXT_LENGTH = 50
+
+
+def get_chat_id(update: types.Update) -> Optional[int]:
+    """Chat the update belongs to, the sender for updates without a chat
+    (inline queries, callbacks of inline messages); None for polls"""
+    event = (
+        update.message or update.edited_message
+        or update.channel_post or update.edited_channel_post
+        or update.my_chat_member or update.chat_member
+        or update.chat_join_request
+    )
+    if event is not None:
+        return event.chat.id
+
+    callback = update.callback_query
+    if callback is not None:
+        if callback.message is not None:
+            return callback.message.chat.id
+        return callback.from_user.id
+
+    event = (
+        update.inline_query or update.chosen_inline_result
+        or update.shipping_query or update.pre_checkout_query
+    )
+    if event is not None:
+        return event.from_user.id
+    if update.poll_answer is not None:
+        return update.poll_answer.user.id
+    return None
+
+
+def describe_update(update: Optional[types.Update]) -> str:
+    """One line summary of an update for logs.
+
+    The full update is megabytes of JSON per minute under load and
+    carries user data, the id, the sender, the chat and the start of the
+    text are enough to find it.
+    """
+    if update is None:
+        return 'update None'
+
+    parts = [f"update {update.update_id}"]
+    message = (
+        update.message or update.edited_message
+        or update.channel_post or update.edited_channel_post
+    )
+    if message:
+        parts.append(f"message {message.message_id}")
+        if message.from_user:
+            parts.append(f"from {message.from_user.id}")
+        parts.append(f"in chat {message.chat.id}")
+        text = message.text or message.caption
+        if text:
+            parts.append(repr(text[:SUMMARY_TEXT_LENGTH]))
+        else:
+            parts.append(f"<{message.content_type}>")
+    elif update.callback_query:
+        callback = update.callback_query
+        parts.append(f"callback from {callback.from_user.id}")
+        if callback.data:
+            parts.append(repr(callback.data[:SUMMARY_TEXT_LENGTH]))
+    elif update.inline_query:
+        parts.append(f"inline query from {update.inline_query.from_user.id}")
+
+    return ' '.join(parts)
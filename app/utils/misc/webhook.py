@@ -0,0 +1,68 @@
+import asyncio
+import hmac
+import logging
+from typing import Any, Optional
+
+from aiogram import types
+from aiogram.dispatcher.webhook import (
+    RESPONSE_TIMEOUT, SendMessage, WebhookRequestHandler
+)
+from aiohttp import web
+
+from app.data.config import config
+
+logger = logging.getLogger(__name__)
+
+SECRET_TOKEN_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+class TelegramWebhookHandler(WebhookRequestHandler):
+    """aiogram webhook handler that rejects requests without the secret
+    token given to setWebhook"""
+
+    async def post(self) -> web.Response:
+        secret = config.bot.webhook_secret
+        if secret:
+            received = self.request.headers.get(SECRET_TOKEN_HEADER, '')
+            if not hmac.compare_digest(received, secret):
+                logger.warning(
+                    f"Webhook request with a wrong secret token from "
+                    f"{self.request.remote}"
+                )
+                raise web.HTTPUnauthorized()
+        return await super().post()
+
+    async def process_update(self, update: types.Update) -> Any:
+        """Passes the update through the dispatcher queue when it has one,
+        aiogram calls the handlers directly otherwise"""
+        dispatcher = self.get_dispatcher()
+        submit = getattr(dispatcher, 'submit', None)
+        if submit is None:
+            return await super().process_update(update)
+
+        future = submit(update)
+        try:
+            # shield: a slow update keeps running after the response
+            return await asyncio.wait_for(
+                asyncio.shield(future), RESPONSE_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            future.add_done_callback(self.respond_via_request)
+
+
+async def answer(message: types.Message, text: str,
+                 **kwargs: Any) -> Optional[SendMessage]:
+    """Replies to a message, in the webhook response when possible.
+
+    In webhook mode the reply is returned to aiogram, which puts the
+    method into the HTTP response to Telegram and saves a request. The
+    handler must return the result, and only the first reply of an
+    update travels this way. The sent Message is not available, use
+    message.answer when it is needed. Sharded workers have no webhook
+    request to answer, aiogram sends the returned method as a request.
+    """
+    if config.bot.use_webhook:
+        return SendMessage(message.chat.id, text, **kwargs)
+
+    await message.answer(text, **kwargs)
+    return None
@@ -0,0 +1,10 @@
+from .bot import ScheduledBot
+from .scheduler import BULK, INTERACTIVE, OutboundScheduler, bulk
+
+__all__ = [
+    'BULK',
+    'INTERACTIVE',
+    'OutboundScheduler',
+    'ScheduledBot',
+    'bulk',
+]
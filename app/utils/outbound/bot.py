@@ -0,0 +1,60 @@
+import functools
+from typing import Any, Dict, FrozenSet, Optional
+
+from aiogram import Bot
+from aiogram.bot.api import Methods
+
+from .scheduler import OutboundScheduler
+
+# Methods that post a message to a chat and count against its limits.
+# Chat actions, edits and answers to callbacks pass through.
+SEND_METHODS: FrozenSet[str] = frozenset([
+    Methods.COPY_MESSAGE,
+    Methods.FORWARD_MESSAGE,
+    Methods.SEND_ANIMATION,
+    Methods.SEND_AUDIO,
+    Methods.SEND_CONTACT,
+    Methods.SEND_DICE,
+    Methods.SEND_DOCUMENT,
+    Methods.SEND_GAME,
+    Methods.SEND_INVOICE,
+    Methods.SEND_LOCATION,
+    Methods.SEND_MEDIA_GROUP,
+    Methods.SEND_MESSAGE,
+    Methods.SEND_PHOTO,
+    Methods.SEND_POLL,
+    Methods.SEND_STICKER,
+    Methods.SEND_VENUE,
+    Methods.SEND_VIDEO,
+    Methods.SEND_VIDEO_NOTE,
+    Methods.SEND_VOICE,
+])
+
+
+class ScheduledBot(Bot):
+    """Bot whose sends go through an OutboundScheduler.
+
+    Every aiogram method ends in `request`, so message.answer,
+    bot.send_message and the rest are scheduled without changes to the
+    handlers. Replies returned in a webhook response never reach the
+    bot and are not counted.
+    """
+
+    def __init__(self, *args: Any,
+                 outbound: Optional[OutboundScheduler] = None,
+                 **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.outbound: Optional[OutboundScheduler] = outbound
+
+    async def request(self, method: str, data: Optional[Dict] = None,
+                      files: Optional[Dict] = None, **kwargs: Any) -> Any:
+        chat_id = data.get('chat_id') if data else None
+        if self.outbound is None or chat_id is None \
+                or method not in SEND_METHODS:
+            return await super().request(method, data, files, **kwargs)
+        call = functools.partial(
+            super().request, method, data, files, **kwargs
+        )
+        # An uploaded stream is consumed, it cannot be sent again
+        retries = 0 if files else None
+        return await self.outbound.submit(chat_id, call, retries=retries)
@@ -0,0 +1,339 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import (
+    Any, Awaitable, Callable, Deque, Dict, Iterator, List, Optional, Set,
+    Tuple, Union
+)
+
+from aiogram.utils.exceptions import RetryAfter
+
+from app.utils.metrics import (
+    outbound_queued, outbound_retry_after, outbound_wait
+)
+
+logger = logging.getLogger(__name__)
+
+ChatId = Union[int, str]
+
+# Priorities, lower goes first
+INTERACTIVE = 0
+BULK = 1
+PRIORITY_LABELS = {INTERACTIVE: 'interactive', BULK: 'bulk'}
+
+# Seconds between sweeps of chats that have been idle long enough for
+# their budget to refill
+SWEEP_INTERVAL = 60.0
+
+_priority: ContextVar[int] = ContextVar(
+    'outbound_priority', default=INTERACTIVE
+)
+
+
+@contextmanager
+def bulk() -> Iterator[None]:
+    """Sends made inside the block queue behind interactive replies"""
+    token = _priority.set(BULK)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TokenBucket:
+    """`rate` sends per second on average, up to `burst` at once"""
+
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate: float, burst: float, now: float) -> None:
+        self.rate: float = rate
+        self.burst: float = burst
+        self.tokens: float = burst
+        self.updated: float = now
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(
+            self.burst, self.tokens + (now - self.updated) * self.rate
+        )
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Seconds until a send is allowed"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+    def full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.burst
+
+
+class Send:
+    __slots__ = ('call', 'future', 'priority', 'queued_ns', 'retries')
+
+    def __init__(self, call: Callable[[], Awaitable[Any]],
+                 future: asyncio.Future, priority: int,
+                 retries: int) -> None:
+        self.call = call
+        self.future = future
+        self.priority = priority
+        self.queued_ns = time.perf_counter_ns()
+        self.retries = retries
+
+
+class ChatQueue:
+    __slots__ = ('sends', 'bucket', 'paused_until', 'busy', 'scheduled')
+
+    def __init__(self, bucket: TokenBucket) -> None:
+        self.sends: Deque[Send] = deque()
+        self.bucket: TokenBucket = bucket
+        # Set by RetryAfter, clock time until which the chat gets nothing
+        self.paused_until: float = 0.0
+        # A send of the chat is in flight
+        self.busy: bool = False
+        # The chat is in the ready heap or the timer heap
+        self.scheduled: bool = False
+
+
+class OutboundScheduler:
+    """Sends to Telegram within its rate limits.
+
+    Telegram allows a bot about 30 messages per second overall, one per
+    second in a chat with short bursts and 20 per minute in a group;
+    beyond that it answers with RetryAfter. Every send waits here for a
+    token of the global bucket and of its chat's bucket, so the limits
+    are kept before Telegram has to enforce them.
+
+    A chat has one send in flight at a time, its messages arrive in the
+    order they were sent. RetryAfter pauses the chat it came for, other
+    chats go on, and the send is retried at the head of the chat's
+    queue. Chats whose next send is allowed wait in a heap by priority:
+    replies to users are INTERACTIVE, sends inside `bulk()` only get the
+    tokens that replies leave.
+    """
+
+    def __init__(
+            self,
+            global_rate: float = 30.0,
+            chat_rate: float = 1.0,
+            chat_burst: float = 3.0,
+            group_rate: float = 20 / 60,
+            max_retries: int = 3,
+            clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        self.chat_rate: float = chat_rate
+        self.chat_burst: float = chat_burst
+        self.group_rate: float = group_rate
+        self.max_retries: int = max_retries
+        self.clock: Callable[[], float] = clock
+        self.closed: bool = False
+        # Paced evenly: with a burst of B any second could see B more
+        # sends than the rate
+        self._global: TokenBucket = TokenBucket(global_rate, 1, clock())
+        self._chats: Dict[ChatId, ChatQueue] = {}
+        # (priority, order, chat) of chats whose next send may go now
+        self._ready: List[Tuple[int, int, ChatId]] = []
+        # (time, order, chat) of chats waiting for their budget or pause
+        self._timers: List[Tuple[float, int, ChatId]] = []
+        self._order: Iterator[int] = itertools.count()
+        self._queued: int = 0
+        self._sending: Set[asyncio.Task] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._idle: Optional[asyncio.Event] = None
+        self._next_sweep: float = 0.0
+
+    @property
+    def pending(self) -> int:
+        """Sends queued or in flight"""
+        return self._queued
+
+    async def submit(self, chat_id: ChatId,
+                     call: Callable[[], Awaitable[Any]],
+                     retries: Optional[int] = None) -> Any:
+        """Runs `call` when the budget of `chat_id` allows, returns its
+        result. RetryAfter is retried up to `retries` times."""
+        if self.closed:
+            raise RuntimeError("Outbound scheduler is closed")
+        if self._task is None:
+            self._start()
+
+        key = chat_key(chat_id)
+        now = self.clock()
+        chat = self._chats.get(key)
+        if chat is None:
+            chat = self._chats[key] = ChatQueue(self._bucket(key, now))
+        future = asyncio.get_running_loop().create_future()
+        chat.sends.append(Send(
+            call, future, _priority.get(),
+            self.max_retries if retries is None else retries
+        ))
+        self._queued += 1
+        self._idle.clear()
+        if not chat.busy and not chat.scheduled:
+            self._schedule(key, chat, now)
+        return await future
+
+    async def close(self, timeout: Optional[float] = None) -> int:
+        """Waits up to `timeout` for the queued sends, then cancels the
+        rest. Returns the number of sends cancelled."""
+        self.closed = True
+        if self._task is None:
+            return 0
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+        self._task.cancel()
+        for task in self._sending:
+            task.cancel()
+        await asyncio.gather(
+            self._task, *self._sending, return_exceptions=True
+        )
+        left = 0
+        for chat in self._chats.values():
+            for send in chat.sends:
+                left += 1
+                send.future.cancel()
+        self._chats.clear()
+        self._queued = 0
+        return left
+
+    def _start(self) -> None:
+        self._wakeup = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._task = asyncio.create_task(self._run())
+        outbound_queued.set_function(lambda: self._queued)
+
+    def _bucket(self, key: ChatId, now: float) -> TokenBucket:
+        # Groups and channels have negative ids or an @username
+        if isinstance(key, str) or key < 0:
+            return TokenBucket(self.group_rate, self.chat_burst, now)
+        return TokenBucket(self.chat_rate, self.chat_burst, now)
+
+    def _schedule(self, key: ChatId, chat: ChatQueue, now: float) -> None:
+        when = max(chat.paused_until, now + chat.bucket.delay(now))
+        chat.scheduled = True
+        if when <= now:
+            heapq.heappush(
+                self._ready, (chat.sends[0].priority, next(self._order), key)
+            )
+        else:
+            heapq.heappush(self._timers, (when, next(self._order), key))
+        self._wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            now = self.clock()
+            while self._timers and self._timers[0][0] <= now:
+                _, _, key = heapq.heappop(self._timers)
+                chat = self._chats[key]
+                heapq.heappush(self._ready, (
+                    chat.sends[0].priority, next(self._order), key
+                ))
+            if now >= self._next_sweep:
+                self._sweep(now)
+
+            if not self._ready:
+                timeout = self._timers[0][0] - now if self._timers else None
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            # The heap is read again after the wait, a reply queued
+            # meanwhile still goes before bulk sends
+            delay = self._global.delay(now)
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+
+            _, _, key = heapq.heappop(self._ready)
+            chat = self._chats[key]
+            chat.scheduled = False
+            chat.busy = True
+            self._global.take(now)
+            chat.bucket.take(now)
+            task = asyncio.create_task(self._send(key, chat, chat.sends[0]))
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+
+    async def _send(self, key: ChatId, chat: ChatQueue, send: Send) -> None:
+        if send.future.cancelled():
+            # Nobody waits for it any more, e.g. the handler timed out
+            self._done(chat)
+            chat.busy = False
+            if chat.sends:
+                self._schedule(key, chat, self.clock())
+            return
+        outbound_wait.observe_ns(
+            (PRIORITY_LABELS.get(send.priority, str(send.priority)),),
+            time.perf_counter_ns() - send.queued_ns
+        )
+        try:
+            result = await send.call()
+        except RetryAfter as e:
+            chat.paused_until = self.clock() + e.timeout
+            outbound_retry_after.inc()
+            logger.warning(
+                f"Flood control in chat {key}, paused for {e.timeout}s"
+            )
+            if send.retries > 0:
+                # Stays at the head of the chat's queue
+                send.retries -= 1
+            else:
+                self._done(chat)
+                if not send.future.done():
+                    send.future.set_exception(e)
+        except Exception as e:
+            self._done(chat)
+            if not send.future.done():
+                send.future.set_exception(e)
+        else:
+            self._done(chat)
+            if not send.future.done():
+                send.future.set_result(result)
+        finally:
+            chat.busy = False
+            if chat.sends and self._task is not None \
+                    and not self._task.done():
+                self._schedule(key, chat, self.clock())
+
+    def _done(self, chat: ChatQueue) -> None:
+        chat.sends.popleft()
+        self._queued -= 1
+        if not self._queued:
+            self._idle.set()
+
+    def _sweep(self, now: float) -> None:
+        """Forgets idle chats whose budget is full again, a new queue
+        for them starts the same"""
+        self._next_sweep = now + SWEEP_INTERVAL
+        idle = [
+            key for key, chat in self._chats.items()
+            if not chat.sends and not chat.busy
+            and chat.paused_until <= now and chat.bucket.full(now)
+        ]
+        for key in idle:
+            del self._chats[key]
+
+
+def chat_key(chat_id: ChatId) -> ChatId:
+    """The same chat given as 42 or '42' shares one queue"""
+    if isinstance(chat_id, str) and chat_id.lstrip('-').isdigit():
+        return int(chat_id)
+    return chat_id
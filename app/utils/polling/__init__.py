@@ -0,0 +1,7 @@
+from .offset import OffsetStore
+from .poller import Poller
+
+__all__ = [
+    'OffsetStore',
+    'Poller',
+]
@@ -0,0 +1,35 @@
+import logging
+import os
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class OffsetStore:
+    """The next getUpdates offset kept in a local file.
+
+    The file holds a single number and is replaced atomically, so a
+    crash leaves either the old or the new offset, never a torn one.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path: str = path
+
+    def load(self) -> Optional[int]:
+        try:
+            with open(self.path) as file:
+                return int(file.read().strip())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable offset file {self.path}: {e}")
+            return None
+
+    def save(self, offset: int) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w') as file:
+            file.write(str(offset))
+        os.replace(temporary, self.path)
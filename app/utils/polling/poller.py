@@ -0,0 +1,209 @@
+import asyncio
+import functools
+import logging
+import signal
+import time
+from collections import deque
+from typing import Deque, List, Optional, Tuple
+
+from aiogram import Bot, Dispatcher, types
+from aiogram.utils.exceptions import NetworkError, TelegramAPIError
+
+from app.utils.polling.offset import OffsetStore
+
+logger = logging.getLogger(__name__)
+
+# getUpdates returns at most this many updates
+MAX_LIMIT = 100
+# Seconds the HTTP request may take on top of the long polling timeout
+REQUEST_MARGIN = 10
+# Pause after a failed getUpdates, doubled up to MAX_ERROR_DELAY
+ERROR_DELAY = 1.0
+MAX_ERROR_DELAY = 30.0
+
+
+class Poller:
+    """Long polling without pauses that resumes where it stopped.
+
+    Each batch is handed to the dispatcher as a task and the next
+    getUpdates goes out right away, so fetching batch N+1 overlaps the
+    handling of batch N. aiogram's start_polling sleeps `relax` after
+    every batch instead, which caps throughput and adds the pause to the
+    latency of every update.
+
+    The limit of each request is the room left under `max_in_flight`:
+    when handlers fall behind, fewer updates are fetched and at the
+    bound none, so the backlog waits at Telegram instead of in memory.
+    The long polling timeout stays long, Telegram answers as soon as an
+    update arrives and a shorter one only adds idle requests.
+
+    The offset after the last batch whose handling finished is saved to
+    `store`. On restart polling continues from it, updates that arrived
+    while the bot was down are handled and the ones handled before the
+    stop are not repeated. A batch in progress at a crash is lost:
+    Telegram drops updates once a later offset has been requested. The
+    offset stays before a batch aborted on shutdown, whatever Telegram
+    still has of it is handled again.
+    """
+
+    def __init__(
+            self,
+            dp: Dispatcher,
+            store: Optional[OffsetStore] = None,
+            allowed_updates: Optional[List[str]] = None,
+            timeout: int = 25,
+            max_in_flight: int = 10_000,
+            save_interval: float = 1.0,
+            skip_updates: bool = False
+    ) -> None:
+        self.dp: Dispatcher = dp
+        self.bot: Bot = dp.bot
+        self.store: Optional[OffsetStore] = store
+        self.allowed_updates: Optional[List[str]] = allowed_updates
+        self.timeout: int = timeout
+        self.max_in_flight: int = max_in_flight
+        self.save_interval: float = save_interval
+        self.skip_updates: bool = skip_updates
+        # Offset of the next getUpdates
+        self.offset: Optional[int] = None
+        # Offset after the last batch handled, with all before it
+        self.confirmed: Optional[int] = None
+        self.in_flight: int = 0
+        self.received: int = 0
+        self._batches: Deque[Tuple[int, asyncio.Task]] = deque()
+        self._aborted: bool = False
+        self._saved: Optional[int] = None
+        self._saved_at: float = 0.0
+        self._capacity: Optional[asyncio.Event] = None
+        self._stopped: Optional[asyncio.Event] = None
+        self._fetching: Optional[asyncio.Future] = None
+
+    async def run(self) -> None:
+        """Polls until SIGTERM or SIGINT; handling of the fetched updates
+        goes on, `close` waits for it"""
+        Bot.set_current(self.bot)
+        Dispatcher.set_current(self.dp)
+
+        self._capacity = asyncio.Event()
+        self._stopped = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, self.stop)
+
+        # getUpdates does not work while a webhook is set
+        await self.bot.delete_webhook(drop_pending_updates=self.skip_updates)
+        if not self.skip_updates and self.store is not None:
+            self.offset = self.confirmed = self._saved = self.store.load()
+        logger.info(f"Polling started from offset {self.offset}")
+
+        delay = ERROR_DELAY
+        while not self._stopped.is_set():
+            limit = min(MAX_LIMIT, self.max_in_flight - self.in_flight)
+            if limit < 1:
+                self._capacity.clear()
+                await self._capacity.wait()
+                continue
+
+            self._fetching = asyncio.ensure_future(self._get_updates(limit))
+            try:
+                updates = await self._fetching
+            except asyncio.CancelledError:
+                if self._stopped.is_set():
+                    break
+                raise
+            except (NetworkError, TelegramAPIError,
+                    asyncio.TimeoutError) as e:
+                logger.error(f"getUpdates failed, retry in {delay:.0f}s: {e}")
+                await self._sleep(delay)
+                delay = min(delay * 2, MAX_ERROR_DELAY)
+                continue
+            finally:
+                self._fetching = None
+
+            delay = ERROR_DELAY
+            if updates:
+                self._dispatch(updates)
+
+        logger.info(f"Polling stopped after {self.received} updates")
+
+    def stop(self) -> None:
+        if self._stopped is None or self._stopped.is_set():
+            return
+        self._stopped.set()
+        self._capacity.set()
+        if self._fetching is not None:
+            self._fetching.cancel()
+
+    async def close(self, timeout: Optional[float] = None) -> int:
+        """Waits up to `timeout` for the fetched updates and saves the
+        offset. Returns the number of updates left unhandled."""
+        tasks = [task for _, task in self._batches]
+        left = 0
+        if tasks:
+            _, pending = await asyncio.wait(tasks, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            left = self.in_flight
+        self.save()
+        return left
+
+    def save(self) -> None:
+        if self.store is None or self.confirmed in (None, self._saved):
+            return
+        try:
+            self.store.save(self.confirmed)
+        except OSError as e:
+            logger.error(f"Failed to save the polling offset: {e}")
+            return
+        self._saved = self.confirmed
+        self._saved_at = time.monotonic()
+
+    async def _get_updates(self, limit: int) -> List[types.Update]:
+        with self.bot.request_timeout(self.timeout + REQUEST_MARGIN):
+            return await self.bot.get_updates(
+                offset=self.offset,
+                limit=limit,
+                timeout=self.timeout,
+                allowed_updates=self.allowed_updates
+            )
+
+    async def _sleep(self, delay: float) -> None:
+        try:
+            await asyncio.wait_for(self._stopped.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+
+    def _dispatch(self, updates: List[types.Update]) -> None:
+        self.offset = updates[-1].update_id + 1
+        self.received += len(updates)
+        self.in_flight += len(updates)
+        task = asyncio.create_task(
+            self.dp._process_polling_updates(updates)
+        )
+        self._batches.append((self.offset, task))
+        task.add_done_callback(
+            functools.partial(self._batch_done, len(updates))
+        )
+
+    def _batch_done(self, size: int, task: asyncio.Task) -> None:
+        self.in_flight -= size
+        self._capacity.set()
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(
+                f"Failed to process a batch of {size} updates",
+                exc_info=task.exception()
+            )
+
+        # Batches finish out of order, the offset only moves past a
+        # batch once every batch before it is done. It stops at a batch
+        # aborted on shutdown: the next start asks for it again, Telegram
+        # still has it unless a later getUpdates went out meanwhile.
+        while self._batches and self._batches[0][1].done():
+            offset, batch = self._batches.popleft()
+            if batch.cancelled():
+                self._aborted = True
+            if not self._aborted:
+                self.confirmed = offset
+        if time.monotonic() - self._saved_at >= self.save_interval:
+            self.save()
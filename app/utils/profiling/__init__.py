@@ -0,0 +1,6 @@
+from .startup import StartupProfiler, startup_profiler
+
+__all__ = [
+    'StartupProfiler',
+    'startup_profiler',
+]
@@ -0,0 +1,195 @@
+import json
+import logging
+import os
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+FLAG = '--profile-startup'
+ENV = 'STARTUP_PROFILE'
+DEFAULT_PATH = 'data/startup_profile.json'
+# Modules listed in the log, the JSON file has all of them
+REPORT_IMPORTS = 25
+
+
+@dataclass
+class ImportRecord:
+    module: str
+    # Seconds in the module's own code and in everything it imported
+    self_time: float
+    cumulative: float
+
+
+@dataclass
+class PhaseRecord:
+    name: str
+    # Seconds since the profiler started
+    start: float
+    elapsed: float
+    depth: int
+
+
+class ImportTimer:
+    """Meta path finder that times the execution of every module.
+
+    It finds nothing itself: it asks the finders after it and wraps the
+    exec_module of the loader they return, so modules keep their usual
+    loader. Like python -X importtime, the time of a module without the
+    imports it triggered is its self time.
+    """
+
+    def __init__(self) -> None:
+        self.records: List[ImportRecord] = []
+        # Module name, start and time spent in nested imports
+        self._stack: List[List[Any]] = []
+
+    def find_spec(self, fullname, path=None, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+        loader = spec.loader
+        # Builtin and frozen importers are classes and zipimport is its
+        # own loader, all shared between modules
+        if loader is not None and loader is not finder \
+                and not isinstance(loader, type) \
+                and hasattr(loader, 'exec_module'):
+            loader.exec_module = self._timed(fullname, loader.exec_module)
+        return spec
+
+    def _timed(self, name: str, exec_module):
+        def timed_exec_module(module):
+            self._stack.append([name, time.perf_counter(), 0.0])
+            try:
+                exec_module(module)
+            finally:
+                _, started, nested = self._stack.pop()
+                elapsed = time.perf_counter() - started
+                if self._stack:
+                    self._stack[-1][2] += elapsed
+                self.records.append(
+                    ImportRecord(name, elapsed - nested, elapsed)
+                )
+        return timed_exec_module
+
+
+class StartupProfiler:
+    """Import and phase timings of the startup, off unless enabled.
+
+    Enabled by the --profile-startup[=PATH] flag or the STARTUP_PROFILE
+    environment variable holding the path of the JSON report. It must be
+    enabled before the imports it should see, bot.py does it first
+    thing. `finish` logs the slowest imports and the phases and writes
+    everything to the JSON file, so startup time can be compared
+    between versions.
+    """
+
+    def __init__(self) -> None:
+        self.enabled: bool = False
+        self.path: Optional[str] = None
+        self.started: float = time.perf_counter()
+        self.phases: List[PhaseRecord] = []
+        self._imports: Optional[ImportTimer] = None
+        self._depth: int = 0
+
+    def enable_from(self, argv: Sequence[str],
+                    environ: Dict[str, str]) -> None:
+        path = environ.get(ENV)
+        for arg in argv[1:]:
+            if arg == FLAG:
+                path = path or DEFAULT_PATH
+            elif arg.startswith(f'{FLAG}='):
+                path = arg.split('=', 1)[1]
+        if not path:
+            return
+        # Shard workers inherit the environment, each gets its own file
+        index = environ.get('SHARD_WORKER_INDEX')
+        if index:
+            root, ext = os.path.splitext(path)
+            path = f'{root}.worker-{index}{ext}'
+        self.enable(path)
+
+    def enable(self, path: str = DEFAULT_PATH) -> None:
+        if self.enabled:
+            return
+        self.enabled = True
+        self.path = path
+        self.started = time.perf_counter()
+        self._imports = ImportTimer()
+        sys.meta_path.insert(0, self._imports)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+        record = PhaseRecord(
+            name, time.perf_counter() - self.started, 0.0, self._depth
+        )
+        self.phases.append(record)
+        self._depth += 1
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            record.elapsed = (
+                time.perf_counter() - self.started - record.start
+            )
+
+    def finish(self) -> None:
+        """Stops timing imports, logs the report and writes the file"""
+        if not self.enabled or self._imports is None:
+            return
+        sys.meta_path.remove(self._imports)
+        total = time.perf_counter() - self.started
+        imports = sorted(
+            self._imports.records, key=lambda r: r.self_time, reverse=True
+        )
+        self._imports = None
+        self.enabled = False
+
+        import_time = sum(record.self_time for record in imports)
+        lines = [
+            f"Startup took {total:.3f}s, {import_time:.3f}s importing "
+            f"{len(imports)} modules"
+        ]
+        for record in self.phases:
+            lines.append(
+                f"  {'  ' * record.depth}{record.name}: "
+                f"{record.elapsed * 1000:.1f} ms"
+            )
+        lines.append("Slowest imports, self / cumulative:")
+        for record in imports[:REPORT_IMPORTS]:
+            lines.append(
+                f"  {record.self_time * 1000:8.1f} ms "
+                f"{record.cumulative * 1000:8.1f} ms  {record.module}"
+            )
+        logger.info("\n".join(lines))
+
+        report = {
+            'total': total,
+            'import_time': import_time,
+            'phases': [asdict(record) for record in self.phases],
+            'imports': [asdict(record) for record in imports],
+        }
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, 'w') as f:
+                json.dump(report, f, indent=2)
+        except OSError as e:
+            logger.error(f"Failed to write the startup profile: {e}")
+            return
+        logger.info(f"Startup profile written to {self.path}")
+
+
+startup_profiler = StartupProfiler()
@@ -0,0 +1,6 @@
+from .router import MessageRouter, RoutedDispatcher
+
+__all__ = [
+    'MessageRouter',
+    'RoutedDispatcher',
+]
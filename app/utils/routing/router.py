@@ -0,0 +1,271 @@
+import asyncio
+import importlib
+import logging
+import time
+from itertools import chain
+from typing import (
+    Any, Dict, Hashable, Iterable, List, Optional, Sequence, Set, Tuple
+)
+
+from aiogram import Dispatcher, types
+from aiogram.dispatcher.filters import (
+    Command, ContentTypeFilter, FilterNotPassed, check_filters
+)
+from aiogram.dispatcher.filters.filters import AbstractFilter, FilterObj
+from aiogram.dispatcher.handler import (
+    CancelHandler, Handler, SkipHandler, _check_spec, ctx_data,
+    current_handler
+)
+
+logger = logging.getLogger(__name__)
+
+HandlerObj = Handler.HandlerObj
+
+
+def callback_key(callback: Any) -> Any:
+    """The function behind wrappers and bound methods, two instances of
+    a handler class register the same one"""
+    while hasattr(callback, '__wrapped__'):
+        callback = callback.__wrapped__
+    return getattr(callback, '__func__', callback)
+
+
+def filter_key(filter_obj: FilterObj) -> Hashable:
+    """Filters built from the same arguments compare equal, plain
+    callables such as lambdas only to themselves"""
+    flt = filter_obj.filter
+    if not isinstance(flt, AbstractFilter):
+        return flt
+    return type(flt), tuple(sorted(
+        (name, repr(value)) for name, value in vars(flt).items()
+        if not isinstance(value, Dispatcher)
+    ))
+
+
+def registration_key(record: HandlerObj) -> Tuple[Any, frozenset]:
+    return (
+        callback_key(record.handler),
+        frozenset(filter_key(f) for f in record.filters or ())
+    )
+
+
+class MessageRouter(Handler):
+    """Message handlers looked up by command and content type.
+
+    aiogram's Handler runs the filters of every registered handler in
+    turn until one passes, a message for the last of 500 commands goes
+    through 499 Command filters first. The router indexes the handlers
+    when they are registered: command handlers by command in a dict, the
+    others by the content types they accept. A message is tried only
+    against the handlers of its command and of its content type, their
+    full filters still decide as before.
+
+    Command handlers come first, in registration order, then the other
+    handlers for the content type, also in registration order. A catch
+    all text handler registered early therefore no longer swallows the
+    commands registered after it.
+
+    A handler registered again with the same filters, a second instance
+    of a handler class or a module imported twice, is skipped: the copy
+    could never run, the first one always matches before it.
+
+    Commands declared with `lazy` are known by name only. Their module
+    is imported when the first message with the command arrives, or by
+    `warm_up` in the background, and registers its handlers on import
+    as usual; the message then goes to them.
+    """
+
+    def __init__(self, dispatcher: Dispatcher, once: bool = True,
+                 middleware_key: Optional[str] = None) -> None:
+        super().__init__(dispatcher, once=once, middleware_key=middleware_key)
+        self._keys: Set[Tuple[Any, frozenset]] = set()
+        self._prefixes: Set[str] = set()
+        self._commands: Dict[str, List[HandlerObj]] = {}
+        # Non-command handlers per content type, including the ones for
+        # any content type, and the latter alone for other types
+        self._content: Dict[str, List[HandlerObj]] = {}
+        self._anything: List[HandlerObj] = []
+        # Command to the module that handles it, until the module loads
+        self._lazy: Dict[str, str] = {}
+
+    @property
+    def lazy_commands(self) -> Set[str]:
+        """Declared commands whose module is not loaded yet"""
+        return set(self._lazy)
+
+    def lazy(self, commands: Dict[str, str]) -> None:
+        """Declares commands by the module that handles them"""
+        for command, module in commands.items():
+            self._lazy[command.lower()] = module
+        self._rebuild()
+
+    def load(self, module: str) -> None:
+        """Imports a module declared with `lazy`"""
+        for command in [c for c, m in self._lazy.items() if m == module]:
+            del self._lazy[command]
+        started = time.perf_counter()
+        try:
+            importlib.import_module(module)
+        except Exception:
+            # Its commands go to the other handlers from now on, the
+            # error does not repeat on every message
+            logger.exception(f"Failed to load handlers from {module}")
+            return
+        finally:
+            self._rebuild()
+        elapsed = (time.perf_counter() - started) * 1000
+        logger.info(f"Loaded handlers from {module} in {elapsed:.0f} ms")
+
+    async def warm_up(self, delay: float = 0.0) -> None:
+        """Loads the lazy modules not used yet after `delay` seconds,
+        one per loop iteration so that updates keep being handled"""
+        await asyncio.sleep(delay)
+        loaded = 0
+        while self._lazy:
+            self.load(next(iter(self._lazy.values())))
+            loaded += 1
+            await asyncio.sleep(0)
+        logger.info(f"Handler warm-up loaded {loaded} modules")
+
+    def register(self, handler, filters=None, index=None) -> None:
+        known = {id(record) for record in self.handlers}
+        super().register(handler, filters, index)
+        record = next(r for r in self.handlers if id(r) not in known)
+
+        key = registration_key(record)
+        if key in self._keys:
+            self.handlers.remove(record)
+            logger.warning(
+                f"Skipped duplicate registration of "
+                f"{getattr(handler, '__qualname__', handler)}"
+            )
+            return
+        self._rebuild()
+
+    def unregister(self, handler) -> bool:
+        result = super().unregister(handler)
+        self._rebuild()
+        return result
+
+    def _rebuild(self) -> None:
+        self._keys = {registration_key(record) for record in self.handlers}
+        # Lazy commands only know the default prefix until they load
+        self._prefixes = {'/'} if self._lazy else set()
+        self._commands = {}
+        by_type: Dict[str, List[Tuple[int, HandlerObj]]] = {}
+        anything: List[Tuple[int, HandlerObj]] = []
+
+        for position, record in enumerate(self.handlers):
+            command, content_types = self._routing_filters(record)
+            if command is not None:
+                self._prefixes.update(command.prefixes)
+                for name in command.commands:
+                    self._commands.setdefault(name.lower(), []).append(record)
+            elif (content_types is None
+                    or types.ContentType.ANY in content_types):
+                anything.append((position, record))
+            else:
+                for content_type in content_types:
+                    by_type.setdefault(content_type, []).append(
+                        (position, record)
+                    )
+
+        self._anything = [record for _, record in anything]
+        self._content = {
+            content_type: [
+                record for _, record in sorted(
+                    routes + anything, key=lambda route: route[0]
+                )
+            ]
+            for content_type, routes in by_type.items()
+        }
+
+    @staticmethod
+    def _routing_filters(
+            record: HandlerObj
+    ) -> Tuple[Optional[Command], Optional[Sequence[str]]]:
+        command = content_types = None
+        for filter_obj in record.filters or ():
+            if isinstance(filter_obj.filter, Command):
+                command = filter_obj.filter
+            elif isinstance(filter_obj.filter, ContentTypeFilter):
+                content_types = filter_obj.filter.content_types
+        return command, content_types
+
+    def candidates(self, message: types.Message) -> Iterable[HandlerObj]:
+        """Handlers whose filters may pass for the message, in the order
+        they are tried. Loads the module of a lazy command first."""
+        name = self._command_name(message)
+        if name in self._lazy:
+            self.load(self._lazy[name])
+        routes = self._content.get(message.content_type, self._anything)
+        commands = self._commands.get(name) if name else None
+        if not commands:
+            return routes
+        return chain(commands, routes)
+
+    def _command_name(self, message: types.Message) -> Optional[str]:
+        # Command filters ignore captions unless told otherwise, looking
+        # at the caption only adds candidates whose filters then decide
+        text = message.text or message.caption
+        if not text or text[0] not in self._prefixes:
+            return None
+        return text.split(maxsplit=1)[0][1:].partition('@')[0].lower()
+
+    async def notify(self, *args):
+        """Handler.notify over the candidates of the message only"""
+        results = []
+
+        data = {}
+        ctx_data.set(data)
+
+        if self.middleware_key:
+            try:
+                await self.dispatcher.middleware.trigger(
+                    f"pre_process_{self.middleware_key}", args + (data,)
+                )
+            except CancelHandler:
+                return results
+
+        try:
+            for handler_obj in self.candidates(args[0]):
+                try:
+                    data.update(await check_filters(handler_obj.filters, args))
+                except FilterNotPassed:
+                    continue
+                ctx_token = current_handler.set(handler_obj.handler)
+                try:
+                    if self.middleware_key:
+                        await self.dispatcher.middleware.trigger(
+                            f"process_{self.middleware_key}", args + (data,)
+                        )
+                    partial_data = _check_spec(handler_obj.spec, data)
+                    response = await handler_obj.handler(*args, **partial_data)
+                    if response is not None:
+                        results.append(response)
+                    if self.once:
+                        break
+                except SkipHandler:
+                    continue
+                except CancelHandler:
+                    break
+                finally:
+                    current_handler.reset(ctx_token)
+        finally:
+            if self.middleware_key:
+                await self.dispatcher.middleware.trigger(
+                    f"post_process_{self.middleware_key}",
+                    args + (results, data)
+                )
+
+        return results
+
+
+class RoutedDispatcher(Dispatcher):
+    """Dispatcher whose message handlers go through a MessageRouter"""
+
+    def _setup_filters(self) -> None:
+        # aiogram binds its filters to the handler objects themselves,
+        # so the router has to be in place before they are bound
+        self.message_handlers = MessageRouter(self, middleware_key='message')
+        super()._setup_filters()
@@ -0,0 +1,20 @@
+from .admission import AdmissionController, update_kind
+from .classes import (
+    DEFAULT_WEIGHTS,
+    StateTracker,
+    UpdateClassifier,
+    registered_commands,
+)
+from .fair import FairQueue
+from .ordered import ChatOrderedDispatcher
+
+__all__ = [
+    'AdmissionController',
+    'ChatOrderedDispatcher',
+    'DEFAULT_WEIGHTS',
+    'FairQueue',
+    'StateTracker',
+    'UpdateClassifier',
+    'registered_commands',
+    'update_kind',
+]
@@ -0,0 +1,118 @@
+import logging
+import time
+from typing import Callable, Collection, Optional
+
+from aiogram import types
+
+from .classes import FSM
+
+logger = logging.getLogger(__name__)
+
+# Shed reasons, also the values of the 'reason' metric label
+OVERLOAD = 'overload'
+OVERFLOW = 'overflow'
+STALE = 'stale'
+
+
+def update_kind(update: types.Update) -> str:
+    """Coarse class of an update used by the shedding policy"""
+    message = update.message
+    if message is not None:
+        if message.text and message.text.startswith('/'):
+            return 'command'
+        return 'text' if message.text else 'media'
+    if update.callback_query is not None:
+        return 'callback'
+    if update.edited_message is not None:
+        return 'edited'
+    if update.channel_post is not None or update.edited_channel_post:
+        return 'channel'
+    return 'service'
+
+
+def update_sender(update: types.Update) -> Optional[int]:
+    event = update.message or update.callback_query or update.edited_message
+    if event is not None and event.from_user is not None:
+        return event.from_user.id
+    return None
+
+
+class AdmissionController:
+    """Decides which updates enter the dispatcher queue.
+
+    Plain chat traffic (text, media, edits, channel posts) is
+    sheddable; commands, callbacks, service updates, everything from
+    bot admins and the replies of users in an FSM scenario are always
+    kept: a dropped reply would stall the scenario with no answer.
+    Shedding starts when the backlog reaches `high_watermark` and stops
+    once it falls to `low_watermark`, so it does not flap around a
+    single threshold. Sheddable updates older than `max_age` are
+    dropped at any load: an echo answered minutes late is worse than
+    none. At `max_pending` every update is dropped to bound memory.
+    """
+
+    sheddable = frozenset(('text', 'media', 'edited', 'channel'))
+
+    def __init__(
+            self,
+            high_watermark: int = 5_000,
+            low_watermark: int = 1_000,
+            max_pending: int = 20_000,
+            max_age: float = 60.0,
+            admins: Collection[int] = (),
+            clock: Callable[[], float] = time.time
+    ) -> None:
+        if not 0 <= low_watermark <= high_watermark <= max_pending:
+            raise ValueError(
+                "Expected low_watermark <= high_watermark <= max_pending"
+            )
+        self.high_watermark: int = high_watermark
+        self.low_watermark: int = low_watermark
+        self.max_pending: int = max_pending
+        self.max_age: float = max_age
+        self.admins: frozenset = frozenset(admins)
+        self.clock: Callable[[], float] = clock
+        self.shedding: bool = False
+
+    def admit(self, update: types.Update, pending: int,
+              update_class: Optional[str] = None) -> Optional[str]:
+        """Returns None to admit the update, the shed reason otherwise.
+        `update_class` is its scheduling class, see UpdateClassifier"""
+        if pending >= self.max_pending:
+            return OVERFLOW
+
+        if self.shedding:
+            if pending <= self.low_watermark:
+                self.shedding = False
+                logger.warning(f"Backlog down to {pending}, shedding stopped")
+        elif pending >= self.high_watermark:
+            self.shedding = True
+            logger.warning(f"Backlog of {pending} updates, shedding started")
+
+        if not self.is_sheddable(update, update_class):
+            return None
+        if self.shedding:
+            return OVERLOAD
+        if self.is_stale(update):
+            return STALE
+        return None
+
+    def is_sheddable(self, update: types.Update,
+                     update_class: Optional[str] = None) -> bool:
+        if update_class == FSM:
+            return False
+        if update_kind(update) not in self.sheddable:
+            return False
+        return update_sender(update) not in self.admins
+
+    def is_stale(self, update: types.Update) -> bool:
+        """Age from the send time Telegram put in the message, it includes
+        time spent in Telegram's queue while the bot was behind"""
+        message = (
+            update.message or update.edited_message
+            or update.channel_post or update.edited_channel_post
+        )
+        if message is None or message.date is None:
+            return False
+        sent_at = (message.edit_date or message.date).timestamp()
+        return self.clock() - sent_at > self.max_age
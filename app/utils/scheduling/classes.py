@@ -0,0 +1,163 @@
+import logging
+import time
+from collections import OrderedDict
+from typing import Callable, Collection, Dict, Optional, Set, Tuple
+
+from aiogram import Dispatcher, types
+from aiogram.dispatcher.filters import Command
+from aiogram.dispatcher.storage import BaseStorage
+
+from app.utils.routing import MessageRouter
+
+logger = logging.getLogger(__name__)
+
+# Scheduling classes of updates
+ADMIN = 'admin'
+CALLBACK = 'callback'
+COMMAND = 'command'
+FSM = 'fsm'
+SERVICE = 'service'
+TEXT = 'text'
+
+# Updates served per round of the fair queue, see FairQueue
+DEFAULT_WEIGHTS: Dict[str, int] = {
+    ADMIN: 8,
+    CALLBACK: 4,
+    COMMAND: 4,
+    FSM: 4,
+    SERVICE: 2,
+    TEXT: 1,
+}
+
+
+def registered_commands(dp: Dispatcher) -> Set[str]:
+    """Commands of the message handlers registered in the dispatcher,
+    including lazy ones not loaded yet"""
+    commands = set()
+    if isinstance(dp.message_handlers, MessageRouter):
+        commands.update(dp.message_handlers.lazy_commands)
+    for handler in dp.message_handlers.handlers:
+        for filter_obj in handler.filters or ():
+            if isinstance(filter_obj.filter, Command):
+                commands.update(
+                    command.lower() for command in filter_obj.filter.commands
+                )
+    return commands
+
+
+class StateTracker:
+    """Chat and user pairs that are in the middle of an FSM scenario.
+
+    Storages only answer asynchronously, Redis over the network, while
+    updates are classified synchronously on arrival. The tracker hooks
+    set_state of the storage, which FSMContext, reset_state and finish
+    all go through, and keeps the active pairs in memory. After a
+    restart the states kept in Redis are unknown until they change
+    again, such updates are classified as plain text meanwhile.
+
+    Scenarios users walk away from are never reset: a pair is forgotten
+    `ttl` seconds after its last set_state, and the least recently set
+    ones once there are more than `maxsize`.
+    """
+
+    def __init__(self, maxsize: int = 100_000, ttl: float = 86400.0,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.maxsize: int = maxsize
+        self.ttl: float = ttl
+        self.clock: Callable[[], float] = clock
+        # Pair -> time of its last set_state, the oldest first
+        self._active: 'OrderedDict[Tuple[int, int], float]' = OrderedDict()
+
+    def attach(self, storage: BaseStorage) -> None:
+        set_state = storage.set_state
+
+        async def tracked_set_state(*, chat=None, user=None, state=None):
+            await set_state(chat=chat, user=user, state=state)
+            chat, user = storage.check_address(chat=chat, user=user)
+            if state is None:
+                self._active.pop((int(chat), int(user)), None)
+            else:
+                self.add((int(chat), int(user)))
+
+        # Instance attribute, so the storage's own reset_state and finish
+        # call it too
+        storage.set_state = tracked_set_state
+
+    def add(self, key: Tuple[int, int]) -> None:
+        self._active[key] = self.clock()
+        self._active.move_to_end(key)
+        self.expire()
+        while len(self._active) > self.maxsize:
+            self._active.popitem(last=False)
+
+    def expire(self) -> None:
+        """Forgets the pairs not set for `ttl` seconds"""
+        deadline = self.clock() - self.ttl
+        while self._active:
+            key, updated = next(iter(self._active.items()))
+            if updated > deadline:
+                return
+            del self._active[key]
+
+    def __contains__(self, key: Tuple[int, int]) -> bool:
+        updated = self._active.get(key)
+        if updated is None:
+            return False
+        if updated <= self.clock() - self.ttl:
+            del self._active[key]
+            return False
+        return True
+
+    def __len__(self) -> int:
+        self.expire()
+        return len(self._active)
+
+
+class UpdateClassifier:
+    """Puts updates into scheduling classes.
+
+    Anything from bot admins is ADMIN. Commands count as COMMAND only
+    when a handler is registered for them, so made-up /commands in a
+    flood stay plain TEXT. Messages of users in an FSM scenario are FSM,
+    the rest of chat messages TEXT; member updates, inline queries and
+    the like are SERVICE.
+    """
+
+    def __init__(
+            self,
+            admins: Collection[int] = (),
+            states: Optional[StateTracker] = None
+    ) -> None:
+        self.admins: frozenset = frozenset(admins)
+        self.states: Optional[StateTracker] = states
+        # None until load_commands, every command counts meanwhile
+        self.commands: Optional[Set[str]] = None
+
+    def load_commands(self, dp: Dispatcher) -> None:
+        self.commands = registered_commands(dp)
+        logger.info(f"Classifying {len(self.commands)} registered commands")
+
+    def classify(self, update: types.Update) -> str:
+        message = update.message
+        callback = update.callback_query
+        event = message or callback or update.edited_message
+        if event is not None and event.from_user is not None:
+            if event.from_user.id in self.admins:
+                return ADMIN
+        if callback is not None:
+            return CALLBACK
+        if message is None:
+            if update.edited_message or update.channel_post \
+                    or update.edited_channel_post:
+                return TEXT
+            return SERVICE
+
+        text = message.text
+        if text and text.startswith('/'):
+            command = text[1:].split(maxsplit=1)[0].split('@', 1)[0]
+            if self.commands is None or command.lower() in self.commands:
+                return COMMAND
+        if (self.states is not None and message.from_user is not None
+                and (message.chat.id, message.from_user.id) in self.states):
+            return FSM
+        return TEXT
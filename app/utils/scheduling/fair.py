@@ -0,0 +1,57 @@
+import asyncio
+from collections import deque
+from typing import Deque, Dict, Generic, Hashable, List, TypeVar
+
+T = TypeVar('T', bound=Hashable)
+
+
+class FairQueue(Generic[T]):
+    """Weighted round robin over classes of items.
+
+    Every round each class may hand out up to its weight of items, so a
+    busy class gets its share of the workers and no more: with weights
+    8 and 1, admin updates wait behind at most one text update per
+    eight of their own however long the text backlog is. A class with
+    nothing queued gives its turn away, capacity is never left idle.
+    This is deficit round robin with every item costing one.
+    """
+
+    def __init__(self, weights: Dict[str, int]) -> None:
+        if not weights or min(weights.values()) < 1:
+            raise ValueError("Expected weights of at least 1")
+        self.weights: Dict[str, int] = dict(weights)
+        self._classes: List[str] = list(weights)
+        self._queues: Dict[str, Deque[T]] = {
+            name: deque() for name in weights
+        }
+        self._current: int = 0
+        self._credit: int = self.weights[self._classes[0]]
+        self._size: int = 0
+        # One permit per queued item, get() never finds the queue empty
+        self._items: asyncio.Semaphore = asyncio.Semaphore(0)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def sizes(self) -> Dict[str, int]:
+        return {name: len(queue) for name, queue in self._queues.items()}
+
+    def put_nowait(self, item: T, name: str) -> None:
+        self._queues[name].append(item)
+        self._size += 1
+        self._items.release()
+
+    async def get(self) -> T:
+        await self._items.acquire()
+        return self._next()
+
+    def _next(self) -> T:
+        while True:
+            queue = self._queues[self._classes[self._current]]
+            if queue and self._credit > 0:
+                self._credit -= 1
+                self._size -= 1
+                return queue.popleft()
+            # Turn over: unused credit is not carried to the next round
+            self._current = (self._current + 1) % len(self._classes)
+            self._credit = self.weights[self._classes[self._current]]
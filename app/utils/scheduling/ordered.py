@@ -0,0 +1,216 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Hashable, List, Optional, Tuple
+
+from aiogram import types
+
+from app.utils.metrics import (
+    pending_updates, update_latency, update_wait, updates_shed
+)
+from app.utils.misc.updates import get_chat_id
+from app.utils.routing import RoutedDispatcher
+from .admission import STALE, AdmissionController, update_kind
+from .classes import DEFAULT_WEIGHTS, UpdateClassifier
+from .fair import FairQueue
+
+logger = logging.getLogger(__name__)
+
+# Update, its future, scheduling class and perf_counter_ns at arrival
+Job = Tuple[types.Update, asyncio.Future, str, int]
+
+
+class ChatOrderedDispatcher(RoutedDispatcher):
+    """Dispatcher that keeps the updates of a chat in order.
+
+    Every chat has a FIFO of pending updates and at most one update in
+    progress, so FSM steps of a chat never race. Chats with pending
+    updates wait in a ready queue served by `concurrency` workers: a slow
+    handler holds up its own chat and one worker, not the others. A
+    worker takes one update per turn and puts the chat back at the end
+    of the queue, so a chat flooding the bot cannot starve quiet ones.
+
+    The ready queue is a FairQueue over the scheduling classes of the
+    classifier, a chat waits in the class of its oldest update. Admin,
+    callback and command updates get more turns than plain text, though
+    never ahead of earlier updates of their own chat.
+
+    Updates from polling, webhooks and shard workers all enter through
+    `submit`, where the optional AdmissionController bounds the backlog.
+    """
+
+    def __init__(self, *args: Any, concurrency: int = 64,
+                 admission: Optional[AdmissionController] = None,
+                 classifier: Optional[UpdateClassifier] = None,
+                 weights: Optional[Dict[str, int]] = None,
+                 **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        if concurrency < 1:
+            raise ValueError("concurrency must be >= 1")
+        self.concurrency: int = concurrency
+        self.admission: Optional[AdmissionController] = admission
+        self.classifier: UpdateClassifier = classifier or UpdateClassifier()
+        # Classes missing from `weights` keep their default weight
+        self.weights: Dict[str, int] = {**DEFAULT_WEIGHTS, **(weights or {})}
+        self._pending: int = 0
+        self.closed: bool = False
+        self._chats: Dict[Hashable, Deque[Job]] = {}
+        self._ready: Optional[FairQueue] = None
+        self._workers: List[asyncio.Task] = []
+        self._idle: Optional[asyncio.Event] = None
+        self.active: int = 0
+
+    @property
+    def pending(self) -> int:
+        """Updates submitted and not finished yet"""
+        return self._pending
+
+    def submit(self, update: types.Update) -> asyncio.Future:
+        """Queues an update, the future gets the handler results.
+        A shed update gets a future that is already done."""
+        if self.closed:
+            # A webhook request fails and Telegram delivers the update
+            # again, to the instance that replaces this one
+            raise RuntimeError("Dispatcher is closed")
+        if not self._workers:
+            self._start_workers()
+
+        future = asyncio.get_running_loop().create_future()
+        name = self.classifier.classify(update)
+        if self.admission is not None:
+            reason = self.admission.admit(update, self._pending, name)
+            if reason is not None:
+                self._shed(update, reason)
+                future.set_result([])
+                return future
+
+        key = get_chat_id(update)
+        if key is None:
+            # Nothing to order against
+            key = ('update', update.update_id)
+
+        job = (update, future, name, time.perf_counter_ns())
+        queue = self._chats.get(key)
+        if queue is None:
+            self._chats[key] = deque([job])
+            self._ready.put_nowait(key, job[2])
+        else:
+            queue.append(job)
+
+        self._pending += 1
+        self._idle.clear()
+        return future
+
+    async def process_updates(self, updates: List[types.Update],
+                              fast: bool = True) -> List[Any]:
+        """Submits a batch in order and waits for all results"""
+        return await asyncio.gather(
+            *[self.submit(update) for update in updates]
+        )
+
+    async def close(self, timeout: Optional[float] = None) -> int:
+        """Waits up to `timeout` for queued updates, then stops the
+        workers. Returns the number of updates left unprocessed.
+        Updates submitted from now on are rejected."""
+        self.closed = True
+        if self._idle is not None and not self._idle.is_set():
+            try:
+                await asyncio.wait_for(self._idle.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+        left = 0
+        for queue in self._chats.values():
+            for _, future, _, _ in queue:
+                left += 1
+                future.cancel()
+        self._chats.clear()
+        self._pending = 0
+        return left
+
+    def _start_workers(self) -> None:
+        self.classifier.load_commands(self)
+        self._ready = FairQueue(self.weights)
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._workers = [
+            asyncio.create_task(self._work())
+            for _ in range(self.concurrency)
+        ]
+        pending_updates.set_function(lambda: self._pending)
+        logger.info(
+            f"Started {self.concurrency} workers with per-chat ordering"
+        )
+
+    async def _work(self) -> None:
+        while True:
+            key = await self._ready.get()
+            queue = self._chats[key]
+            update, future, name, arrived_ns = queue[0]
+
+            # The backlog may have aged the update since it was admitted.
+            # Classified again: an earlier update of the chat may have
+            # started a scenario this one is the reply to
+            if (self.admission is not None
+                    and self.admission.is_stale(update)
+                    and self.admission.is_sheddable(
+                        update, self.classifier.classify(update)
+                    )):
+                self._shed(update, STALE)
+                future.set_result([])
+                self._finish(key, queue)
+                continue
+
+            labels = (name,)
+            update_wait.observe_ns(
+                labels, time.perf_counter_ns() - arrived_ns
+            )
+            self.active += 1
+            try:
+                # A task per update keeps context variables set by
+                # middlewares from leaking into the next update
+                result = await asyncio.ensure_future(
+                    self.updates_handler.notify(update)
+                )
+            except asyncio.CancelledError:
+                if not future.done():
+                    future.cancel()
+                raise
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+            finally:
+                self.active -= 1
+                update_latency.observe_ns(
+                    labels, time.perf_counter_ns() - arrived_ns
+                )
+
+            self._finish(key, queue)
+
+    def _finish(self, key: Hashable, queue: Deque[Job]) -> None:
+        queue.popleft()
+        self._pending -= 1
+        if queue:
+            # The update just handled may have started an FSM scenario
+            update, future, _, arrived_ns = queue[0]
+            name = self.classifier.classify(update)
+            queue[0] = (update, future, name, arrived_ns)
+            self._ready.put_nowait(key, name)
+        else:
+            del self._chats[key]
+            if not self._chats:
+                self._idle.set()
+
+    def _shed(self, update: types.Update, reason: str) -> None:
+        kind = update_kind(update)
+        updates_shed.labels(reason, kind).inc()
+        logger.debug(f"Shed {kind} update {update.update_id}: {reason}")
@@ -0,0 +1,15 @@
+from .channel import WorkerChannel
+from .ingress import PollingIngress, ShardRouter, WebhookIngress
+from .routing import jump_hash, routing_key, shard_of
+from .worker import ShardWorker
+
+__all__ = [
+    'PollingIngress',
+    'ShardRouter',
+    'ShardWorker',
+    'WebhookIngress',
+    'WorkerChannel',
+    'jump_hash',
+    'routing_key',
+    'shard_of',
+]
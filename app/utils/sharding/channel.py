@@ -0,0 +1,174 @@
+import asyncio
+import json
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.utils.sharding.protocol import FrameError, encode_frame, read_frame
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerChannel:
+    """Ordered stream of frames from the ingress to one worker socket.
+
+    Frames wait in a bounded queue while the worker is down or slow;
+    a full queue makes `send` wait, which slows the ingress down instead
+    of growing memory. The worker acknowledges every frame it took;
+    the frames it did not acknowledge are sent again, in order, once
+    the connection is re-established after a worker restart.
+
+    Events the worker sends are passed to `on_event`.
+    """
+
+    def __init__(self, index: int, path: str, queue_size: int = 10_000,
+                 retry_interval: float = 0.5) -> None:
+        self.index: int = index
+        self.path: str = path
+        self.retry_interval: float = retry_interval
+        self.sent: int = 0
+        self._seq: int = 0
+        self._queue: 'asyncio.Queue[Tuple[int, bytes, asyncio.Future]]' = (
+            asyncio.Queue(queue_size)
+        )
+        # Written but not acknowledged yet, in sequence order
+        self._unacked: Dict[int, Tuple[bytes, asyncio.Future]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self.on_event: Optional[Callable[[Dict[str, Any]], None]] = None
+
+    @property
+    def pending(self) -> int:
+        """Frames not acknowledged by the worker yet"""
+        return self._queue.qsize() + len(self._unacked)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def send(self, updates: List[Dict[str, Any]]) -> asyncio.Future:
+        """Queues a batch of raw updates. The returned future is done
+        once the worker acknowledged it."""
+        item = self._frame({'updates': updates})
+        await self._queue.put(item)
+        return item[2]
+
+    def post(self, event: Dict[str, Any]) -> bool:
+        """Queues an event for the worker without waiting, False when
+        the queue is full"""
+        try:
+            self._queue.put_nowait(self._frame({'event': event}))
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    def _frame(
+            self, body: Dict[str, Any]
+    ) -> Tuple[int, bytes, asyncio.Future]:
+        self._seq += 1
+        body['seq'] = self._seq
+        payload = json.dumps(body, ensure_ascii=False).encode()
+        acked = asyncio.get_running_loop().create_future()
+        return self._seq, encode_frame(payload), acked
+
+    async def close(self, timeout: float = 10.0) -> None:
+        """Waits for queued frames to be acknowledged, then disconnects"""
+        if self._task is None:
+            return
+
+        try:
+            await asyncio.wait_for(self._drain(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(
+                f"Worker {self.index}: {self.pending} frames not delivered"
+            )
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+        # Whoever still waits for a frame learns it was not delivered
+        while not self._queue.empty():
+            _, _, acked = self._queue.get_nowait()
+            acked.cancel()
+        for _, acked in self._unacked.values():
+            acked.cancel()
+        self._unacked.clear()
+
+    async def _drain(self) -> None:
+        await self._queue.join()
+        while self._unacked:
+            _, acked = next(iter(self._unacked.values()))
+            await asyncio.shield(acked)
+
+    async def _run(self) -> None:
+        while True:
+            reader, writer = await self._connect()
+            self._writer = writer
+            tasks = {
+                asyncio.create_task(self._read_acks(reader)),
+                asyncio.create_task(self._write_frames(writer)),
+            }
+            try:
+                await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                self._writer = None
+                writer.close()
+            logger.warning(f"Worker {self.index} disconnected")
+
+    async def _write_frames(self, writer: asyncio.StreamWriter) -> None:
+        # The worker may have restarted without taking these
+        for frame, _ in list(self._unacked.values()):
+            writer.write(frame)
+        try:
+            await writer.drain()
+            while True:
+                seq, frame, acked = await self._queue.get()
+                self._unacked[seq] = (frame, acked)
+                self._queue.task_done()
+                writer.write(frame)
+                await writer.drain()
+        except (ConnectionError, OSError) as e:
+            logger.warning(f"Worker {self.index}: write failed: {e}")
+
+    async def _read_acks(self, reader: asyncio.StreamReader) -> None:
+        try:
+            while True:
+                payload = await read_frame(reader)
+                if payload is None:
+                    return
+                message = json.loads(payload)
+                if 'ack' in message:
+                    self._acknowledge(message['ack'])
+                elif self.on_event is not None:
+                    self.on_event(message['event'])
+        except (FrameError, ValueError, KeyError) as e:
+            logger.error(f"Broken ack from worker {self.index}: {e}")
+        except (ConnectionError, OSError):
+            pass
+
+    def _acknowledge(self, seq: int) -> None:
+        # Frames are taken in order, an ack covers the ones before it
+        while self._unacked:
+            first = next(iter(self._unacked))
+            if first > seq:
+                return
+            _, acked = self._unacked.pop(first)
+            self.sent += 1
+            if not acked.done():
+                acked.set_result(None)
+
+    async def _connect(
+            self
+    ) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        while True:
+            try:
+                connection = await asyncio.open_unix_connection(self.path)
+                logger.info(f"Connected to worker {self.index}")
+                return connection
+            except (ConnectionError, FileNotFoundError, OSError):
+                await asyncio.sleep(self.retry_interval)
@@ -0,0 +1,199 @@
+import asyncio
+import hmac
+import logging
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+from aiogram import Bot
+from aiogram.utils.exceptions import NetworkError, TelegramAPIError
+from aiogram.utils.payload import prepare_arg
+from aiohttp import web
+
+from app.utils.misc.webhook import SECRET_TOKEN_HEADER
+from app.utils.polling import OffsetStore
+from app.utils.sharding.channel import WorkerChannel
+from app.utils.sharding.routing import shard_of
+
+logger = logging.getLogger(__name__)
+
+
+class ShardRouter:
+    """Sends each raw update to the worker owning its chat"""
+
+    def __init__(self, channels: Sequence[WorkerChannel]) -> None:
+        self.channels: List[WorkerChannel] = list(channels)
+        self.routed: int = 0
+
+    async def route(self, updates: List[Dict[str, Any]]) -> None:
+        """Groups a batch by worker, one frame per worker keeps the
+        relative order of the updates of every chat. Returns once every
+        worker acknowledged its part."""
+        shards = len(self.channels)
+        batches: Dict[int, List[Dict[str, Any]]] = {}
+        for update in updates:
+            batches.setdefault(shard_of(update, shards), []).append(update)
+
+        acks = [
+            await self.channels[index].send(batch)
+            for index, batch in batches.items()
+        ]
+        await asyncio.gather(*acks)
+        self.routed += len(updates)
+
+
+class PollingIngress:
+    """Long polling loop that forwards raw updates without parsing them
+    into aiogram objects, the workers do that.
+
+    Like Poller, it resumes from the offset in `store` after a restart.
+    The offset moves past a batch, at Telegram and in the store, only
+    once the workers acknowledged it: until then the next getUpdates
+    asks for the same batch, so a batch the supervisor held in memory
+    when it crashed is fetched again. A batch that failed to route is
+    fetched again too, and a partly routed one reaches some workers
+    twice rather than none.
+    """
+
+    def __init__(self, bot: Bot, router: ShardRouter,
+                 allowed_updates: Optional[List[str]] = None,
+                 timeout: int = 20,
+                 store: Optional[OffsetStore] = None,
+                 skip_updates: bool = False,
+                 save_interval: float = 1.0) -> None:
+        self.bot: Bot = bot
+        self.router: ShardRouter = router
+        self.allowed_updates: Optional[List[str]] = allowed_updates
+        self.timeout: int = timeout
+        self.store: Optional[OffsetStore] = store
+        self.skip_updates: bool = skip_updates
+        self.save_interval: float = save_interval
+        # Offset after the last routed batch
+        self.offset: Optional[int] = None
+        self._saved: Optional[int] = None
+        self._saved_at: float = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        # getUpdates does not work while a webhook is set
+        await self.bot.delete_webhook(drop_pending_updates=self.skip_updates)
+        if not self.skip_updates and self.store is not None:
+            self.offset = self._saved = self.store.load()
+        self._task = asyncio.create_task(self._poll())
+        logger.info(f"Polling ingress started from offset {self.offset}")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._save(force=True)
+
+    def _save(self, force: bool = False) -> None:
+        if self.store is None or self.offset is None:
+            return
+        if self.offset == self._saved:
+            return
+        now = time.monotonic()
+        if not force and now - self._saved_at < self.save_interval:
+            return
+        try:
+            self.store.save(self.offset)
+        except OSError as e:
+            logger.error(f"Failed to save the polling offset: {e}")
+            return
+        self._saved, self._saved_at = self.offset, now
+
+    async def _poll(self) -> None:
+        while True:
+            params: Dict[str, Any] = {'timeout': self.timeout}
+            if self.offset is not None:
+                params['offset'] = self.offset
+            if self.allowed_updates is not None:
+                params['allowed_updates'] = prepare_arg(self.allowed_updates)
+
+            try:
+                with self.bot.request_timeout(self.timeout + 10):
+                    updates = await self.bot.request('getUpdates', params)
+            except (NetworkError, TelegramAPIError, asyncio.TimeoutError) as e:
+                logger.error(f"getUpdates failed: {e}")
+                await asyncio.sleep(1)
+                continue
+
+            if not updates:
+                continue
+            try:
+                await self.router.route(updates)
+            except Exception as e:
+                logger.error(
+                    f"Routing {len(updates)} updates failed, fetching "
+                    f"them again: {e}"
+                )
+                await asyncio.sleep(1)
+                continue
+            self.offset = updates[-1]['update_id'] + 1
+            self._save()
+
+
+class WebhookIngress:
+    """Webhook endpoint that answers Telegram once the worker took the
+    update; replies are sent by the workers as regular requests.
+    Telegram delivers an unanswered update again."""
+
+    def __init__(self, bot: Bot, router: ShardRouter, url: str, path: str,
+                 host: str, port: int, secret: Optional[str] = None,
+                 allowed_updates: Optional[List[str]] = None,
+                 max_connections: Optional[int] = None,
+                 skip_updates: bool = False) -> None:
+        self.bot: Bot = bot
+        self.router: ShardRouter = router
+        self.url: str = url
+        self.path: str = path
+        self.host: str = host
+        self.port: int = port
+        self.secret: Optional[str] = secret
+        self.allowed_updates: Optional[List[str]] = allowed_updates
+        self.max_connections: Optional[int] = max_connections
+        self.skip_updates: bool = skip_updates
+        self._runner: Optional[web.AppRunner] = None
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_post(self.path, self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+
+        await self.bot.set_webhook(
+            self.url,
+            allowed_updates=self.allowed_updates,
+            max_connections=self.max_connections,
+            secret_token=self.secret,
+            # Telegram keeps the updates of a restart unless told not to
+            drop_pending_updates=self.skip_updates
+        )
+        logger.info(
+            f"Webhook ingress listening on {self.host}:{self.port}{self.path}"
+        )
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if self.secret:
+            received = request.headers.get(SECRET_TOKEN_HEADER, '')
+            if not hmac.compare_digest(received, self.secret):
+                raise web.HTTPUnauthorized()
+
+        try:
+            update = await request.json()
+        except ValueError:
+            raise web.HTTPBadRequest()
+
+        await self.router.route([update])
+        return web.Response(text='ok')
@@ -0,0 +1,40 @@
+import asyncio
+import struct
+from typing import Optional
+
+# Frames are a 4 byte big-endian length followed by a JSON object: the
+# ingress sends {"seq": n, "updates": [raw updates]} or {"seq": n,
+# "event": {...}}, the worker answers {"ack": n} once it took the frame.
+# A worker sends {"event": {...}} to have the ingress pass it on to the
+# other workers.
+HEADER = struct.Struct('>I')
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+
+
+class FrameError(Exception):
+    pass
+
+
+def encode_frame(payload: bytes) -> bytes:
+    if len(payload) > MAX_FRAME_SIZE:
+        raise FrameError(f"Frame of {len(payload)} bytes is too large")
+    return HEADER.pack(len(payload)) + payload
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Optional[bytes]:
+    """Returns the next payload, None when the peer closed the stream"""
+    try:
+        header = await reader.readexactly(HEADER.size)
+    except asyncio.IncompleteReadError as e:
+        if e.partial:
+            raise FrameError("Stream closed inside a frame header")
+        return None
+
+    (size,) = HEADER.unpack(header)
+    if size > MAX_FRAME_SIZE:
+        raise FrameError(f"Frame of {size} bytes is too large")
+
+    try:
+        return await reader.readexactly(size)
+    except asyncio.IncompleteReadError:
+        raise FrameError("Stream closed inside a frame")
@@ -0,0 +1,71 @@
+from typing import Any, Dict
+
+# Update fields carrying an object with a chat, in the order they are
+# looked up. Exactly one of them is present in an update.
+CHAT_FIELDS = (
+    'message',
+    'edited_message',
+    'channel_post',
+    'edited_channel_post',
+    'my_chat_member',
+    'chat_member',
+    'chat_join_request',
+)
+
+# Update fields without a chat, routed by their sender instead
+USER_FIELDS = (
+    'callback_query',
+    'inline_query',
+    'chosen_inline_result',
+    'shipping_query',
+    'pre_checkout_query',
+    'poll_answer',
+)
+
+_UINT64 = 0xFFFFFFFFFFFFFFFF
+
+
+def jump_hash(key: int, buckets: int) -> int:
+    """Jump consistent hash (Lamping & Veach).
+
+    Maps the key to one of `buckets` shards. When the count changes from
+    n to n + 1 only 1/(n + 1) of the keys move, so a restart with another
+    WORKERS value keeps most chats on the same worker. Negative keys such
+    as group chat ids are taken modulo 2**64.
+    """
+    key &= _UINT64
+    bucket, candidate = -1, 0
+    while candidate < buckets:
+        bucket = candidate
+        key = (key * 2862933555777941757 + 1) & _UINT64
+        candidate = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+def routing_key(update: Dict[str, Any]) -> int:
+    """Chat id of a raw update, the sender id when it has no chat.
+
+    A callback query is routed by the chat of its message, so it lands
+    on the worker that holds that chat's FSM state.
+    """
+    for field in CHAT_FIELDS:
+        event = update.get(field)
+        if event is not None:
+            return event['chat']['id']
+
+    callback = update.get('callback_query')
+    if callback is not None and callback.get('message'):
+        return callback['message']['chat']['id']
+
+    for field in USER_FIELDS:
+        event = update.get(field)
+        if event is not None:
+            sender = event.get('from') or event.get('user')
+            if sender:
+                return sender['id']
+
+    return update.get('update_id', 0)
+
+
+def shard_of(update: Dict[str, Any], shards: int) -> int:
+    return jump_hash(routing_key(update), shards)
@@ -0,0 +1,155 @@
+import asyncio
+import functools
+import json
+import logging
+import os
+import signal
+from typing import Any, Callable, Dict, Optional, Set
+
+from aiogram import Bot, Dispatcher, types
+
+from app.utils.sharding.protocol import FrameError, encode_frame, read_frame
+
+logger = logging.getLogger(__name__)
+
+# Seconds a stopping worker waits for the ingress to close its
+# connections; frames not taken by then are sent to its successor
+DRAIN_TIMEOUT = 10.0
+
+
+class ShardWorker:
+    """Receives the updates of one shard from the ingress and feeds them
+    to the dispatcher the way long polling does.
+
+    Frames arrive in ingress order, so updates of a chat reach the
+    dispatcher in the order Telegram sent them; the dispatcher has to
+    be a ChatOrderedDispatcher to handle them in that order. Every frame
+    is acknowledged once its updates are handed to the dispatcher.
+
+    `serve` returns once the ingress closed the connections, `close`
+    waits for the updates already read.
+
+    `publish` sends an event to the other workers through the ingress,
+    the events they send are passed to `on_event`.
+    """
+
+    def __init__(
+            self,
+            dp: Dispatcher,
+            path: str,
+            on_event: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> None:
+        self.dp: Dispatcher = dp
+        self.path: str = path
+        self.on_event: Optional[Callable[[Dict[str, Any]], None]] = on_event
+        self.received: int = 0
+        self.in_flight: int = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._stopped: Optional[asyncio.Event] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self._connections: Set[asyncio.Task] = set()
+        self._writers: Set[asyncio.StreamWriter] = set()
+
+    async def serve(self) -> None:
+        """Runs until SIGTERM or SIGINT"""
+        Bot.set_current(self.dp.bot)
+        Dispatcher.set_current(self.dp)
+
+        self._stopped = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, self.stop)
+
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(
+            self._handle_connection, self.path
+        )
+        logger.info(f"Shard worker listening on {self.path}")
+
+        await self._stopped.wait()
+
+        self._server.close()
+        # The supervisor closes the connections once every frame is
+        # acknowledged; a worker stopped on its own leaves the frames it
+        # did not take to its successor
+        if self._connections:
+            _, pending = await asyncio.wait(
+                set(self._connections), timeout=DRAIN_TIMEOUT
+            )
+            for connection in pending:
+                connection.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        await self._server.wait_closed()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        logger.info(f"Shard worker stopped after {self.received} updates")
+
+    def publish(self, event: Dict[str, Any]) -> None:
+        """Sends the event to the other workers, dropped when the
+        ingress is not connected"""
+        frame = encode_frame(json.dumps({'event': event}).encode())
+        for writer in self._writers:
+            writer.write(frame)
+
+    def stop(self) -> None:
+        if self._stopped is not None:
+            self._stopped.set()
+
+    async def close(self, timeout: Optional[float] = None) -> int:
+        """Waits up to `timeout` for the updates already read. Returns
+        the number of updates left unhandled."""
+        if not self._tasks:
+            return 0
+        _, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+        left = self.in_flight
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        return left
+
+    async def _handle_connection(self, reader: asyncio.StreamReader,
+                                 writer: asyncio.StreamWriter) -> None:
+        connection = asyncio.current_task()
+        self._connections.add(connection)
+        self._writers.add(writer)
+        try:
+            while True:
+                payload = await read_frame(reader)
+                if payload is None:
+                    break
+                frame = json.loads(payload)
+                if 'updates' in frame:
+                    self.dispatch(frame['updates'])
+                elif self.on_event is not None:
+                    self.on_event(frame['event'])
+                writer.write(encode_frame(
+                    json.dumps({'ack': frame['seq']}).encode()
+                ))
+                await writer.drain()
+        except (FrameError, KeyError, ValueError) as e:
+            logger.error(f"Broken frame from the ingress: {e}")
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self._connections.discard(connection)
+            self._writers.discard(writer)
+            writer.close()
+
+    def dispatch(self, raw_updates: list) -> None:
+        updates = [types.Update(**update) for update in raw_updates]
+        self.received += len(updates)
+        self.in_flight += len(updates)
+        task = asyncio.create_task(
+            self.dp._process_polling_updates(updates)
+        )
+        self._tasks.add(task)
+        task.add_done_callback(
+            functools.partial(self._finished, len(updates))
+        )
+
+    def _finished(self, size: int, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        self.in_flight -= size
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Error processing updates: {task.exception()}")
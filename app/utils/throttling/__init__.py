@@ -0,0 +1,18 @@
+from .backends import BaseThrottleBackend, MemoryThrottleBackend
+from .limiter import (
+    BaseRateLimiter,
+    SlidingWindowLimiter,
+    ThrottleResult,
+    TokenBucketLimiter,
+    create_limiter,
+)
+
+__all__ = [
+    'BaseRateLimiter',
+    'BaseThrottleBackend',
+    'MemoryThrottleBackend',
+    'SlidingWindowLimiter',
+    'ThrottleResult',
+    'TokenBucketLimiter',
+    'create_limiter',
+]
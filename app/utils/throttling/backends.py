@@ -0,0 +1,51 @@
+from abc import ABC, abstractmethod
+from typing import Dict, Hashable, List, Tuple
+
+from .limiter import ALLOWED, BaseRateLimiter, ThrottleResult, create_limiter
+
+# (scope, key, limit, period)
+Limit = Tuple[str, Hashable, int, float]
+
+
+class BaseThrottleBackend(ABC):
+    """Storage of throttling state shared by the middleware"""
+
+    @abstractmethod
+    async def check(self, limits: List[Limit]) -> ThrottleResult:
+        """Registers an event against every limit in order.
+
+        Stops at the first limit that rejects the event and returns its
+        verdict.
+        """
+        pass
+
+    async def close(self) -> None:
+        """Releases backend resources"""
+        pass
+
+
+class MemoryThrottleBackend(BaseThrottleBackend):
+    """Process-local backend, one limiter per scope"""
+
+    def __init__(self, strategy: str = 'sliding_window',
+                 max_keys: int = 100_000) -> None:
+        self.strategy: str = strategy
+        self.max_keys: int = max_keys
+        self.limiters: Dict[str, BaseRateLimiter] = {}
+
+    def get_limiter(self, scope: str, limit: int,
+                    period: float) -> BaseRateLimiter:
+        limiter = self.limiters.get(scope)
+        if limiter is None:
+            limiter = create_limiter(
+                self.strategy, limit, period, max_keys=self.max_keys
+            )
+            self.limiters[scope] = limiter
+        return limiter
+
+    async def check(self, limits: List[Limit]) -> ThrottleResult:
+        for scope, key, limit, period in limits:
+            result = self.get_limiter(scope, limit, period).hit(key)
+            if not result.allowed:
+                return result
+        return ALLOWED
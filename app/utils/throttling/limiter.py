@@ -0,0 +1,175 @@
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Hashable, List, Optional
+
+# Indexes of the shared part of the per-key state list
+LAST_SEEN = 0
+NOTIFIED = 1
+
+
+@dataclass(frozen=True)
+class ThrottleResult:
+    allowed: bool
+    retry_after: float = 0.0
+    notify: bool = False
+
+
+ALLOWED = ThrottleResult(allowed=True)
+
+
+class BaseRateLimiter(ABC):
+    """Rate limiter with bounded per-key state.
+
+    Keys are kept in access order, so idle keys are always at the front
+    and are evicted in amortized O(1) on every check.
+    """
+
+    def __init__(
+            self,
+            limit: int,
+            period: float,
+            max_keys: int = 100_000,
+            idle_ttl: Optional[float] = None,
+            clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        if limit < 1 or period <= 0:
+            raise ValueError("limit must be >= 1 and period must be > 0")
+
+        self.limit: int = limit
+        self.period: float = period
+        self.max_keys: int = max_keys
+        # After two periods of silence the state of any key is
+        # indistinguishable from a fresh one, so dropping it is lossless
+        self.idle_ttl: float = idle_ttl if idle_ttl is not None else period * 2
+        self.clock: Callable[[], float] = clock
+        self._state: 'OrderedDict[Hashable, List]' = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._state)
+
+    def hit(self, key: Hashable, now: Optional[float] = None) -> ThrottleResult:
+        """Registers an event for the key and returns the verdict"""
+        if now is None:
+            now = self.clock()
+
+        state = self._state.get(key)
+        if state is None:
+            state = self._new_state(now)
+            self._state[key] = state
+        else:
+            self._state.move_to_end(key)
+
+        allowed, retry_after = self._check(state, now)
+        state[LAST_SEEN] = now
+
+        if allowed:
+            state[NOTIFIED] = False
+            result = ALLOWED
+        else:
+            # Only the first rejection of a streak asks for a notice
+            result = ThrottleResult(
+                allowed=False,
+                retry_after=retry_after,
+                notify=not state[NOTIFIED]
+            )
+            state[NOTIFIED] = True
+
+        self._evict(now)
+        return result
+
+    def reset(self, key: Hashable) -> None:
+        self._state.pop(key, None)
+
+    def _evict(self, now: float) -> None:
+        state = self._state
+        deadline = now - self.idle_ttl
+
+        while state:
+            key = next(iter(state))
+            if len(state) <= self.max_keys and state[key][LAST_SEEN] > deadline:
+                break
+            del state[key]
+
+    @abstractmethod
+    def _new_state(self, now: float) -> List:
+        """Returns the initial state for a new key"""
+        pass
+
+    @abstractmethod
+    def _check(self, state: List, now: float) -> tuple:
+        """Consumes one unit if possible, returns (allowed, retry_after)"""
+        pass
+
+
+class TokenBucketLimiter(BaseRateLimiter):
+    """Token bucket: bursts up to `limit`, refills `limit` per `period`"""
+
+    def _new_state(self, now: float) -> List:
+        return [now, False, float(self.limit)]
+
+    def _check(self, state: List, now: float) -> tuple:
+        rate = self.limit / self.period
+        tokens = min(
+            float(self.limit),
+            state[2] + (now - state[LAST_SEEN]) * rate
+        )
+
+        if tokens >= 1.0:
+            state[2] = tokens - 1.0
+            return True, 0.0
+
+        state[2] = tokens
+        return False, (1.0 - tokens) / rate
+
+
+class SlidingWindowLimiter(BaseRateLimiter):
+    """Sliding window counter: at most `limit` events per `period`.
+
+    The previous fixed window is weighted by its overlap with the sliding
+    one, which keeps the state at two counters per key.
+    """
+
+    def _new_state(self, now: float) -> List:
+        return [now, False, int(now // self.period), 0, 0]
+
+    def _check(self, state: List, now: float) -> tuple:
+        period = self.period
+        window = int(now // period)
+
+        if window != state[2]:
+            state[3] = state[4] if window == state[2] + 1 else 0
+            state[4] = 0
+            state[2] = window
+
+        previous, current = state[3], state[4]
+        elapsed = (now - window * period) / period
+        estimated = previous * (1.0 - elapsed) + current
+
+        if estimated < self.limit:
+            state[4] = current + 1
+            return True, 0.0
+
+        if current >= self.limit or not previous:
+            return False, (window + 1) * period - now
+
+        # Moment when the weight of the previous window drops enough
+        needed = 1.0 - (self.limit - current) / previous
+        return False, max((needed - elapsed) * period, 0.0)
+
+
+LIMITERS = {
+    'token_bucket': TokenBucketLimiter,
+    'sliding_window': SlidingWindowLimiter,
+}
+
+
+def create_limiter(strategy: str, limit: int, period: float,
+                   **kwargs) -> BaseRateLimiter:
+    """Creates a limiter by strategy name"""
+    try:
+        limiter_class = LIMITERS[strategy]
+    except KeyError:
+        raise ValueError(f"Unknown throttling strategy: {strategy}")
+    return limiter_class(limit, period, **kwargs)
@@ -0,0 +1,163 @@
+import asyncio
+import logging
+import time
+from typing import List, Optional
+
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError
+
+from .backends import BaseThrottleBackend, Limit, MemoryThrottleBackend
+from .limiter import ALLOWED, ThrottleResult
+
+logger = logging.getLogger(__name__)
+
+# Each script checks all KEYS in order with ARGV = limit1, period1,
+# limit2, period2, ... and stops at the first rejection, so one event is
+# a single round trip. The clock is taken from the Redis server, so all
+# worker processes agree on time. Fractional values are returned as
+# strings because Redis truncates Lua numbers to integers.
+SCRIPT_TEMPLATE = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+
+local function check(key, limit, period)
+%s
+end
+
+for i, key in ipairs(KEYS) do
+    local allowed, retry_after, notify = check(
+        key, tonumber(ARGV[i * 2 - 1]), tonumber(ARGV[i * 2])
+    )
+    if allowed == 0 then
+        return {0, tostring(retry_after), notify}
+    end
+end
+return {1, '0', 0}
+"""
+
+TOKEN_BUCKET_CHECK = """
+    local state = redis.call('HMGET', key, 'tokens', 'ts', 'notified')
+    local rate = limit / period
+    local tokens = tonumber(state[1]) or limit
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(limit, tokens + (now - ts) * rate)
+
+    local allowed, retry_after, notify, notified = 0, 0, 0, 1
+    if tokens >= 1 then
+        tokens = tokens - 1
+        allowed, notified = 1, 0
+    else
+        retry_after = (1 - tokens) / rate
+        if state[3] ~= '1' then notify = 1 end
+    end
+
+    redis.call('HSET', key, 'tokens', tokens, 'ts', now, 'notified', notified)
+    redis.call('PEXPIRE', key, math.ceil(period * 2000))
+    return allowed, retry_after, notify
+"""
+
+SLIDING_WINDOW_CHECK = """
+    local window = math.floor(now / period)
+    local state = redis.call(
+        'HMGET', key, 'window', 'previous', 'current', 'notified'
+    )
+    local last_window = tonumber(state[1]) or window
+    local previous = tonumber(state[2]) or 0
+    local current = tonumber(state[3]) or 0
+    if window ~= last_window then
+        if window == last_window + 1 then previous = current else previous = 0 end
+        current = 0
+    end
+
+    local elapsed = (now - window * period) / period
+    local estimated = previous * (1 - elapsed) + current
+
+    local allowed, retry_after, notify, notified = 0, 0, 0, 1
+    if estimated < limit then
+        current = current + 1
+        allowed, notified = 1, 0
+    else
+        if current >= limit or previous == 0 then
+            retry_after = (window + 1) * period - now
+        else
+            local needed = 1 - (limit - current) / previous
+            retry_after = math.max((needed - elapsed) * period, 0)
+        end
+        if state[4] ~= '1' then notify = 1 end
+    end
+
+    redis.call('HSET', key, 'window', window, 'previous', previous,
+               'current', current, 'notified', notified)
+    redis.call('PEXPIRE', key, math.ceil(period * 2000))
+    return allowed, retry_after, notify
+"""
+
+SCRIPTS = {
+    'token_bucket': SCRIPT_TEMPLATE % TOKEN_BUCKET_CHECK,
+    'sliding_window': SCRIPT_TEMPLATE % SLIDING_WINDOW_CHECK,
+}
+
+
+class RedisThrottleBackend(BaseThrottleBackend):
+    """Backend shared by all worker processes through Redis.
+
+    Every event is a single EVALSHA round trip. When Redis is slow or
+    unavailable the event is checked by the local fallback backend and
+    Redis is not retried until `retry_interval` passes.
+    """
+
+    def __init__(
+            self,
+            redis: aioredis.Redis,
+            strategy: str = 'sliding_window',
+            prefix: str = 'throttle',
+            timeout: float = 0.05,
+            retry_interval: float = 5.0,
+            fallback: Optional[BaseThrottleBackend] = None
+    ) -> None:
+        if strategy not in SCRIPTS:
+            raise ValueError(f"Unknown throttling strategy: {strategy}")
+
+        self.redis: aioredis.Redis = redis
+        self.prefix: str = prefix
+        self.timeout: float = timeout
+        self.retry_interval: float = retry_interval
+        self.fallback: BaseThrottleBackend = (
+            fallback or MemoryThrottleBackend(strategy)
+        )
+        self.script = redis.register_script(SCRIPTS[strategy])
+        self.disabled_until: float = 0.0
+
+    async def check(self, limits: List[Limit]) -> ThrottleResult:
+        now = time.monotonic()
+        if now < self.disabled_until:
+            return await self.fallback.check(limits)
+
+        keys = []
+        args = []
+        for scope, key, limit, period in limits:
+            keys.append(f"{self.prefix}:{scope}:{key}")
+            args.extend((limit, period))
+
+        try:
+            allowed, retry_after, notify = await asyncio.wait_for(
+                self.script(keys=keys, args=args), self.timeout
+            )
+        except (RedisError, OSError, asyncio.TimeoutError) as e:
+            logger.warning(
+                f"Redis throttling unavailable, using local limits "
+                f"for {self.retry_interval}s: {e!r}"
+            )
+            self.disabled_until = now + self.retry_interval
+            return await self.fallback.check(limits)
+
+        if allowed:
+            return ALLOWED
+        return ThrottleResult(
+            allowed=False,
+            retry_after=float(retry_after),
+            notify=bool(notify)
+        )
+
+    async def close(self) -> None:
+        await self.redis.close()
@@ -0,0 +1,249 @@
+"""
+A broadcast to USERS users with Broadcaster against an in-process fake
+Bot API.
+
+Users are rows of a SQLite table, blocked ones of a second table, read
+by KeysetRecipients a page at a time as in the bot. The fake API answers
+copyMessage after SEND_LATENCY, with BotBlocked for every BLOCKED_EVERY
+user, and counts the messages every user got. It is a Bot subclass
+rather than an HTTP server: a million requests through a local socket
+would measure aiohttp on both ends, not the broadcast.
+
+First the broadcast runs for LIMITED_DURATION seconds through
+ScheduledBot with Telegram's limits, showing the pace the outbound
+scheduler keeps. Then a broadcast without limits is crashed at
+CRASH_AT of the users: the checkpoint stops being saved and the task
+dies. A new Broadcaster resumes from the checkpoint file to the end.
+Reported are throughput, users who got the message twice or never,
+and the peak memory of the process next to loading the user list at
+once.
+
+    python -m benchmarks.broadcast
+"""
+import asyncio
+import functools
+import os
+import resource
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Deque, List
+
+from aiogram import Bot
+from aiogram.utils.exceptions import BotBlocked
+from peewee import BigIntegerField, Model, SqliteDatabase
+
+from app.utils.broadcast import (
+    BroadcastCheckpoint, BroadcastJob, Broadcaster, KeysetRecipients
+)
+from app.utils.outbound import OutboundScheduler, ScheduledBot
+
+TOKEN = '42:BENCHMARK'
+USERS = 1_000_000
+FIRST_ID = 100_000_000
+ID_STEP = 7
+BLOCKED_EVERY = 50
+SEND_LATENCY = 0.02
+CONCURRENCY = 200
+PAGE_SIZE = 1000
+INTERVAL = 5.0
+CRASH_AT = 0.5
+LIMITED_DURATION = 10.0
+
+database = SqliteDatabase(None)
+
+
+class BenchUser(Model):
+    user_id = BigIntegerField(unique=True)
+
+    class Meta:
+        database = database
+        table_name = 'users'
+
+
+class BenchBlocked(Model):
+    user_id = BigIntegerField(primary_key=True)
+
+    class Meta:
+        database = database
+        table_name = 'blocked_users'
+
+
+class Deliveries:
+    def __init__(self) -> None:
+        self.received = bytearray(USERS)
+        self.times: Deque[float] = deque()
+
+    def reset(self) -> None:
+        self.__init__()
+
+
+deliveries = Deliveries()
+
+
+class FakeAPI(Bot):
+    """copyMessage answered in process"""
+
+    async def request(self, method: str, data=None, files=None,
+                      **kwargs) -> Any:
+        await asyncio.sleep(SEND_LATENCY)
+        chat_id = int(data['chat_id'])
+        if chat_id % BLOCKED_EVERY == 0:
+            raise BotBlocked('Forbidden: bot was blocked by the user')
+        index = (chat_id - FIRST_ID) // ID_STEP
+        deliveries.received[index] = min(
+            deliveries.received[index] + 1, 255
+        )
+        deliveries.times.append(time.monotonic())
+        return {'message_id': 1}
+
+
+class LimitedFakeAPI(ScheduledBot, FakeAPI):
+    """The fake API behind the outbound scheduler"""
+
+
+executor = ThreadPoolExecutor(max_workers=1)
+
+
+async def run_in_db(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        executor, functools.partial(func, *args, **kwargs)
+    )
+
+
+def recipients(target: str) -> KeysetRecipients:
+    query = BenchUser.select(BenchUser.user_id).where(
+        BenchUser.user_id.not_in(BenchBlocked.select(BenchBlocked.user_id))
+    )
+    return KeysetRecipients(query, BenchUser.user_id, run_in_db)
+
+
+def _mark_blocked(user_ids: List[int]) -> None:
+    for i in range(0, len(user_ids), 400):
+        BenchBlocked.insert_many(
+            [(user_id,) for user_id in user_ids[i:i + 400]],
+            fields=[BenchBlocked.user_id]
+        ).on_conflict_ignore().execute()
+
+
+async def mark_blocked(user_ids: List[int]) -> None:
+    if user_ids:
+        await run_in_db(_mark_blocked, list(user_ids))
+
+
+def create_users(path: str) -> None:
+    database.init(path, pragmas={'journal_mode': 'wal'})
+    database.create_tables([BenchUser, BenchBlocked])
+    with database.atomic():
+        database.connection().executemany(
+            'INSERT INTO users (user_id) VALUES (?)',
+            ((FIRST_ID + i * ID_STEP,) for i in range(USERS))
+        )
+    database.close()
+
+
+def peak_rss() -> float:
+    """Peak resident memory of the process in MB"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def make_broadcaster(store: BroadcastCheckpoint,
+                     concurrency: int) -> Broadcaster:
+    return Broadcaster(
+        store=store,
+        recipients=recipients,
+        mark_blocked=mark_blocked,
+        concurrency=concurrency,
+        page_size=PAGE_SIZE,
+        interval=INTERVAL
+    )
+
+
+def new_job() -> BroadcastJob:
+    return BroadcastJob(
+        from_chat_id=1, message_id=1, target='all', admin_chat_id=1
+    )
+
+
+async def limited(directory: str) -> None:
+    bot = LimitedFakeAPI(TOKEN, outbound=OutboundScheduler())
+    store = BroadcastCheckpoint(os.path.join(directory, 'limited.json'))
+    broadcaster = make_broadcaster(store, concurrency=20)
+    broadcaster.start(bot, new_job())
+    await asyncio.sleep(LIMITED_DURATION)
+    await broadcaster.close()
+    await bot.outbound.close()
+
+    times = list(deliveries.times)
+    busiest = max(
+        sum(1 for t in times[i:i + 100] if t - start < 1.0)
+        for i, start in enumerate(times)
+    )
+    job = store.load()
+    print(f"   limited: {len(times) / LIMITED_DURATION:.1f} msg/s, "
+          f"busiest second {busiest}, checkpoint at user {job.cursor} "
+          f"with {job.done} done")
+    store.clear()
+    await run_in_db(BenchBlocked.delete().execute)
+    deliveries.reset()
+
+
+async def unlimited(directory: str) -> None:
+    bot = FakeAPI(TOKEN)
+    store = BroadcastCheckpoint(os.path.join(directory, 'broadcast.json'))
+    before = peak_rss()
+    started = time.perf_counter()
+
+    broadcaster = make_broadcaster(store, CONCURRENCY)
+    task = broadcaster.start(bot, new_job())
+    while broadcaster.job.done < USERS * CRASH_AT:
+        await asyncio.sleep(0.05)
+    # The crash: nothing more reaches the file, the sends die mid-way
+    store.save = lambda job: None
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    crashed = time.perf_counter()
+
+    store = BroadcastCheckpoint(store.path)
+    job = store.load()
+    cursor, done = job.cursor, job.done
+    await make_broadcaster(store, CONCURRENCY).start(bot, job)
+    finished = time.perf_counter()
+    engine_rss = peak_rss() - before
+
+    blocked = USERS // BLOCKED_EVERY
+    received = deliveries.received
+    twice = sum(1 for count in received if count > 1)
+    missed = received.count(0) - blocked
+    elapsed = finished - started
+    print(f"unlimited: {USERS / elapsed:,.0f} msg/s, {elapsed:.1f} s "
+          f"including the crash at {crashed - started:.1f} s")
+    print(f"   resumed: after user {cursor} with {done} done, finished "
+          f"with {job.sent} sent, {job.blocked} blocked, {job.failed} "
+          f"failed")
+    print(f"   results: {missed} missed, {twice} got it twice "
+          f"(about {INTERVAL:.0f} s of sends before the crash)")
+
+    before = peak_rss()
+    users = await run_in_db(list, BenchUser.select())
+    print(f"    memory: broadcaster +{engine_rss:.0f} MB peak, "
+          f"loading {len(users):,} users at once +"
+          f"{peak_rss() - before:.0f} MB")
+
+
+async def main() -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        started = time.perf_counter()
+        await run_in_db(create_users, os.path.join(directory, 'users.db'))
+        print(f"{USERS:,} users created in "
+              f"{time.perf_counter() - started:.1f} s, "
+              f"every {BLOCKED_EVERY}th blocked the bot")
+        await limited(directory)
+        await unlimited(directory)
+        await run_in_db(database.close)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,150 @@
+"""
+Synthetic burst: busy groups flood the bot while other users send
+commands and press buttons.
+
+FLOOD_RATE updates per second arrive for DURATION seconds: plain
+messages from GROUPS busy groups with COMMAND_SHARE commands and
+callbacks of private chats mixed in. Handlers wait HANDLER_LATENCY,
+like a sendMessage, and only CONCURRENCY of them run at once, so the
+backlog grows as long as the flood lasts. Round robin over chats keeps
+commands fast either way; without admission control the backlog and
+the delay of the echo answers grow with the flood, with it the backlog
+stays under the high watermark and text older than MAX_AGE is dropped.
+
+    python -m benchmarks.burst
+"""
+import asyncio
+import itertools
+import random
+import time
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from aiogram import Bot, types
+
+from app.utils.scheduling import (
+    AdmissionController, ChatOrderedDispatcher, update_kind
+)
+
+TOKEN = '42:BENCHMARK'
+DURATION = 5.0
+FLOOD_RATE = 4_000
+COMMAND_SHARE = 0.02
+GROUPS = 50
+GROUP_MEMBERS = 500
+CONCURRENCY = 64
+HANDLER_LATENCY = 0.05
+# Admission settings scaled down to the length of the run
+HIGH_WATERMARK = 2_000
+LOW_WATERMARK = 500
+MAX_PENDING = 10_000
+MAX_AGE = 2.0
+
+GROUP_IDS = [-100_000_000_000 - i for i in range(GROUPS)]
+
+
+def generate_burst(ids: Iterator[int], count: int, now: float,
+                   groups: Sequence[int] = GROUP_IDS) -> List[types.Update]:
+    """`count` updates: flood text from the groups with commands and
+    callbacks of private chats mixed in"""
+    updates = []
+    for _ in range(count):
+        update_id = next(ids)
+        if random.random() >= COMMAND_SHARE:
+            user_id = random.randint(1, GROUP_MEMBERS)
+            updates.append(types.Update(**{
+                'update_id': update_id,
+                'message': {
+                    'message_id': update_id,
+                    'date': int(now),
+                    'chat': {'id': random.choice(groups),
+                             'type': 'supergroup'},
+                    'from': {'id': user_id, 'is_bot': False,
+                             'first_name': 'F'},
+                    'text': 'spam',
+                },
+            }))
+            continue
+
+        user = {'id': 10 ** 6 + update_id, 'is_bot': False,
+                'first_name': 'U'}
+        chat = {'id': user['id'], 'type': 'private'}
+        if random.random() < 0.5:
+            updates.append(types.Update(**{
+                'update_id': update_id,
+                'message': {
+                    'message_id': update_id, 'date': int(now),
+                    'chat': chat, 'from': user, 'text': '/start',
+                },
+            }))
+        else:
+            updates.append(types.Update(**{
+                'update_id': update_id,
+                'callback_query': {
+                    'id': str(update_id), 'from': user,
+                    'chat_instance': '1', 'data': 'button',
+                    'message': {
+                        'message_id': update_id, 'date': int(now),
+                        'chat': chat, 'text': 'menu',
+                    },
+                },
+            }))
+    return updates
+
+
+async def run(admission: Optional[AdmissionController]) -> None:
+    dp = ChatOrderedDispatcher(
+        Bot(TOKEN), concurrency=CONCURRENCY, admission=admission
+    )
+    received: Dict[int, float] = {}
+    latency: Dict[str, List[float]] = {}
+
+    async def handler(event) -> None:
+        await asyncio.sleep(HANDLER_LATENCY)
+        update = types.Update.get_current()
+        latency.setdefault(update_kind(update), []).append(
+            time.perf_counter() - received.pop(update.update_id)
+        )
+
+    dp.register_message_handler(handler)
+    dp.register_callback_query_handler(handler)
+
+    ids = itertools.count(1)
+    submitted = 0
+    peak = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < DURATION:
+        now = time.perf_counter()
+        for update in generate_burst(ids, FLOOD_RATE // 100, time.time()):
+            received[update.update_id] = now
+            dp.submit(update)
+            submitted += 1
+        peak = max(peak, dp.pending)
+        await asyncio.sleep(0.01)
+
+    left = await dp.close(timeout=0)
+    await (await dp.bot.get_session()).close()
+
+    handled = sum(len(values) for values in latency.values())
+    shed = submitted - handled - left
+    print(f"  peak backlog {peak:,}, handled {handled:,}, shed {shed:,}, "
+          f"left at the end {left:,}")
+    for kind, values in sorted(latency.items()):
+        values.sort()
+        print(f"  {kind:>8}: p50 {values[len(values) // 2] * 1000:>6.0f} ms, "
+              f"p99 {values[int(len(values) * 0.99)] * 1000:>6.0f} ms, "
+              f"max {values[-1] * 1000:>6.0f} ms")
+
+
+async def main() -> None:
+    print(f"{FLOOD_RATE} updates/s for {DURATION:.0f} s, "
+          f"{CONCURRENCY} handlers of {HANDLER_LATENCY * 1000:.0f} ms")
+    print("without admission control:")
+    await run(None)
+    print("with admission control:")
+    await run(AdmissionController(
+        HIGH_WATERMARK, LOW_WATERMARK, MAX_PENDING, MAX_AGE
+    ))
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
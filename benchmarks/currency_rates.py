@@ -0,0 +1,107 @@
+"""
+Currency conversions through the API on every call against the
+snapshot CurrencyRates keeps.
+
+The API is a CurrencyAPIWrapper whose make_request answers after
+UPSTREAM_LATENCY with a table of CURRENCIES made-up rates, as
+ExchangeRate-API does with latest/USD. CONVERSIONS random pairs are
+converted:
+
+- api: a latest/USD request per conversion, as before;
+- snapshot: RatesSnapshot.convert on the table CurrencyRates loaded;
+- batch: RatesSnapshot.convert_many, BATCH targets at a time.
+
+Then a refresh fails and the snapshot it leaves is checked.
+
+    python -m benchmarks.currency_rates
+"""
+import asyncio
+import random
+import time
+from typing import Any, Dict, Optional
+
+from app.api.currency import CurrencyAPIWrapper
+from app.api.rates import CurrencyRates
+
+CURRENCIES = 160
+UPSTREAM_LATENCY = 0.1
+API_CONVERSIONS = 50
+CONVERSIONS = 1_000_000
+BATCH = 10
+
+
+class FakeCurrencyAPI(CurrencyAPIWrapper):
+    def __init__(self) -> None:
+        super().__init__(api_key='benchmark')
+        rng = random.Random(1)
+        self.codes = ['USD'] + [f'C{i:02d}' for i in range(CURRENCIES - 1)]
+        self.rates = {code: rng.uniform(0.01, 5000) for code in self.codes}
+        self.rates['USD'] = 1.0
+        self.failing: bool = False
+
+    async def make_request(self, method: str, endpoint: str,
+                           data: Optional[Dict[str, Any]] = None
+                           ) -> Dict[str, Any]:
+        await asyncio.sleep(UPSTREAM_LATENCY)
+        if self.failing:
+            return {'error': 'HTTP 503'}
+        return {
+            'base': 'USD',
+            'time_last_updated': int(time.time()),
+            'rates': dict(self.rates),
+        }
+
+
+async def main() -> None:
+    api = FakeCurrencyAPI()
+    rng = random.Random(2)
+    pairs = [
+        (rng.choice(api.codes), rng.choice(api.codes))
+        for _ in range(CONVERSIONS)
+    ]
+
+    started = time.perf_counter()
+    for source, target in pairs[:API_CONVERSIONS]:
+        payload = await api.get_currencies()
+        payload['rates'][target] / payload['rates'][source]
+    per_call = (time.perf_counter() - started) / API_CONVERSIONS
+    print(f"     api: {per_call * 1e6:,.0f} us per conversion "
+          f"(upstream {UPSTREAM_LATENCY * 1000:.0f} ms)")
+
+    rates = CurrencyRates(api)
+    started = time.perf_counter()
+    await rates.refresh()
+    snapshot = rates.snapshot
+    print(f" refresh: {(time.perf_counter() - started) * 1000:.0f} ms, "
+          f"{len(snapshot.codes)}x{len(snapshot.codes)} matrix in "
+          f"{len(snapshot.matrix) * snapshot.matrix.itemsize / 1024:.0f} KB")
+
+    convert = snapshot.convert
+    started = time.perf_counter()
+    for source, target in pairs:
+        convert(100.0, source, target)
+    per_call = (time.perf_counter() - started) / CONVERSIONS
+    print(f"snapshot: {per_call * 1e6:.2f} us per conversion")
+
+    started = time.perf_counter()
+    for i in range(0, CONVERSIONS, BATCH):
+        snapshot.convert_many(
+            100.0, pairs[i][0], [target for _, target in pairs[i:i + BATCH]]
+        )
+    per_call = (time.perf_counter() - started) / CONVERSIONS
+    print(f"   batch: {per_call * 1e6:.2f} us per conversion, "
+          f"{BATCH} per call")
+
+    # The rates of a refresh still agree with the payload of the API
+    source, target = pairs[0]
+    exact = api.rates[target] / api.rates[source]
+    assert abs(snapshot.rate(source, target) - exact) <= 1e-12 * exact
+
+    api.failing = True
+    refreshed = await rates.refresh()
+    print(f" failure: refreshed {refreshed}, snapshot kept "
+          f"{rates.snapshot is snapshot}, age {rates.age:.1f} s")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
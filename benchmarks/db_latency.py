@@ -0,0 +1,104 @@
+"""
+Latency of updates when the database disk is slow.
+
+Half of the simulated updates write a row to SQLite, the other half
+only answer (like /ping). Every commit is followed by an artificial
+fsync delay. The blocking mode runs the writes on the event loop, the
+executor mode runs them through DatabaseExecutor.
+
+    python -m benchmarks.db_latency
+"""
+import asyncio
+import os
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+
+from app.database.executor import DatabaseExecutor
+
+UPDATES = 400
+RATE = 200  # updates per second
+SLOW_FSYNC = 0.01  # seconds per commit
+
+_local = threading.local()
+
+
+def connect(path: str) -> sqlite3.Connection:
+    # One connection per thread, like peewee does
+    connection = getattr(_local, 'connection', None)
+    if connection is None:
+        connection = sqlite3.connect(path)
+        _local.connection = connection
+    return connection
+
+
+def update_activity(path: str, user_id: int) -> None:
+    connection = connect(path)
+    connection.execute(
+        "UPDATE users SET last_activity = ? WHERE user_id = ?",
+        (time.time(), user_id)
+    )
+    connection.commit()
+    time.sleep(SLOW_FSYNC)
+
+
+def percentile(values, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] * 1000
+
+
+async def run(path: str, executor) -> None:
+    writes, reads = [], []
+
+    async def handle(i: int) -> None:
+        started = time.perf_counter()
+        if i % 2:
+            if executor:
+                await executor.run(update_activity, path, i % 100)
+            else:
+                update_activity(path, i % 100)
+            writes.append(time.perf_counter() - started)
+        else:
+            await asyncio.sleep(0)
+            reads.append(time.perf_counter() - started)
+
+    tasks = []
+    for i in range(UPDATES):
+        tasks.append(asyncio.create_task(handle(i)))
+        await asyncio.sleep(1 / RATE)
+    await asyncio.gather(*tasks)
+
+    mode = 'executor' if executor else 'blocking'
+    print(
+        f"{mode:>9}: write p50 {percentile(writes, 0.5):7.1f} ms "
+        f"p99 {percentile(writes, 0.99):7.1f} ms | "
+        f"no-db p50 {percentile(reads, 0.5):7.1f} ms "
+        f"p99 {percentile(reads, 0.99):7.1f} ms | "
+        f"mean write {statistics.mean(writes) * 1000:.1f} ms"
+    )
+
+
+def main() -> None:
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    connection = sqlite3.connect(path)
+    connection.execute(
+        "CREATE TABLE users (user_id INTEGER PRIMARY KEY, last_activity REAL)"
+    )
+    connection.executemany(
+        "INSERT INTO users VALUES (?, ?)", [(i, 0.0) for i in range(100)]
+    )
+    connection.commit()
+    connection.close()
+
+    print(f"{UPDATES} updates at {RATE}/s, {SLOW_FSYNC * 1000:.0f} ms per commit")
+    asyncio.run(run(path, None))
+
+    executor = DatabaseExecutor(max_workers=1)
+    asyncio.run(run(path, executor))
+    executor.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+"""
+Latency of calls to an external HTTPS API with a new session per call,
+as the API wrappers used to do, against the shared pooled HTTPClient.
+
+A local aiohttp server answers GET /data with a small JSON body over
+TLS, with a self-signed certificate made by the openssl command. The
+client reaches it through a TCP proxy that holds every chunk of data for
+a delay of DELAYS in each direction, standing in for the network: a TLS
+1.3 handshake then costs one more round trip, the TCP handshake itself
+stays local. CALLS calls are made one after another, as the replies of
+one handler would.
+
+    python -m benchmarks.http_pool
+"""
+import asyncio
+import os
+import ssl
+import statistics
+import subprocess
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+from aiohttp import web
+
+from app.api.base import BaseAPIWrapper
+from app.api.client import HTTPClient
+from app.data.config import config
+
+HOST = '127.0.0.1'
+SERVER_PORT = 8821
+PROXY_PORT = 8822
+CALLS = 200
+DELAYS = (0.0, 0.010)
+
+
+class Proxy:
+    """Forwards TCP connections, delaying the data by `one_way` seconds"""
+
+    def __init__(self, one_way: float) -> None:
+        self.one_way: float = one_way
+        self.connections: int = 0
+
+    async def handle(self, reader: asyncio.StreamReader,
+                     writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        upstream_reader, upstream_writer = await asyncio.open_connection(
+            HOST, SERVER_PORT
+        )
+        await asyncio.gather(
+            self._pipe(reader, upstream_writer),
+            self._pipe(upstream_reader, writer),
+            return_exceptions=True
+        )
+
+    async def _pipe(self, reader: asyncio.StreamReader,
+                    writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                if self.one_way:
+                    await asyncio.sleep(self.one_way)
+                writer.write(data)
+                await writer.drain()
+        finally:
+            writer.close()
+
+
+class BenchAPI(BaseAPIWrapper):
+    async def make_request(self, method: str, endpoint: str,
+                           data: Optional[Dict[str, Any]] = None
+                           ) -> Dict[str, Any]:
+        async with self.request(method, self.build_url(endpoint),
+                                params=data) as response:
+            return await response.json()
+
+
+async def data(request: web.Request) -> web.Response:
+    return web.json_response({'temp': 21.5, 'humidity': 40})
+
+
+def make_certificate(directory: str) -> ssl.SSLContext:
+    cert = os.path.join(directory, 'cert.pem')
+    key = os.path.join(directory, 'key.pem')
+    subprocess.run(
+        ['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes',
+         '-keyout', key, '-out', cert, '-days', '1', '-subj', '/CN=localhost',
+         '-addext', f'subjectAltName=IP:{HOST}'],
+        check=True, capture_output=True
+    )
+    # Trusted by the default context aiohttp builds for the clients
+    os.environ['SSL_CERT_FILE'] = cert
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(cert, key)
+    return context
+
+
+async def per_call_session(url: str) -> None:
+    async with aiohttp.ClientSession() as session:
+        async with session.get(url) as response:
+            await response.json()
+
+
+async def measure(call) -> List[float]:
+    latencies = []
+    for _ in range(CALLS):
+        started = time.perf_counter()
+        await call()
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def summary(latencies: List[float]) -> str:
+    p95 = statistics.quantiles(latencies, n=20)[-1]
+    return (f"mean {statistics.mean(latencies):6.2f} ms, "
+            f"p95 {p95:6.2f} ms")
+
+
+async def main() -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        context = make_certificate(directory)
+        app = web.Application()
+        app.router.add_get('/data', data)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, HOST, SERVER_PORT, ssl_context=context)
+        await site.start()
+
+        base_url = f'https://{HOST}:{PROXY_PORT}'
+        for one_way in DELAYS:
+            proxy = Proxy(one_way)
+            server = await asyncio.start_server(
+                proxy.handle, HOST, PROXY_PORT
+            )
+            print(f"round trip +{one_way * 2000:.0f} ms:")
+
+            fresh = await measure(
+                lambda: per_call_session(f'{base_url}/data')
+            )
+            print(f"  session per call: {summary(fresh)}, "
+                  f"{proxy.connections} connections")
+
+            proxy.connections = 0
+            client = HTTPClient(config.http)
+            api = BenchAPI(base_url, client=client)
+            shared = await measure(lambda: api.get('data'))
+            await client.close()
+            print(f"    shared session: {summary(shared)}, "
+                  f"{proxy.connections} connections")
+
+            server.close()
+            await server.wait_closed()
+        await runner.cleanup()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
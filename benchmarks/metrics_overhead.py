@@ -0,0 +1,79 @@
+"""
+Per-event cost of the latency instrumentation.
+
+Replays the work BaseCustomMiddleware does for one event with metrics
+enabled (four perf_counter_ns reads, the event label and three phase
+observations) and compares it to the bare timing it did before.
+
+    python -m benchmarks.metrics_overhead
+"""
+import time
+
+from app.utils.metrics import event_label, middleware_latency
+
+EVENTS = 200_000
+
+
+class FakeMessage:
+    text = '/weather Москва'
+    content_type = 'text'
+
+
+def baseline() -> None:
+    started = time.time()
+    execution_time = time.time() - started
+    if execution_time > 1.0:
+        pass
+
+
+def instrumented(event, data) -> None:
+    started = time.perf_counter_ns()
+    pre_done = time.perf_counter_ns()
+    handler_done = time.perf_counter_ns()
+    finished = time.perf_counter_ns()
+
+    label = data.get('event_label')
+    if label is None:
+        label = data['event_label'] = event_label(event)
+    middleware_latency.observe_phases(
+        ('Bench', label),
+        pre_done - started,
+        handler_done - pre_done,
+        finished - handler_done
+    )
+
+    if (finished - started) / 1e9 > 1.0:
+        pass
+
+
+MIDDLEWARES = 4  # Logging, Throttling, Admin, Database
+
+
+def measure(func, *args) -> float:
+    started = time.perf_counter_ns()
+    for _ in range(EVENTS):
+        func(*args)
+    return (time.perf_counter_ns() - started) / EVENTS
+
+
+def baseline_event() -> None:
+    for _ in range(MIDDLEWARES):
+        baseline()
+
+
+def instrumented_event(event) -> None:
+    # All middlewares of one update share the data dict
+    data = {}
+    for _ in range(MIDDLEWARES):
+        instrumented(event, data)
+
+
+if __name__ == '__main__':
+    event = FakeMessage()
+    before = measure(baseline_event)
+    after = measure(instrumented_event, event)
+    print(f"{MIDDLEWARES} middlewares per event")
+    print(f"baseline:     {before:8.0f} ns per event")
+    print(f"instrumented: {after:8.0f} ns per event")
+    print(f"overhead:     {(after - before) / 1000:8.2f} us per event, "
+          f"{(after - before) / MIDDLEWARES / 1000:.2f} us per middleware")
@@ -0,0 +1,213 @@
+"""
+Replies and a broadcast sent directly against the same sent through
+OutboundScheduler, with a fake Bot API that enforces Telegram's limits.
+
+The fake server answers sendMessage with RetryAfter past GLOBAL_LIMIT
+messages per second overall or CHAT_RATE per second in a chat after a
+burst of CHAT_BURST. For DURATION seconds users get REPLY_RATE replies
+per second spread over CHATS chats, one of them, the flooder, asking
+for FLOOD_RATE replies per second alone. At the same time a broadcast
+goes to BROADCAST chats.
+
+Direct sends do what handlers usually do: the broadcast loop sleeps
+BROADCAST_DELAY between messages and every send sleeps out RetryAfter
+and tries again, up to 3 times. Through the scheduler, handlers send as
+they are and the broadcast runs inside bulk().
+
+    python -m benchmarks.outbound
+"""
+import asyncio
+import logging
+import random
+import time
+from collections import defaultdict, deque
+from typing import Deque, Dict, List
+
+from aiogram import Bot
+from aiogram.bot.api import TelegramAPIServer
+from aiogram.utils.exceptions import RetryAfter
+from aiohttp import web
+
+from app.utils.outbound import OutboundScheduler, ScheduledBot, bulk
+
+TOKEN = '42:BENCHMARK'
+HOST = '127.0.0.1'
+API_PORT = 8814
+GLOBAL_LIMIT = 30
+CHAT_RATE = 1.0
+CHAT_BURST = 3
+DURATION = 10.0
+CHATS = 200
+REPLY_RATE = 12
+FLOODER = 1
+FLOOD_RATE = 3
+BROADCAST = 300
+BROADCAST_DELAY = 0.05
+SEND_LATENCY = 0.02
+
+
+class FakeBotAPI:
+    """sendMessage with Telegram's flood control"""
+
+    def __init__(self) -> None:
+        self.sent: Deque[float] = deque()
+        self.chat_tokens: Dict[str, float] = defaultdict(lambda: CHAT_BURST)
+        self.chat_updated: Dict[str, float] = {}
+        self.delivered: int = 0
+        self.flood_waits: int = 0
+
+    def reset(self) -> None:
+        self.__init__()
+
+    def _retry_after(self, chat_id: str) -> int:
+        now = time.monotonic()
+        while self.sent and self.sent[0] <= now - 1:
+            self.sent.popleft()
+        if len(self.sent) >= GLOBAL_LIMIT:
+            return 1
+        tokens = min(CHAT_BURST, self.chat_tokens[chat_id] + (
+            now - self.chat_updated.get(chat_id, now)) * CHAT_RATE)
+        self.chat_updated[chat_id] = now
+        if tokens < 1:
+            self.chat_tokens[chat_id] = tokens
+            return 3
+        self.chat_tokens[chat_id] = tokens - 1
+        self.sent.append(now)
+        return 0
+
+    async def handle(self, request: web.Request) -> web.Response:
+        params = await request.post()
+        await asyncio.sleep(SEND_LATENCY)
+        retry_after = self._retry_after(params['chat_id'])
+        if retry_after:
+            self.flood_waits += 1
+            return web.json_response({
+                'ok': False, 'error_code': 429,
+                'description': f'Too Many Requests: retry after '
+                               f'{retry_after}',
+                'parameters': {'retry_after': retry_after},
+            }, status=429)
+        self.delivered += 1
+        return web.json_response({'ok': True, 'result': {
+            'message_id': self.delivered, 'date': 0,
+            'chat': {'id': int(params['chat_id']), 'type': 'private'},
+            'text': params['text'],
+        }})
+
+
+async def send_direct(bot: Bot, chat_id: int, text: str) -> None:
+    for _ in range(4):
+        try:
+            await bot.send_message(chat_id, text)
+            return
+        except RetryAfter as e:
+            await asyncio.sleep(e.timeout)
+    raise RuntimeError("Gave up after RetryAfter")
+
+
+class Run:
+    def __init__(self, scheduled: bool) -> None:
+        server = TelegramAPIServer.from_base(f'http://{HOST}:{API_PORT}')
+        self.scheduled: bool = scheduled
+        if scheduled:
+            self.bot: Bot = ScheduledBot(
+                TOKEN, server=server, outbound=OutboundScheduler(
+                    global_rate=GLOBAL_LIMIT, chat_rate=CHAT_RATE,
+                    chat_burst=CHAT_BURST
+                )
+            )
+        else:
+            self.bot = Bot(TOKEN, server=server)
+        self.latency: Dict[str, List[float]] = defaultdict(list)
+        self.failed: int = 0
+
+    async def send(self, chat_id: int) -> None:
+        try:
+            if self.scheduled:
+                await self.bot.send_message(chat_id, 'reply')
+            else:
+                await send_direct(self.bot, chat_id, 'reply')
+        except Exception:
+            self.failed += 1
+
+    async def reply(self, chat_id: int, kind: str) -> None:
+        started = time.perf_counter()
+        await self.send(chat_id)
+        self.latency[kind].append(time.perf_counter() - started)
+
+    async def users(self) -> None:
+        rnd = random.Random(1)
+        tasks = []
+        started = time.perf_counter()
+        tick = 0
+        while time.perf_counter() - started < DURATION:
+            for _ in range(REPLY_RATE // 10):
+                chat_id = rnd.randrange(FLOODER + 1, CHATS)
+                tasks.append(asyncio.create_task(self.reply(chat_id, 'user')))
+            if tick % round(10 / FLOOD_RATE) == 0:
+                tasks.append(asyncio.create_task(
+                    self.reply(FLOODER, 'flooder')
+                ))
+            tick += 1
+            await asyncio.sleep(0.1)
+        await asyncio.gather(*tasks)
+
+    async def broadcast(self) -> float:
+        started = time.perf_counter()
+        chats = range(CHATS, CHATS + BROADCAST)
+        if self.scheduled:
+            with bulk():
+                await asyncio.gather(*(self.send(c) for c in chats))
+        else:
+            for chat_id in chats:
+                await self.send(chat_id)
+                await asyncio.sleep(BROADCAST_DELAY)
+        return time.perf_counter() - started
+
+    async def close(self) -> None:
+        if self.scheduled:
+            await self.bot.outbound.close()
+        session = await self.bot.get_session()
+        await session.close()
+
+
+def percentile(values: List[float], share: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+async def bench(api: FakeBotAPI, scheduled: bool) -> None:
+    api.reset()
+    run = Run(scheduled)
+    broadcast, _ = await asyncio.gather(run.broadcast(), run.users())
+    await run.close()
+    name = 'scheduler' if scheduled else 'direct'
+    user, flooder = run.latency['user'], run.latency['flooder']
+    print(f"{name:>9}: {api.flood_waits:>4} RetryAfter, "
+          f"{run.failed} lost, replies p50 "
+          f"{percentile(user, 0.5) * 1000:>5.0f} ms "
+          f"p99 {percentile(user, 0.99) * 1000:>5.0f} ms, "
+          f"flooder p50 {percentile(flooder, 0.5):>4.1f} s, "
+          f"broadcast {broadcast:>4.1f} s")
+
+
+async def main() -> None:
+    # Pauses of the scheduler are counted below instead
+    logging.getLogger('app.utils.outbound').setLevel(logging.ERROR)
+    api = FakeBotAPI()
+    app = web.Application()
+    app.router.add_post('/bot{token}/sendMessage', api.handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, HOST, API_PORT).start()
+    try:
+        print(f"{REPLY_RATE} replies/s to {CHATS} chats and {FLOOD_RATE}/s "
+              f"to one for {DURATION:.0f} s, broadcast to {BROADCAST}")
+        await bench(api, scheduled=False)
+        await bench(api, scheduled=True)
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
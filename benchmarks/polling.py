@@ -0,0 +1,265 @@
+"""
+End-to-end update lag of aiogram's start_polling against Poller, and
+what each loses or repeats across a restart.
+
+A fake Bot API server runs locally and implements getUpdates like
+Telegram does: updates stay until a later offset confirms them, limit
+and the long polling timeout are honoured. A producer pushes RATE
+updates per second for DURATION seconds; the handler waits
+HANDLER_LATENCY like a sendMessage. Lag is the time from the moment an
+update is queued at the fake server to the end of its handler.
+
+The restart run stops polling in the middle of the stream, queues
+DOWNTIME_UPDATES more while the bot is down and starts polling again:
+start_polling with skip_updates=True as bot.py used to, Poller with
+the offset saved by the first run.
+
+    python -m benchmarks.polling
+"""
+import asyncio
+import itertools
+import os
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+from aiogram import Bot, Dispatcher, types
+from aiogram.bot.api import TelegramAPIServer
+from aiohttp import web
+
+from app.utils.polling import OffsetStore, Poller
+
+TOKEN = '42:BENCHMARK'
+HOST = '127.0.0.1'
+API_PORT = 8813
+RATE = 2_000
+DURATION = 3.0
+HANDLER_LATENCY = 0.005
+DOWNTIME_UPDATES = 500
+# skip_updates long polls for a second, updates pushed meanwhile count
+# as the backlog it skips
+STARTUP = 1.2
+
+_update_ids = itertools.count(1)
+
+
+def make_update() -> dict:
+    update_id = next(_update_ids)
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': update_id % 1000 + 1, 'type': 'private'},
+            'from': {'id': update_id % 1000 + 1, 'is_bot': False,
+                     'first_name': 'Bench'},
+            'text': 'hello',
+        },
+    }
+
+
+class FakeBotAPI:
+    """getUpdates with Telegram's offset semantics"""
+
+    def __init__(self) -> None:
+        self.updates: List[dict] = []
+        self.queued_at: Dict[int, float] = {}
+        self.requests: int = 0
+        self.has_updates = asyncio.Event()
+
+    def reset(self) -> None:
+        """Drops what the previous run left unconfirmed"""
+        self.updates = []
+
+    def push(self, update: dict) -> None:
+        self.updates.append(update)
+        self.queued_at[update['update_id']] = time.perf_counter()
+        self.has_updates.set()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info['method']
+        params = await request.post()
+
+        if method == 'getUpdates':
+            self.requests += 1
+            offset = int(params.get('offset', 0))
+            if offset < 0:
+                self.updates = self.updates[offset:]
+            elif offset:
+                # Everything below the offset is confirmed
+                self.updates = [
+                    update for update in self.updates
+                    if update['update_id'] >= offset
+                ]
+            if not self.updates:
+                self.has_updates.clear()
+                try:
+                    await asyncio.wait_for(
+                        self.has_updates.wait(),
+                        float(params.get('timeout', 0)) or 0.01
+                    )
+                except asyncio.TimeoutError:
+                    pass
+            limit = int(params.get('limit', 100))
+            return web.json_response(
+                {'ok': True, 'result': self.updates[:limit]}
+            )
+
+        if method == 'deleteWebhook':
+            if params.get('drop_pending_updates') == 'true':
+                self.updates = []
+        return web.json_response({'ok': True, 'result': True})
+
+
+def make_dispatcher(on_update: Callable[[int], None]) -> Dispatcher:
+    bot = Bot(
+        TOKEN,
+        server=TelegramAPIServer.from_base(f'http://{HOST}:{API_PORT}')
+    )
+    dp = Dispatcher(bot)
+
+    async def handler(message: types.Message) -> None:
+        await asyncio.sleep(HANDLER_LATENCY)
+        on_update(types.Update.get_current().update_id)
+
+    dp.register_message_handler(handler)
+    return dp
+
+
+async def produce(api: FakeBotAPI, seconds: float) -> int:
+    count = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        for _ in range(RATE // 100):
+            api.push(make_update())
+            count += 1
+        await asyncio.sleep(0.01)
+    return count
+
+
+async def close_session(dp: Dispatcher) -> None:
+    session = await dp.bot.get_session()
+    await session.close()
+
+
+class Polling:
+    """Runs either polling loop against the fake server"""
+
+    def __init__(self, api: FakeBotAPI, use_poller: bool,
+                 store: Optional[OffsetStore] = None) -> None:
+        self.api: FakeBotAPI = api
+        self.handled: List[int] = []
+        self.lag: List[float] = []
+        self.dp: Dispatcher = make_dispatcher(self.on_update)
+        self.poller: Optional[Poller] = (
+            Poller(self.dp, store=store, timeout=20) if use_poller else None
+        )
+        self._task: Optional[asyncio.Task] = None
+
+    def on_update(self, update_id: int) -> None:
+        self.handled.append(update_id)
+        self.lag.append(time.perf_counter() - self.api.queued_at[update_id])
+
+    def start(self) -> None:
+        if self.poller is not None:
+            self._task = asyncio.create_task(self.poller.run())
+        else:
+            self._task = asyncio.create_task(self._start_polling())
+
+    async def _start_polling(self) -> None:
+        # What executor.start_polling(skip_updates=True) does
+        await self.dp.skip_updates()
+        await self.dp.start_polling(timeout=20)
+
+    async def stop(self) -> None:
+        if self.poller is not None:
+            self.poller.stop()
+            await self._task
+            await self.poller.close()
+        else:
+            self.dp.stop_polling()
+            self._task.cancel()
+            await self.dp.wait_closed()
+            await asyncio.sleep(HANDLER_LATENCY * 10)
+        await close_session(self.dp)
+
+
+def report(name: str, polling: Polling, elapsed: float,
+           requests: int) -> None:
+    lag = sorted(polling.lag)
+    print(f"{name:>14}: {len(lag) / elapsed:>6,.0f} updates/s, "
+          f"lag p50 {lag[len(lag) // 2] * 1000:>5.0f} ms, "
+          f"p99 {lag[int(len(lag) * 0.99)] * 1000:>5.0f} ms, "
+          f"{requests} getUpdates")
+
+
+async def bench_lag(api: FakeBotAPI, use_poller: bool) -> None:
+    api.reset()
+    polling = Polling(api, use_poller)
+    polling.start()
+    await asyncio.sleep(STARTUP)
+    requests = api.requests
+    started = time.perf_counter()
+    produced = await produce(api, DURATION)
+    while len(polling.handled) < produced:
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - started
+    await polling.stop()
+    report('Poller' if use_poller else 'start_polling', polling, elapsed,
+           api.requests - requests)
+
+
+async def bench_restart(api: FakeBotAPI, use_poller: bool,
+                        directory: str) -> None:
+    api.reset()
+    store = OffsetStore(os.path.join(directory, f'offset-{use_poller}'))
+    first_id = next(_update_ids) + 1
+
+    polling = Polling(api, use_poller, store)
+    polling.start()
+    await asyncio.sleep(STARTUP)
+    await produce(api, DURATION / 3)
+    await polling.stop()
+    handled = list(polling.handled)
+
+    for _ in range(DOWNTIME_UPDATES):
+        api.push(make_update())
+    last_id = next(_update_ids) - 1
+
+    polling = Polling(api, use_poller, store)
+    polling.start()
+    await asyncio.sleep(1.0)
+    await polling.stop()
+    handled += polling.handled
+
+    expected = set(range(first_id, last_id + 1))
+    missing = len(expected - set(handled))
+    repeated = len(handled) - len(set(handled))
+    name = 'Poller' if use_poller else 'start_polling'
+    print(f"{name:>14}: {len(expected)} updates, {missing} lost, "
+          f"{repeated} handled twice")
+
+
+async def main() -> None:
+    api = FakeBotAPI()
+    app = web.Application()
+    app.router.add_post('/bot{token}/{method}', api.handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, HOST, API_PORT).start()
+
+    try:
+        print(f"{RATE} updates/s for {DURATION:.0f} s, "
+              f"{HANDLER_LATENCY * 1000:.0f} ms handlers")
+        await bench_lag(api, use_poller=False)
+        await bench_lag(api, use_poller=True)
+        print(f"restart with {DOWNTIME_UPDATES} updates queued meanwhile:")
+        with tempfile.TemporaryDirectory() as directory:
+            await bench_restart(api, False, directory)
+            await bench_restart(api, True, directory)
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
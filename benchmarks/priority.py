@@ -0,0 +1,89 @@
+"""
+Latency per scheduling class while thousands of chats flood the bot.
+
+The burst of benchmarks.burst comes from GROUPS chats here, so the
+ready queue of the dispatcher holds thousands of chats and an update of
+a quiet chat waits for its turn behind them. The run is repeated with
+every update in one class, which is plain round robin over chats, and
+with the default classes and weights.
+
+    python -m benchmarks.priority
+"""
+import asyncio
+import itertools
+import time
+from typing import Dict, List, Optional
+
+from aiogram import Bot, types
+
+from app.utils.scheduling import (
+    DEFAULT_WEIGHTS, ChatOrderedDispatcher, UpdateClassifier
+)
+from app.utils.scheduling.classes import TEXT
+from benchmarks.burst import generate_burst
+
+TOKEN = '42:BENCHMARK'
+DURATION = 3.0
+FLOOD_RATE = 3_000
+GROUPS = 5_000
+CONCURRENCY = 64
+HANDLER_LATENCY = 0.05
+
+
+class SingleClass(UpdateClassifier):
+    def classify(self, update: types.Update) -> str:
+        return TEXT
+
+
+async def run(scheduler: Optional[UpdateClassifier]) -> None:
+    dp = ChatOrderedDispatcher(
+        Bot(TOKEN), concurrency=CONCURRENCY, classifier=scheduler
+    )
+    classifier = UpdateClassifier()
+    received: Dict[int, float] = {}
+    latency: Dict[str, List[float]] = {}
+
+    async def handler(event) -> None:
+        await asyncio.sleep(HANDLER_LATENCY)
+        update = types.Update.get_current()
+        latency.setdefault(classifier.classify(update), []).append(
+            time.perf_counter() - received.pop(update.update_id)
+        )
+
+    dp.register_message_handler(handler, commands=['start'])
+    dp.register_message_handler(handler)
+    dp.register_callback_query_handler(handler)
+
+    groups = [-100_000_000_000 - i for i in range(GROUPS)]
+    ids = itertools.count(1)
+    started = time.perf_counter()
+    while time.perf_counter() - started < DURATION:
+        now = time.perf_counter()
+        burst = generate_burst(ids, FLOOD_RATE // 100, time.time(), groups)
+        for update in burst:
+            received[update.update_id] = now
+            dp.submit(update)
+        await asyncio.sleep(0.01)
+
+    await dp.close(timeout=0)
+    await (await dp.bot.get_session()).close()
+
+    for name, values in sorted(latency.items()):
+        values.sort()
+        print(f"  {name:>8}: handled {len(values):>6,}, "
+              f"p50 {values[len(values) // 2] * 1000:>6.0f} ms, "
+              f"p99 {values[int(len(values) * 0.99)] * 1000:>6.0f} ms")
+
+
+async def main() -> None:
+    print(f"{FLOOD_RATE} updates/s from {GROUPS} groups for "
+          f"{DURATION:.0f} s, {CONCURRENCY} handlers of "
+          f"{HANDLER_LATENCY * 1000:.0f} ms")
+    print("one class:")
+    await run(SingleClass())
+    print(f"classes with weights {DEFAULT_WEIGHTS}:")
+    await run(None)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,96 @@
+"""
+Cost of routing a message to its handler as the number of commands
+grows: aiogram's Dispatcher against RoutedDispatcher.
+
+Each dispatcher gets COMMANDS command handlers registered like
+BaseCommandHandler does, private chats only, and a text handler for
+everything else after them. The messages are commands picked at random
+among the registered ones, TEXT_SHARE of them plain text. Handlers
+return at once, so the time per message is the dispatch overhead:
+filters, middleware triggers and the handler call.
+
+    python -m benchmarks.routing
+"""
+import asyncio
+import random
+import time
+from typing import List, Type
+
+from aiogram import Bot, Dispatcher, types
+
+from app.utils.routing import RoutedDispatcher
+
+COMMANDS = [20, 50, 100, 200, 500]
+MESSAGES = 5_000
+TEXT_SHARE = 0.2
+
+
+def make_dispatcher(cls: Type[Dispatcher], commands: int) -> Dispatcher:
+    bot = Bot('42:BENCHMARK')
+    # Command filters ask for the bot username when a mention is given
+    bot._me = types.User(id=42, is_bot=True, first_name='Bench',
+                         username='bench_bot')
+    dp = cls(bot)
+
+    async def command(message: types.Message) -> str:
+        return 'command'
+
+    async def text(message: types.Message) -> str:
+        return 'text'
+
+    for i in range(commands):
+        dp.register_message_handler(
+            command, commands=[f'command{i}'], chat_type='private'
+        )
+    dp.register_message_handler(text)
+    return dp
+
+
+def make_updates(commands: int, count: int) -> List[types.Update]:
+    rnd = random.Random(commands)
+    updates = []
+    for update_id in range(count):
+        if rnd.random() < TEXT_SHARE:
+            text = 'hello'
+        else:
+            text = f'/command{rnd.randrange(commands)} some args'
+        updates.append(types.Update(update_id=update_id, message={
+            'message_id': update_id,
+            'date': 0,
+            'chat': {'id': update_id % 100 + 1, 'type': 'private'},
+            'from': {'id': update_id % 100 + 1, 'is_bot': False,
+                     'first_name': 'Bench'},
+            'text': text,
+        }))
+    return updates
+
+
+async def bench(cls: Type[Dispatcher], commands: int,
+                updates: List[types.Update]) -> float:
+    """Microseconds per message"""
+    dp = make_dispatcher(cls, commands)
+    Bot.set_current(dp.bot)
+    Dispatcher.set_current(dp)
+    # Warm up, then the measured pass
+    for update in updates[:200]:
+        await dp.process_update(update)
+    started = time.perf_counter()
+    for update in updates:
+        results = await dp.process_update(update)
+        assert results, update.message.text
+    return (time.perf_counter() - started) / len(updates) * 1e6
+
+
+async def main() -> None:
+    print(f"{MESSAGES} messages, {TEXT_SHARE:.0%} plain text")
+    print(f"{'commands':>8} {'aiogram':>10} {'routed':>10} {'speedup':>8}")
+    for commands in COMMANDS:
+        updates = make_updates(commands, MESSAGES)
+        linear = await bench(Dispatcher, commands, updates)
+        routed = await bench(RoutedDispatcher, commands, updates)
+        print(f"{commands:>8} {linear:>8.0f}us {routed:>8.0f}us "
+              f"{linear / routed:>7.1f}x")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,236 @@
+"""
+Choosing the recipients of a broadcast among USERS users: an SQL query
+per target against segments materialized by SegmentIndex.
+
+Users are rows of a SQLite table with the fields the segments of the bot
+look at: banned, language, username, last activity, and a table of
+users who blocked the bot. For each target the benchmark reads every
+recipient id as Broadcaster would, PAGE_SIZE at a time:
+
+- keyset: KeysetRecipients over the query of the target, the database
+  filters and walks the rows for every page;
+- python: every row loaded and checked in Python, once per target;
+- segments: SegmentIndex built once, then each target is a combination
+  of bitsets streamed by BitsetRecipients.
+
+For the index the build, an incremental refresh after CHANGED users
+changed and the peak memory are reported too.
+
+    python -m benchmarks.segments
+"""
+import asyncio
+import functools
+import os
+import random
+import resource
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Sequence, Tuple
+
+from peewee import (
+    BigIntegerField, BooleanField, CharField, DateTimeField, Model,
+    SqliteDatabase
+)
+
+from app.utils.broadcast import KeysetRecipients, Segment, SegmentIndex
+
+USERS = 1_000_000
+FIRST_ID = 100_000_000
+BLOCKED_EVERY = 50
+CHANGED = 1000
+PAGE_SIZE = 1000
+RECENT_DAYS = 7
+
+database = SqliteDatabase(None)
+
+
+class BenchUser(Model):
+    user_id = BigIntegerField(unique=True)
+    username = CharField(null=True)
+    language_code = CharField(null=True)
+    is_banned = BooleanField(default=False)
+    last_activity = DateTimeField()
+
+    class Meta:
+        database = database
+        table_name = 'users'
+
+
+class BenchBlocked(Model):
+    user_id = BigIntegerField(primary_key=True)
+
+    class Meta:
+        database = database
+        table_name = 'blocked_users'
+
+
+SEGMENTS: Dict[str, Segment] = {
+    'reachable': Segment(
+        (BenchUser.is_banned == False)  # noqa: E712
+        & BenchUser.user_id.not_in(BenchBlocked.select(BenchBlocked.user_id))
+    ),
+    'active': Segment(field=BenchUser.last_activity, days=RECENT_DAYS),
+    'has_username': Segment(BenchUser.username.is_null(False)),
+    'lang_ru': Segment(BenchUser.language_code.startswith('ru')),
+}
+
+# Target -> segments its users are in all of, and none of
+TARGETS: Dict[str, Tuple[Sequence[str], Sequence[str]]] = {
+    'all': (['reachable'], []),
+    'active ru': (['reachable', 'active', 'lang_ru'], []),
+    'active, no username': (['reachable', 'active'], ['has_username']),
+}
+
+executor = ThreadPoolExecutor(max_workers=1)
+
+
+async def run_in_db(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        executor, functools.partial(func, *args, **kwargs)
+    )
+
+
+def create_users(path: str) -> None:
+    database.init(path, pragmas={'journal_mode': 'wal'})
+    database.create_tables([BenchUser, BenchBlocked])
+    rng = random.Random(1)
+    now = datetime.now()
+    languages = ['ru', 'ru-RU', 'en', 'en-US', 'uk', 'de', None]
+
+    def rows():
+        for i in range(USERS):
+            yield (
+                FIRST_ID + i * 7,
+                f'user{i}' if rng.random() < 0.6 else None,
+                rng.choice(languages),
+                rng.random() < 0.01,
+                # Half a day off the window edge: the index lags behind
+                # the moving window by up to an hour, by design
+                now - timedelta(days=rng.randrange(60), hours=12),
+            )
+
+    with database.atomic():
+        database.connection().executemany(
+            'INSERT INTO users (user_id, username, language_code, '
+            'is_banned, last_activity) VALUES (?, ?, ?, ?, ?)', rows()
+        )
+        database.connection().executemany(
+            'INSERT INTO blocked_users (user_id) VALUES (?)',
+            ((FIRST_ID + i * 7,) for i in range(0, USERS, BLOCKED_EVERY))
+        )
+
+
+def sql_condition(include: Sequence[str], exclude: Sequence[str]):
+    now = datetime.now()
+    where = functools.reduce(
+        lambda a, b: a & b,
+        [SEGMENTS[name].condition(now) for name in include]
+    )
+    for name in exclude:
+        where &= ~SEGMENTS[name].condition(now)
+    return where
+
+
+def python_filter(include: Sequence[str],
+                  exclude: Sequence[str]) -> List[int]:
+    since = datetime.now() - timedelta(days=RECENT_DAYS)
+    blocked = {user_id for user_id, in BenchBlocked.select().tuples()}
+    checks = {
+        'reachable': lambda u: not u[3] and u[0] not in blocked,
+        'active': lambda u: u[4] >= since,
+        'has_username': lambda u: u[1] is not None,
+        'lang_ru': lambda u: (u[2] or '').startswith('ru'),
+    }
+    query = BenchUser.select(
+        BenchUser.user_id, BenchUser.username, BenchUser.language_code,
+        BenchUser.is_banned, BenchUser.last_activity
+    ).order_by(BenchUser.id).tuples()
+    return [
+        user[0] for user in query
+        if all(checks[name](user) for name in include)
+        and not any(checks[name](user) for name in exclude)
+    ]
+
+
+async def stream(recipients) -> List[int]:
+    ids: List[int] = []
+    after = None
+    while True:
+        page = await recipients.page(after, PAGE_SIZE)
+        if not page:
+            return ids
+        ids.extend(page)
+        after = page[-1]
+
+
+def peak_rss() -> float:
+    """Peak resident memory of the process in MB"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def main() -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        started = time.perf_counter()
+        await run_in_db(create_users, os.path.join(directory, 'users.db'))
+        print(f"{USERS:,} users created in "
+              f"{time.perf_counter() - started:.1f} s")
+
+        index = SegmentIndex(
+            BenchUser.select(), BenchUser.id, BenchUser.user_id, SEGMENTS,
+            run_in_db
+        )
+        before = peak_rss()
+        started = time.perf_counter()
+        await index.refresh()
+        print(f"segments: built in {time.perf_counter() - started:.2f} s, "
+              f"+{peak_rss() - before:.0f} MB peak")
+
+        changed = random.Random(2).sample(range(1, USERS + 1), CHANGED)
+        await run_in_db(
+            BenchUser.update(last_activity=datetime.now())
+            .where(BenchUser.id.in_(changed)).execute
+        )
+        for slot in changed:
+            index.touch(index.values[slot])
+        started = time.perf_counter()
+        await index.refresh()
+        print(f"          refreshed after {CHANGED} changes in "
+              f"{(time.perf_counter() - started) * 1000:.0f} ms")
+        print()
+
+        for target, (include, exclude) in TARGETS.items():
+            started = time.perf_counter()
+            bits = index.select(include, exclude)
+            combined = time.perf_counter() - started
+            recipients = index.recipients(include, exclude)
+            ids = await stream(recipients)
+            segments = time.perf_counter() - started
+
+            query = BenchUser.select(BenchUser.user_id).where(
+                sql_condition(include, exclude)
+            )
+            started = time.perf_counter()
+            keyset = await stream(
+                KeysetRecipients(query, BenchUser.user_id, run_in_db)
+            )
+            keyset_time = time.perf_counter() - started
+
+            started = time.perf_counter()
+            python = await run_in_db(python_filter, include, exclude)
+            python_time = time.perf_counter() - started
+
+            # User ids grow with the row ids here, all three share an order
+            assert ids == python == keyset
+            print(f"{target}: {bits.bit_count():,} recipients")
+            print(f"     keyset: {keyset_time:.2f} s")
+            print(f"     python: {python_time:.2f} s")
+            print(f"   segments: {segments:.2f} s, of which "
+                  f"{combined * 1000:.1f} ms combining bitsets")
+        await run_in_db(database.close)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
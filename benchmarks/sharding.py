@@ -0,0 +1,143 @@
+"""
+Throughput of the sharded setup with 1..N worker processes.
+
+The ingress routes synthetic updates of many chats in batches of 100,
+like getUpdates returns them, over the Unix socket channels to
+ShardWorker processes. Their only handler burns HANDLER_WORK of CPU,
+standing in for middlewares, ORM objects and rendering. No network is
+involved, so the result is the CPU ceiling of the whole pipeline.
+
+Scaling is bounded by the number of cores: on a single core machine
+every setup gets about the same rate.
+
+    python -m benchmarks.sharding
+"""
+import asyncio
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from typing import Dict, List
+
+from aiogram import Bot, Dispatcher, types
+
+from app.utils.sharding import ShardRouter, ShardWorker, WorkerChannel
+from app.utils.sharding.routing import shard_of
+
+TOKEN = '42:BENCHMARK'
+UPDATES = 20_000
+CHATS = 5_000
+BATCH = 100
+# Seconds of CPU per update in the handler
+HANDLER_WORK = 0.0002
+
+
+def burn(seconds: float) -> None:
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def make_updates() -> List[dict]:
+    chats = [random.randint(1, 10 ** 9) for _ in range(CHATS)]
+    return [
+        {
+            'update_id': update_id,
+            'message': {
+                'message_id': update_id,
+                'date': 0,
+                'chat': {'id': chat_id, 'type': 'private'},
+                'from': {'id': chat_id, 'is_bot': False, 'first_name': 'B'},
+                'text': 'hello',
+            },
+        }
+        for update_id, chat_id in enumerate(
+            random.choice(chats) for _ in range(UPDATES)
+        )
+    ]
+
+
+def worker_main(path: str, expected: int, done: multiprocessing.Queue) -> None:
+    async def main() -> None:
+        dp = Dispatcher(Bot(TOKEN))
+        finished = asyncio.Event()
+        processed = 0
+
+        async def handler(message: types.Message) -> None:
+            nonlocal processed
+            burn(HANDLER_WORK)
+            processed += 1
+            if processed == expected:
+                finished.set()
+
+        dp.register_message_handler(handler)
+        worker = ShardWorker(dp, path)
+        serving = asyncio.create_task(worker.serve())
+        await finished.wait()
+        done.put(time.perf_counter())
+        worker.stop()
+        await serving
+
+    asyncio.run(main())
+
+
+async def run(workers: int, updates: List[dict], directory: str) -> float:
+    expected: Dict[int, int] = {}
+    for update in updates:
+        index = shard_of(update, workers)
+        expected[index] = expected.get(index, 0) + 1
+
+    done: multiprocessing.Queue = multiprocessing.Queue()
+    processes = []
+    channels = []
+    for index in range(workers):
+        path = os.path.join(directory, f'bench-{workers}-{index}.sock')
+        process = multiprocessing.Process(
+            target=worker_main, args=(path, expected.get(index, 0), done)
+        )
+        process.start()
+        processes.append(process)
+        channel = WorkerChannel(index, path, retry_interval=0.05)
+        channel.start()
+        channels.append(channel)
+
+    # Workers are up once every channel is connected
+    while any(channel._writer is None for channel in channels):
+        await asyncio.sleep(0.05)
+
+    router = ShardRouter(channels)
+    started = time.perf_counter()
+    for i in range(0, len(updates), BATCH):
+        await router.route(updates[i:i + BATCH])
+
+    loop = asyncio.get_running_loop()
+    finished = max([
+        await loop.run_in_executor(None, done.get)
+        for _ in range(len(expected))
+    ])
+
+    for channel in channels:
+        await channel.close()
+    for process in processes:
+        process.join()
+    return len(updates) / (finished - started)
+
+
+async def main() -> None:
+    updates = make_updates()
+    cores = os.cpu_count() or 1
+    print(f"{UPDATES} updates of {CHATS} chats, "
+          f"{HANDLER_WORK * 1e6:.0f} us of handler CPU each, {cores} cores")
+
+    baseline = None
+    with tempfile.TemporaryDirectory() as directory:
+        for workers in sorted({1, 2, 4, cores}):
+            rate = await run(workers, updates, directory)
+            baseline = baseline or rate
+            print(f"{workers:>3} workers: {rate:>9,.0f} updates/s "
+                  f"({rate / baseline:.2f}x)")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,159 @@
+"""
+Time from process start to the first processed update with command
+modules imported at startup and with lazy loading.
+
+The command modules are generated from the manifest of
+app/handlers/users/message/commands, one per module, each registering
+its commands like the real ones do. Their import cost stands in for
+the dependencies of the real modules: BASE_COST for aiogram types,
+keyboards and config, IMPORT_COST on top for the heavy ones, psutil in
+status and the database layer in stats. Every run is a fresh
+interpreter; the time includes its start and the aiogram import.
+
+Eager imports everything before the first update. Lazy declares the
+manifest, handles /start, which imports one module, then /status, the
+most expensive one, then warms up the rest.
+
+    python -m benchmarks.startup
+"""
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict
+
+from app.handlers.users.message.commands import COMMANDS, EAGER
+
+PACKAGE = 'bench_commands'
+RUNS = 5
+# Seconds spent importing a module
+BASE_COST = 0.005
+IMPORT_COST: Dict[str, float] = {
+    'status': 0.12,
+    'stats': 0.07,
+    'weather': 0.04,
+}
+
+MODULE = '''import time
+
+from aiogram import Dispatcher, types
+
+time.sleep({cost})
+dp = Dispatcher.get_current()
+
+
+async def handle(message: types.Message) -> str:
+    return {name!r}
+
+'''
+
+
+def write_package(directory: str) -> None:
+    package = os.path.join(directory, PACKAGE)
+    os.mkdir(package)
+    open(os.path.join(package, '__init__.py'), 'w').close()
+    modules: Dict[str, list] = {module: [] for module in EAGER}
+    for command, module in COMMANDS.items():
+        modules.setdefault(module, []).append(command)
+    for module, commands in modules.items():
+        source = MODULE.format(
+            cost=BASE_COST + IMPORT_COST.get(module, 0.0), name=module
+        )
+        if commands:
+            source += (
+                f"dp.register_message_handler(handle, commands={commands!r},"
+                f" chat_type='private')\n"
+            )
+        else:
+            source += "dp.register_message_handler(handle)\n"
+        with open(os.path.join(package, f'{module}.py'), 'w') as f:
+            f.write(source)
+
+
+def make_update(text: str) -> dict:
+    return {
+        'update_id': 1,
+        'message': {
+            'message_id': 1,
+            'date': 0,
+            'chat': {'id': 1, 'type': 'private'},
+            'from': {'id': 1, 'is_bot': False, 'first_name': 'Bench'},
+            'text': text,
+        },
+    }
+
+
+async def child(mode: str, started: float) -> Dict[str, float]:
+    from importlib import import_module
+
+    from aiogram import Bot, Dispatcher, types
+
+    from app.utils.routing import RoutedDispatcher
+
+    bot = Bot('42:BENCHMARK')
+    dp = RoutedDispatcher(bot)
+    Bot.set_current(bot)
+    Dispatcher.set_current(dp)
+
+    if mode == 'lazy':
+        dp.message_handlers.lazy({
+            command: f'{PACKAGE}.{module}'
+            for command, module in COMMANDS.items()
+        })
+        for module in EAGER:
+            import_module(f'{PACKAGE}.{module}')
+    else:
+        for module in EAGER + list(dict.fromkeys(COMMANDS.values())):
+            import_module(f'{PACKAGE}.{module}')
+
+    timings = {}
+    for command in ('start', 'status'):
+        update = types.Update(**make_update(f'/{command}'))
+        assert await dp.process_update(update) == [command]
+        timings[command] = time.monotonic() - started
+    await dp.message_handlers.warm_up()
+    timings['all'] = time.monotonic() - started
+    session = await bot.get_session()
+    await session.close()
+    return timings
+
+
+def run(mode: str, directory: str) -> Dict[str, float]:
+    path = os.pathsep.join([directory, os.getcwd()])
+    env = dict(os.environ, PYTHONPATH=path)
+    started = time.monotonic()
+    output = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.startup', mode, str(started)],
+        env=env, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output)
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        write_package(directory)
+        print(f"{len(COMMANDS)} commands, median of {RUNS} runs, "
+              f"time since process start")
+        print(f"{'':>6} {'/start':>8} {'/status':>8} {'all':>8}")
+        for mode in ('eager', 'lazy'):
+            runs = [run(mode, directory) for _ in range(RUNS)]
+            median = {
+                key: sorted(r[key] for r in runs)[RUNS // 2]
+                for key in ('start', 'status', 'all')
+            }
+            print(f"{mode:>6} " + " ".join(
+                f"{median[key] * 1000:>6.0f}ms"
+                for key in ('start', 'status', 'all')
+            ))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3:
+        print(json.dumps(
+            asyncio.run(child(sys.argv[1], float(sys.argv[2])))
+        ))
+    else:
+        main()
@@ -0,0 +1,57 @@
+"""
+Microbenchmark of the throttling limiters.
+
+Feeds up to 1M distinct user ids through each limiter and reports the
+cost of a single check and the memory held by the limiter state.
+
+    python -m benchmarks.throttling
+"""
+import sys
+import time
+
+from app.utils.throttling import SlidingWindowLimiter, TokenBucketLimiter
+
+CHECKPOINTS = [10_000, 100_000, 250_000, 500_000, 1_000_000]
+MAX_KEYS = 100_000
+# Simulated time between events: 1M users arrive within one second,
+# so idle eviction never kicks in and only max_keys bounds the state
+EVENT_INTERVAL = 0.000001
+
+
+def state_size(limiter) -> int:
+    """Approximate memory held by the limiter state in bytes"""
+    size = sys.getsizeof(limiter._state)
+    for key, state in limiter._state.items():
+        size += sys.getsizeof(key) + sys.getsizeof(state)
+        size += sum(sys.getsizeof(item) for item in state)
+    return size
+
+
+def run(limiter_class) -> None:
+    clock = [0.0]
+    limiter = limiter_class(
+        limit=2, period=1.0, max_keys=MAX_KEYS, clock=lambda: clock[0]
+    )
+
+    print(f"\n{limiter_class.__name__} (max_keys={MAX_KEYS})")
+    print(f"{'users':>10} {'ns/check':>10} {'keys':>8} {'state MB':>9}")
+
+    user_id = 0
+    for checkpoint in CHECKPOINTS:
+        count = checkpoint - user_id
+        started = time.perf_counter_ns()
+        while user_id < checkpoint:
+            clock[0] += EVENT_INTERVAL
+            limiter.hit(user_id)
+            user_id += 1
+        per_check = (time.perf_counter_ns() - started) / count
+
+        print(
+            f"{checkpoint:>10} {per_check:>10.0f} {len(limiter):>8} "
+            f"{state_size(limiter) / 1024 / 1024:>9.1f}"
+        )
+
+
+if __name__ == '__main__':
+    for limiter_class in (TokenBucketLimiter, SlidingWindowLimiter):
+        run(limiter_class)
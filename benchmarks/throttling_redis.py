@@ -0,0 +1,77 @@
+"""
+Checks the Redis throttling backend against a local redis-server.
+
+Two backend instances stand in for two worker processes: together they
+must not allow more events than one limit. Then the backend is pointed
+at a closed port to show the local fallback.
+
+    redis-server --port 6379 &
+    python -m benchmarks.throttling_redis
+"""
+import asyncio
+import os
+import time
+
+from redis import asyncio as aioredis
+
+from app.utils.throttling.redis_backend import RedisThrottleBackend
+
+HOST = os.getenv('REDIS_HOST', 'localhost')
+PORT = int(os.getenv('REDIS_PORT', '6379'))
+EVENTS = 10_000
+
+
+async def shared_limit(strategy: str) -> None:
+    workers = [
+        RedisThrottleBackend(aioredis.Redis(host=HOST, port=PORT), strategy)
+        for _ in range(2)
+    ]
+    await workers[0].redis.delete('throttle:user:1')
+
+    limits = [('user', 1, 5, 60.0)]
+    allowed = 0
+    for i in range(20):
+        result = await workers[i % 2].check(limits)
+        allowed += result.allowed
+    print(f"{strategy}: 2 workers, limit 5/60s -> {allowed} allowed")
+
+    started = time.perf_counter()
+    for i in range(EVENTS):
+        await workers[0].check([('user', i, 5, 60.0), ('chat', -i, 20, 60.0)])
+    elapsed = time.perf_counter() - started
+    print(
+        f"{strategy}: {EVENTS / elapsed:.0f} checks/s, "
+        f"{elapsed / EVENTS * 1e6:.0f} us per check (2 limits, 1 round trip)"
+    )
+
+    for worker in workers:
+        await worker.close()
+
+
+async def fallback() -> None:
+    backend = RedisThrottleBackend(
+        aioredis.Redis(host=HOST, port=1, socket_connect_timeout=0.05)
+    )
+    started = time.perf_counter()
+    result = await backend.check([('user', 1, 5, 60.0)])
+    first = time.perf_counter() - started
+
+    started = time.perf_counter()
+    await backend.check([('user', 1, 5, 60.0)])
+    second = time.perf_counter() - started
+
+    print(
+        f"fallback: allowed={result.allowed}, first check {first * 1e3:.1f} ms, "
+        f"next check {second * 1e6:.0f} us (Redis skipped)"
+    )
+    await backend.close()
+
+
+async def main() -> None:
+    for strategy in ('sliding_window', 'token_bucket'):
+        await shared_limit(strategy)
+    await fallback()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,128 @@
+"""
+/weather lookups with and without the response cache of
+WeatherAPIWrapper.
+
+REQUESTS lookups arrive at random over DURATION seconds for CITIES
+cities, a few of them much more popular than the rest (Zipf), typed
+with random case and spacing as users do. The upstream is a
+WeatherAPIWrapper whose make_request answers after UPSTREAM_LATENCY
+instead of calling OpenWeatherMap. TTL and STALE_TTL are scaled down
+to the few seconds of the run, so entries expire and are refreshed in
+the background while it goes on.
+
+Reported are the upstream calls, the latency of the lookups and how
+they were served.
+
+    python -m benchmarks.weather_cache
+"""
+import asyncio
+import random
+import statistics
+import time
+from typing import Any, Dict, List, Optional
+
+from app.api.cache import ResponseCache
+from app.api.weather import WeatherAPIWrapper
+from app.utils.metrics import api_cache_lookups
+
+REQUESTS = 20_000
+DURATION = 10.0
+CITIES = 500
+UPSTREAM_LATENCY = 0.2
+TTL = 2.0
+STALE_TTL = 4.0
+MAXSIZE = 200
+
+
+class FakeWeatherAPI(WeatherAPIWrapper):
+    def __init__(self, cache: ResponseCache) -> None:
+        super().__init__(api_key='benchmark', cache=cache)
+        self.calls: int = 0
+
+    async def make_request(self, method: str, endpoint: str,
+                           data: Optional[Dict[str, Any]] = None
+                           ) -> Dict[str, Any]:
+        self.calls += 1
+        await asyncio.sleep(UPSTREAM_LATENCY)
+        return {'name': data['q'], 'main': {'temp': 20.0}, 'dt': 0}
+
+
+def workload() -> List[str]:
+    rng = random.Random(1)
+    names = [f'City {i}' for i in range(CITIES)]
+    weights = [1 / (rank + 1) for rank in range(CITIES)]
+    spellings = [
+        lambda name: name,
+        lambda name: name.lower(),
+        lambda name: name.upper(),
+        lambda name: f'  {name} ',
+    ]
+    return [
+        rng.choice(spellings)(name)
+        for name in rng.choices(names, weights, k=REQUESTS)
+    ]
+
+
+async def run(lookup, cities: List[str]) -> List[float]:
+    rng = random.Random(2)
+    latencies: List[float] = []
+
+    async def one(city: str) -> None:
+        started = time.perf_counter()
+        await lookup(city)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    tasks = []
+    for city in cities:
+        await asyncio.sleep(rng.expovariate(REQUESTS / DURATION))
+        tasks.append(asyncio.create_task(one(city)))
+    await asyncio.gather(*tasks)
+    return latencies
+
+
+def report(name: str, calls: int, latencies: List[float]) -> None:
+    p50, p95 = (
+        statistics.quantiles(latencies, n=100)[i] for i in (49, 94)
+    )
+    print(f"{name}: {calls:,} upstream calls, "
+          f"p50 {p50:.1f} ms, p95 {p95:.1f} ms")
+
+
+def lookups() -> Dict[str, float]:
+    return {
+        sample.labels['result']: sample.value
+        for metric in api_cache_lookups.collect()
+        for sample in metric.samples
+        if sample.name.endswith('_total')
+        and sample.labels['cache'] == 'benchmark'
+    }
+
+
+async def main() -> None:
+    cities = workload()
+    print(f"{REQUESTS:,} lookups of {CITIES} cities in {DURATION:.0f} s, "
+          f"upstream {UPSTREAM_LATENCY * 1000:.0f} ms")
+
+    cache = ResponseCache(
+        'benchmark', ttl=TTL, stale_ttl=STALE_TTL, maxsize=MAXSIZE,
+        cacheable=lambda response: 'error' not in response
+    )
+    api = FakeWeatherAPI(cache)
+    # Straight to make_request, as every /weather call went before
+    uncached = await run(
+        lambda city: api.get('weather', {'q': city, 'units': 'metric'}),
+        cities
+    )
+    report("   no cache", api.calls, uncached)
+
+    api.calls = 0
+    cached = await run(api.get_weather, cities)
+    report("      cache", api.calls, cached)
+    counts = ', '.join(
+        f"{result} {count:,.0f}" for result, count in lookups().items()
+    )
+    print(f"             {counts}; {len(cache)} entries kept")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
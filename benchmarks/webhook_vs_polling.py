@@ -0,0 +1,224 @@
+"""
+Reply latency and throughput of long polling against webhook mode.
+
+A fake Bot API server runs locally: it hands out synthetic updates via
+getUpdates and records sendMessage calls. A dispatcher with a single
+echo handler runs in three setups:
+
+* polling: updates are fetched with getUpdates, the reply is a
+  sendMessage request;
+* webhook: updates are POSTed to TelegramWebhookHandler, the reply is a
+  sendMessage request;
+* webhook + response: the handler returns SendMessage and the reply
+  travels in the webhook response, as answer() does in webhook mode.
+
+CLIENTS simulated chats each send a message and wait for the reply
+before sending the next one. Everything shares one event loop, so the
+absolute numbers are lower than over a network; the ratios are what
+matters. Polling uses aiogram's defaults like bot.py does, including
+the 0.1 s relax pause after each getUpdates batch.
+
+    python -m benchmarks.webhook_vs_polling
+"""
+import asyncio
+import itertools
+import statistics
+import time
+from typing import Dict, List, Tuple
+
+from aiogram import Bot, Dispatcher, types
+from aiogram.bot.api import TelegramAPIServer
+from aiogram.dispatcher.webhook import BOT_DISPATCHER_KEY, SendMessage
+from aiohttp import ClientSession, web
+
+from app.utils.misc.webhook import TelegramWebhookHandler
+
+TOKEN = '42:BENCHMARK'
+HOST = '127.0.0.1'
+API_PORT = 8811
+WEBHOOK_PORT = 8812
+CLIENTS = 50
+MESSAGES = 40
+
+_update_ids = itertools.count(1)
+
+
+def make_update(chat_id: int, text: str) -> dict:
+    return {
+        'update_id': next(_update_ids),
+        'message': {
+            'message_id': 1,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': {'id': chat_id, 'is_bot': False, 'first_name': 'Bench'},
+            'text': text,
+        },
+    }
+
+
+class FakeBotAPI:
+    """Serves getUpdates from a queue, resolves waiters on sendMessage"""
+
+    def __init__(self) -> None:
+        self.pending: List[dict] = []
+        self.has_updates = asyncio.Event()
+        self.replies: Dict[int, asyncio.Future] = {}
+
+    def push(self, update: dict) -> None:
+        self.pending.append(update)
+        self.has_updates.set()
+
+    def expect_reply(self, chat_id: int) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self.replies[chat_id] = future
+        return future
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info['method']
+        params = await request.post()
+
+        if method == 'getUpdates':
+            if not self.pending:
+                self.has_updates.clear()
+                try:
+                    await asyncio.wait_for(
+                        self.has_updates.wait(),
+                        float(params.get('timeout', 0)) or 0.01
+                    )
+                except asyncio.TimeoutError:
+                    pass
+            updates, self.pending = self.pending, []
+            return web.json_response({'ok': True, 'result': updates})
+
+        if method == 'sendMessage':
+            chat_id = int(params['chat_id'])
+            future = self.replies.pop(chat_id, None)
+            if future and not future.done():
+                future.set_result(time.perf_counter())
+            return web.json_response({'ok': True, 'result': {
+                'message_id': 2,
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'text': params.get('text', ''),
+            }})
+
+        return web.json_response({'ok': True, 'result': True})
+
+
+async def start_site(app: web.Application, port: int) -> web.AppRunner:
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, HOST, port).start()
+    return runner
+
+
+async def close_session(dp: Dispatcher) -> None:
+    session = await dp.bot.get_session()
+    await session.close()
+
+
+def make_dispatcher(respond_in_webhook: bool) -> Dispatcher:
+    bot = Bot(
+        TOKEN,
+        server=TelegramAPIServer.from_base(f'http://{HOST}:{API_PORT}')
+    )
+    dp = Dispatcher(bot)
+
+    async def echo(message: types.Message):
+        if respond_in_webhook:
+            return SendMessage(message.chat.id, message.text)
+        await message.answer(message.text)
+
+    dp.register_message_handler(echo)
+    return dp
+
+
+async def run_clients(send) -> Tuple[List[float], float]:
+    latencies: List[float] = []
+
+    async def client(chat_id: int) -> None:
+        for i in range(MESSAGES):
+            started = time.perf_counter()
+            await send(chat_id, f'message {i}')
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(1000 + n) for n in range(CLIENTS)))
+    return latencies, time.perf_counter() - started
+
+
+async def bench_polling(api: FakeBotAPI) -> Tuple[List[float], float]:
+    dp = make_dispatcher(respond_in_webhook=False)
+    polling = asyncio.create_task(dp.start_polling(timeout=20))
+
+    async def send(chat_id: int, text: str) -> None:
+        reply = api.expect_reply(chat_id)
+        api.push(make_update(chat_id, text))
+        await reply
+
+    try:
+        return await run_clients(send)
+    finally:
+        dp.stop_polling()
+        api.push(make_update(1, 'stop'))
+        await polling
+        await close_session(dp)
+
+
+async def bench_webhook(api: FakeBotAPI,
+                        respond_in_webhook: bool) -> Tuple[List[float], float]:
+    dp = make_dispatcher(respond_in_webhook)
+    app = web.Application()
+    app[BOT_DISPATCHER_KEY] = dp
+    app.router.add_route('*', '/webhook', TelegramWebhookHandler)
+    runner = await start_site(app, WEBHOOK_PORT)
+    url = f'http://{HOST}:{WEBHOOK_PORT}/webhook'
+
+    async with ClientSession() as session:
+        async def send(chat_id: int, text: str) -> None:
+            if respond_in_webhook:
+                async with session.post(
+                        url, json=make_update(chat_id, text)) as response:
+                    body = await response.json()
+                assert body['method'] == 'sendMessage'
+                return
+
+            reply = api.expect_reply(chat_id)
+            async with session.post(url, json=make_update(chat_id, text)):
+                pass
+            await reply
+
+        try:
+            return await run_clients(send)
+        finally:
+            await runner.cleanup()
+            await close_session(dp)
+
+
+def report(name: str, latencies: List[float], elapsed: float) -> None:
+    latencies.sort()
+    p50 = statistics.median(latencies) * 1000
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+    print(
+        f"{name:>18}: {len(latencies) / elapsed:>7,.0f} updates/s, "
+        f"p50 {p50:6.2f} ms, p99 {p99:6.2f} ms"
+    )
+
+
+async def main() -> None:
+    api = FakeBotAPI()
+    api_app = web.Application()
+    api_app.router.add_post('/bot{token}/{method}', api.handle)
+    api_runner = await start_site(api_app, API_PORT)
+
+    try:
+        print(f"{CLIENTS} chats x {MESSAGES} messages")
+        report('polling', *await bench_polling(api))
+        report('webhook', *await bench_webhook(api, False))
+        report('webhook + response', *await bench_webhook(api, True))
+    finally:
+        await api_runner.cleanup()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+
+from app.api.cache import ResponseCache
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now: float = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class Upstream:
+    """Counts calls and answers with the call number"""
+
+    def __init__(self) -> None:
+        self.calls: int = 0
+        self.release: asyncio.Event = asyncio.Event()
+        self.release.set()
+
+    async def load(self) -> dict:
+        self.calls += 1
+        call = self.calls
+        await self.release.wait()
+        return {'call': call}
+
+
+@pytest.mark.asyncio
+async def test_fresh_response_is_served_from_the_cache():
+    clock = Clock()
+    cache = ResponseCache('test', ttl=10, stale_ttl=0, clock=clock)
+    upstream = Upstream()
+
+    assert await cache.get('a', upstream.load) == {'call': 1}
+    clock.now = 9
+    assert await cache.get('a', upstream.load) == {'call': 1}
+    assert upstream.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_expired_response_is_loaded_again():
+    clock = Clock()
+    cache = ResponseCache('test', ttl=10, stale_ttl=5, clock=clock)
+    upstream = Upstream()
+    await cache.get('a', upstream.load)
+
+    clock.now = 15
+    assert await cache.get('a', upstream.load) == {'call': 2}
+
+
+@pytest.mark.asyncio
+async def test_stale_response_is_served_while_it_refreshes():
+    clock = Clock()
+    cache = ResponseCache('test', ttl=10, stale_ttl=5, clock=clock)
+    upstream = Upstream()
+    await cache.get('a', upstream.load)
+
+    clock.now = 12
+    upstream.release.clear()
+    assert await cache.get('a', upstream.load) == {'call': 1}
+    assert await cache.get('a', upstream.load) == {'call': 1}
+    await asyncio.sleep(0)
+    # One refresh for both stale reads
+    assert upstream.calls == 2
+
+    upstream.release.set()
+    for _ in range(3):
+        await asyncio.sleep(0)
+    assert await cache.get('a', upstream.load) == {'call': 2}
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_call():
+    cache = ResponseCache('test')
+    upstream = Upstream()
+    upstream.release.clear()
+
+    waiters = [
+        asyncio.create_task(cache.get('a', upstream.load)) for _ in range(5)
+    ]
+    await asyncio.sleep(0)
+    upstream.release.set()
+
+    assert await asyncio.gather(*waiters) == [{'call': 1}] * 5
+    assert upstream.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_uncacheable_responses_are_not_kept():
+    cache = ResponseCache(
+        'test', cacheable=lambda response: response['call'] > 1
+    )
+    upstream = Upstream()
+
+    assert await cache.get('a', upstream.load) == {'call': 1}
+    assert len(cache) == 0
+    assert await cache.get('a', upstream.load) == {'call': 2}
+    assert await cache.get('a', upstream.load) == {'call': 2}
+
+
+@pytest.mark.asyncio
+async def test_least_recently_used_responses_are_dropped():
+    cache = ResponseCache('test', maxsize=2)
+    upstream = Upstream()
+    await cache.get('a', upstream.load)
+    await cache.get('b', upstream.load)
+    await cache.get('a', upstream.load)
+    await cache.get('c', upstream.load)
+
+    assert len(cache) == 2
+    assert await cache.get('a', upstream.load) == {'call': 1}
+    assert await cache.get('b', upstream.load) == {'call': 4}
@@ -0,0 +1,80 @@
+from typing import List, Optional
+
+import pytest
+
+from app.utils.broadcast import (
+    ABORTED, FINISHED, BroadcastCheckpoint, BroadcastJob, Broadcaster
+)
+from app.utils.broadcast import engine
+
+
+class FakeBot:
+    def __init__(self) -> None:
+        self.sent: List[int] = []
+
+    async def copy_message(self, chat_id, from_chat_id, message_id):
+        self.sent.append(chat_id)
+
+
+class FlakyRecipients:
+    """Ids 1..total; the first `failures` pages past `fail_after`
+    raise"""
+
+    def __init__(self, total: int, fail_after: int, failures: int) -> None:
+        self.ids: List[int] = list(range(1, total + 1))
+        self.fail_after: int = fail_after
+        self.failures: int = failures
+
+    async def count(self) -> int:
+        return len(self.ids)
+
+    async def page(self, after: Optional[int], limit: int) -> List[int]:
+        if (after or 0) >= self.fail_after and self.failures:
+            self.failures -= 1
+            raise ConnectionError("database is gone")
+        start = 0 if after is None else self.ids.index(after) + 1
+        return self.ids[start:start + limit]
+
+
+async def no_blocked(user_ids: List[int]) -> None:
+    pass
+
+
+def broadcaster(tmp_path, recipients: FlakyRecipients) -> Broadcaster:
+    return Broadcaster(
+        BroadcastCheckpoint(str(tmp_path / 'broadcast.json')),
+        lambda target: recipients, no_blocked,
+        concurrency=2, page_size=5
+    )
+
+
+@pytest.mark.asyncio
+async def test_failed_run_is_resumed_in_process(tmp_path, monkeypatch):
+    monkeypatch.setattr(engine, 'RUN_RETRY_DELAY', 0)
+    bot = FakeBot()
+    sender = broadcaster(tmp_path, FlakyRecipients(12, 5, 1))
+    job = BroadcastJob(1, 1, 'all', 1)
+
+    await sender.start(bot, job)
+
+    assert job.state == FINISHED
+    assert job.sent == 12
+    assert sorted(set(bot.sent)) == list(range(1, 13))
+    assert sender.store.load() is None
+
+
+@pytest.mark.asyncio
+async def test_broadcast_is_aborted_after_max_runs(tmp_path, monkeypatch):
+    monkeypatch.setattr(engine, 'RUN_RETRY_DELAY', 0)
+    sender = broadcaster(
+        tmp_path, FlakyRecipients(12, 5, engine.MAX_RUNS)
+    )
+    job = BroadcastJob(1, 1, 'all', 1)
+
+    await sender.start(FakeBot(), job)
+
+    assert job.state == ABORTED
+    assert job.done < 12
+    assert not sender.running
+    # Nothing is left for resume() and busy checks
+    assert sender.store.load() is None
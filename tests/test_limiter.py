@@ -0,0 +1,69 @@
+import pytest
+
+from app.utils.throttling.limiter import (
+    SlidingWindowLimiter, TokenBucketLimiter, create_limiter
+)
+
+
+def test_token_bucket_allows_a_burst_then_refills():
+    limiter = TokenBucketLimiter(3, 3.0)
+    assert all(limiter.hit('a', now=0.0).allowed for _ in range(3))
+
+    rejected = limiter.hit('a', now=0.0)
+    assert not rejected.allowed
+    assert rejected.retry_after == pytest.approx(1.0)
+
+    # One token per second
+    assert limiter.hit('a', now=1.0).allowed
+    assert not limiter.hit('a', now=1.0).allowed
+
+
+def test_only_the_first_rejection_of_a_streak_notifies():
+    limiter = TokenBucketLimiter(1, 10.0)
+    assert limiter.hit('a', now=0.0).allowed
+    assert limiter.hit('a', now=0.0).notify
+    assert not limiter.hit('a', now=1.0).notify
+
+    assert limiter.hit('a', now=20.0).allowed
+    assert limiter.hit('a', now=20.0).notify
+
+
+def test_sliding_window_weights_the_previous_window():
+    limiter = SlidingWindowLimiter(4, 10.0)
+    for moment in (8.0, 8.5, 9.0, 9.5):
+        assert limiter.hit('a', now=moment).allowed
+
+    # 60% of the previous window still counts: 4 * 0.6 + 2 is over 4
+    assert limiter.hit('a', now=14.0).allowed
+    assert limiter.hit('a', now=14.0).allowed
+    result = limiter.hit('a', now=14.0)
+    assert not result.allowed
+    # Until only half of it does
+    assert result.retry_after == pytest.approx(1.0)
+
+
+def test_keys_are_independent():
+    limiter = SlidingWindowLimiter(1, 10.0)
+    assert limiter.hit('a', now=0.0).allowed
+    assert not limiter.hit('a', now=0.0).allowed
+    assert limiter.hit('b', now=0.0).allowed
+
+
+def test_idle_and_excess_keys_are_evicted():
+    limiter = TokenBucketLimiter(1, 1.0, max_keys=2)
+    limiter.hit('a', now=0.0)
+    limiter.hit('b', now=0.0)
+    limiter.hit('c', now=0.0)
+    assert len(limiter) == 2
+
+    # Two periods idle
+    limiter.hit('d', now=5.0)
+    assert len(limiter) == 1
+
+
+def test_create_limiter_rejects_unknown_strategies():
+    assert isinstance(
+        create_limiter('token_bucket', 5, 1.0), TokenBucketLimiter
+    )
+    with pytest.raises(ValueError):
+        create_limiter('leaky_bucket', 5, 1.0)
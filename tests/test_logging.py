@@ -0,0 +1,39 @@
+import logging
+from dataclasses import replace
+
+import pytest
+
+from app.data.config import LoggingConfig
+from app.utils.misc.logging import (
+    LogQueueHandler, setup_logging, stop_logging
+)
+
+
+@pytest.fixture
+def root_handlers():
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    yield root
+    stop_logging()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    for handler in handlers:
+        root.addHandler(handler)
+    root.setLevel(level)
+
+
+def test_records_after_stop_logging_are_not_queued(root_handlers, tmp_path,
+                                                   capsys):
+    log_file = tmp_path / 'bot.log'
+    setup_logging(replace(LoggingConfig(), file=str(log_file)))
+    logging.getLogger('test').warning("before stop")
+
+    stop_logging()
+    logging.getLogger('test').warning("after stop")
+
+    assert not any(
+        isinstance(handler, LogQueueHandler)
+        for handler in root_handlers.handlers
+    )
+    assert "before stop" in log_file.read_text()
+    assert "after stop" in capsys.readouterr().err
@@ -0,0 +1,201 @@
+from typing import List
+
+import pytest
+from aiogram import Bot, types
+from aiogram.dispatcher.handler import CancelHandler
+
+from app.data.config import ThrottlingConfig
+from app.middleware.base import BaseCustomMiddleware
+from app.middleware.throttling import ThrottlingMiddleware
+from app.utils.routing import RoutedDispatcher
+from app.utils.throttling import MemoryThrottleBackend
+
+USER = {'id': 7, 'is_bot': False, 'first_name': 'Test'}
+
+
+def message_update(update_id: int, text: str, chat_id: int = 7,
+                   chat_type: str = 'private') -> types.Update:
+    return types.Update(**{
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': 0,
+            'chat': {'id': chat_id, 'type': chat_type},
+            'from': USER,
+            'text': text,
+            'entities': [
+                {'type': 'bot_command', 'offset': 0,
+                 'length': len(text.split()[0])}
+            ] if text.startswith('/') else [],
+        },
+    })
+
+
+def callback_update(update_id: int, data: str) -> types.Update:
+    return types.Update(**{
+        'update_id': update_id,
+        'callback_query': {
+            'id': str(update_id),
+            'from': USER,
+            'chat_instance': '1',
+            'data': data,
+        },
+    })
+
+
+@pytest.fixture
+def dispatcher():
+    bot = Bot('123456:' + 'A' * 35)
+    dp = RoutedDispatcher(bot)
+    handled: List[str] = []
+    notified: List[str] = []
+
+    @dp.message_handler(commands=['start', 'weather'])
+    async def command(message: types.Message):
+        handled.append(message.get_command(pure=True))
+
+    @dp.message_handler()
+    async def text(message: types.Message):
+        handled.append(message.text)
+
+    @dp.callback_query_handler()
+    async def button(call: types.CallbackQuery):
+        handled.append(call.data)
+
+    settings = ThrottlingConfig(
+        user_limit=2, user_period=60,
+        chat_limit=3, chat_period=60,
+        command_limits={'weather': (1, 60)}
+    )
+    middleware = ThrottlingMiddleware(settings, MemoryThrottleBackend())
+
+    async def notify(event, result):
+        notified.append(type(event).__name__)
+
+    middleware.notify = notify
+    dp.middleware.setup(middleware)
+    return dp, handled, notified
+
+
+@pytest.mark.asyncio
+async def test_user_limit_cancels_the_handler(dispatcher):
+    dp, handled, notified = dispatcher
+    for i in range(4):
+        await dp.process_update(message_update(i, f'hello {i}'))
+
+    assert handled == ['hello 0', 'hello 1']
+    # Only the first rejection of a streak is answered
+    assert notified == ['Message']
+
+
+@pytest.mark.asyncio
+async def test_callback_queries_share_the_user_limit(dispatcher):
+    dp, handled, notified = dispatcher
+    await dp.process_update(message_update(1, 'hello'))
+    await dp.process_update(callback_update(2, 'first'))
+    await dp.process_update(callback_update(3, 'second'))
+
+    assert handled == ['hello', 'first']
+    assert notified == ['CallbackQuery']
+
+
+@pytest.mark.asyncio
+async def test_command_limit(dispatcher):
+    dp, handled, notified = dispatcher
+    await dp.process_update(message_update(1, '/weather Paris'))
+    await dp.process_update(message_update(2, '/weather Rome'))
+
+    assert handled == ['weather']
+    assert notified == ['Message']
+
+
+@pytest.mark.asyncio
+async def test_chat_limit_in_groups():
+    bot = Bot('123456:' + 'A' * 35)
+    dp = RoutedDispatcher(bot)
+    handled: List[int] = []
+
+    @dp.message_handler()
+    async def text(message: types.Message):
+        handled.append(message.message_id)
+
+    settings = ThrottlingConfig(
+        user_limit=100, user_period=60,
+        chat_limit=2, chat_period=60,
+        command_limits={}
+    )
+    middleware = ThrottlingMiddleware(settings, MemoryThrottleBackend())
+
+    async def notify(event, result):
+        pass
+
+    middleware.notify = notify
+    dp.middleware.setup(middleware)
+    for i in range(3):
+        await dp.process_update(
+            message_update(i, 'hi', chat_id=-100, chat_type='group')
+        )
+    # Another chat is not affected
+    await dp.process_update(message_update(3, 'hi'))
+
+    assert handled == [0, 1, 3]
+
+
+class RecordingMiddleware(BaseCustomMiddleware):
+    def __init__(self, calls: List[str], cancel: bool = False) -> None:
+        super().__init__()
+        self.calls: List[str] = calls
+        self.cancel: bool = cancel
+
+    async def pre_process(self, event, data):
+        self.calls.append(f'{self.name}.pre')
+        if self.cancel:
+            raise CancelHandler()
+
+    async def post_process(self, event, data, result):
+        failed = ' failed' if self.handler_failed() else ''
+        self.calls.append(f'{self.name}.post{failed}')
+
+
+class CancellingMiddleware(RecordingMiddleware):
+    pass
+
+
+@pytest.mark.asyncio
+async def test_post_process_runs_when_the_handler_raises():
+    dp = RoutedDispatcher(Bot('123456:' + 'A' * 35))
+    calls: List[str] = []
+
+    @dp.message_handler()
+    async def text(message: types.Message):
+        calls.append('handler')
+        raise ValueError('boom')
+
+    dp.middleware.setup(RecordingMiddleware(calls))
+    with pytest.raises(ValueError):
+        await dp.process_update(message_update(1, 'hello'))
+
+    assert calls == [
+        'RecordingMiddleware.pre', 'handler',
+        'RecordingMiddleware.post failed',
+    ]
+
+
+@pytest.mark.asyncio
+async def test_post_process_runs_when_a_later_middleware_cancels():
+    dp = RoutedDispatcher(Bot('123456:' + 'A' * 35))
+    calls: List[str] = []
+
+    @dp.message_handler()
+    async def text(message: types.Message):
+        calls.append('handler')
+
+    dp.middleware.setup(RecordingMiddleware(calls))
+    dp.middleware.setup(CancellingMiddleware(calls, cancel=True))
+    await dp.process_update(message_update(1, 'hello'))
+
+    # The cancelling middleware did not complete its pre_process
+    assert calls == [
+        'RecordingMiddleware.pre', 'CancellingMiddleware.pre',
+        'RecordingMiddleware.post',
+    ]
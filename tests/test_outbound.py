@@ -0,0 +1,88 @@
+import asyncio
+from typing import List
+
+import pytest
+from aiogram.utils.exceptions import RetryAfter
+
+from app.utils.outbound import OutboundScheduler, bulk
+from app.utils.outbound.scheduler import TokenBucket
+
+
+def test_token_bucket_allows_a_burst_then_paces():
+    bucket = TokenBucket(rate=2.0, burst=3, now=0.0)
+    for _ in range(3):
+        assert bucket.delay(0.0) == 0.0
+        bucket.take(0.0)
+
+    assert bucket.delay(0.0) == pytest.approx(0.5)
+    assert bucket.delay(0.5) == 0.0
+    assert not bucket.full(0.5)
+    assert bucket.full(10.0)
+
+
+def fast_scheduler(**kwargs) -> OutboundScheduler:
+    settings = dict(global_rate=1000, chat_rate=1000, chat_burst=1000)
+    settings.update(kwargs)
+    return OutboundScheduler(**settings)
+
+
+def record(calls: List[str], name: str):
+    async def call():
+        calls.append(name)
+        return name
+    return call
+
+
+@pytest.mark.asyncio
+async def test_sends_of_a_chat_keep_their_order():
+    scheduler = fast_scheduler()
+    calls: List[str] = []
+
+    results = await asyncio.gather(*(
+        scheduler.submit(1, record(calls, str(i))) for i in range(10)
+    ))
+
+    assert calls == [str(i) for i in range(10)]
+    assert results == calls
+    await scheduler.close()
+
+
+@pytest.mark.asyncio
+async def test_replies_go_before_bulk_sends():
+    scheduler = fast_scheduler()
+    calls: List[str] = []
+
+    async def submit_bulk(chat_id: int):
+        with bulk():
+            await scheduler.submit(chat_id, record(calls, 'bulk'))
+
+    sends = [asyncio.create_task(submit_bulk(i)) for i in range(1, 4)]
+    sends.append(asyncio.create_task(
+        scheduler.submit(4, record(calls, 'reply'))
+    ))
+    await asyncio.gather(*sends)
+
+    assert calls[0] == 'reply'
+    await scheduler.close()
+
+
+@pytest.mark.asyncio
+async def test_retry_after_pauses_the_chat_and_retries():
+    scheduler = fast_scheduler()
+    attempts: List[int] = []
+
+    async def flooded():
+        attempts.append(len(attempts))
+        if len(attempts) == 1:
+            raise RetryAfter(0)
+        return 'sent'
+
+    assert await scheduler.submit(1, flooded) == 'sent'
+    assert len(attempts) == 2
+
+    async def always_flooded():
+        raise RetryAfter(0)
+
+    with pytest.raises(RetryAfter):
+        await scheduler.submit(1, always_flooded, retries=0)
+    await scheduler.close()
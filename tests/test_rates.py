@@ -0,0 +1,43 @@
+import pytest
+
+from app.api.rates import RatesSnapshot
+
+
+def snapshot() -> RatesSnapshot:
+    return RatesSnapshot(
+        {'USD': 1.0, 'EUR': 0.5, 'RUB': 100.0, 'XXX': 0.0},
+        fetched_at=1000.0
+    )
+
+
+def test_cross_rates_go_through_the_base():
+    rates = snapshot()
+    assert rates.rate('USD', 'EUR') == pytest.approx(0.5)
+    assert rates.rate('EUR', 'RUB') == pytest.approx(200.0)
+    assert rates.rate('RUB', 'RUB') == pytest.approx(1.0)
+    assert rates.convert(10, 'EUR', 'USD') == pytest.approx(20.0)
+
+
+def test_convert_many_keeps_the_order_of_targets():
+    rates = snapshot()
+    assert rates.convert_many(2, 'USD', ['RUB', 'EUR', 'USD']) == (
+        pytest.approx([200.0, 1.0, 2.0])
+    )
+
+
+def test_currencies_without_a_rate_are_left_out():
+    rates = snapshot()
+    assert rates.codes == ('EUR', 'RUB', 'USD')
+    assert 'XXX' not in rates
+    with pytest.raises(KeyError):
+        rates.rate('XXX', 'USD')
+
+
+def test_payload_without_rates_is_rejected():
+    with pytest.raises(ValueError):
+        RatesSnapshot({'USD': 0.0}, fetched_at=1000.0)
+
+
+def test_updated_at_defaults_to_the_fetch_time():
+    assert snapshot().updated_at == 1000.0
+    assert RatesSnapshot({'USD': 1}, 1000.0, 900.0).updated_at == 900.0
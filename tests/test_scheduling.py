@@ -0,0 +1,74 @@
+from typing import List
+
+import pytest
+
+from app.utils.scheduling import StateTracker
+from app.utils.scheduling.fair import FairQueue
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now: float = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_state_tracker_forgets_pairs_after_ttl():
+    clock = Clock()
+    states = StateTracker(ttl=60, clock=clock)
+    states.add((1, 1))
+    clock.now = 30
+    states.add((2, 2))
+
+    clock.now = 61
+    assert (1, 1) not in states
+    assert (2, 2) in states
+    assert len(states) == 1
+
+    # set_state again restarts the countdown
+    states.add((2, 2))
+    clock.now = 120
+    assert (2, 2) in states
+
+
+def test_state_tracker_drops_least_recently_set_pairs():
+    clock = Clock()
+    states = StateTracker(maxsize=2, clock=clock)
+    keys: List[tuple] = [(1, 1), (2, 2), (1, 1), (3, 3)]
+    for key in keys:
+        states.add(key)
+
+    assert (2, 2) not in states
+    assert (1, 1) in states and (3, 3) in states
+
+
+@pytest.mark.asyncio
+async def test_fair_queue_hands_out_weighted_turns():
+    queue: FairQueue[str] = FairQueue({'admin': 2, 'text': 1})
+    for i in range(4):
+        queue.put_nowait(f'text{i}', 'text')
+    for i in range(3):
+        queue.put_nowait(f'admin{i}', 'admin')
+
+    order = [await queue.get() for _ in range(7)]
+
+    assert order == [
+        'admin0', 'admin1', 'text0', 'admin2', 'text1', 'text2', 'text3'
+    ]
+    assert len(queue) == 0
+
+
+@pytest.mark.asyncio
+async def test_fair_queue_skips_empty_classes():
+    queue: FairQueue[str] = FairQueue({'admin': 8, 'text': 1})
+    queue.put_nowait('text0', 'text')
+    queue.put_nowait('text1', 'text')
+
+    assert [await queue.get(), await queue.get()] == ['text0', 'text1']
+    assert queue.sizes() == {'admin': 0, 'text': 0}
+
+
+def test_fair_queue_rejects_weights_below_one():
+    with pytest.raises(ValueError):
+        FairQueue({'admin': 1, 'text': 0})
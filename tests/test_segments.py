@@ -0,0 +1,108 @@
+from array import array
+from datetime import datetime, timedelta
+
+import pytest
+from peewee import (
+    BooleanField, DateTimeField, IntegerField, Model, SqliteDatabase
+)
+
+from app.utils.broadcast import (
+    Bitset, BitsetRecipients, Segment, SegmentIndex
+)
+from app.utils.broadcast import segments
+
+database = SqliteDatabase(':memory:')
+
+
+class Member(Model):
+    telegram_id = IntegerField()
+    is_banned = BooleanField(default=False)
+    last_activity = DateTimeField(default=datetime.now)
+
+    class Meta:
+        database = database
+
+
+@pytest.fixture
+def members():
+    database.connect()
+    database.create_tables([Member])
+    yield Member
+    database.drop_tables([Member])
+    database.close()
+
+
+async def run(function, *args):
+    return function(*args)
+
+
+def index_of(members) -> SegmentIndex:
+    return SegmentIndex(
+        members.select(), members.id, members.telegram_id,
+        {
+            'active': Segment(members.is_banned == False),  # noqa: E712
+            'recent': Segment(field=members.last_activity, days=7),
+        },
+        run
+    )
+
+
+def test_bitset_assigns_and_grows():
+    bits = Bitset()
+    bits.grow(20)
+    bits.assign(3, True)
+    bits.assign(17, True)
+    bits.assign(3, False)
+    assert bits.to_int() == 1 << 17
+
+
+@pytest.mark.asyncio
+async def test_bitset_recipients_page_in_slot_order(monkeypatch):
+    # Pages cross the chunks read at a time
+    monkeypatch.setattr(segments, 'SCAN_SLOTS', 8)
+    values = array('q', range(100, 140))
+    slots = [1, 2, 9, 15, 16, 30, 39]
+    recipients = BitsetRecipients(values, sum(1 << slot for slot in slots))
+
+    assert await recipients.count() == len(slots)
+    pages, after = [], None
+    while True:
+        page = await recipients.page(after, 3)
+        if not page:
+            break
+        pages.append(page)
+        after = page[-1]
+    assert pages == [[101, 102, 109], [115, 116, 130], [139]]
+
+    # A resumed broadcast goes on after its cursor
+    resumed = BitsetRecipients(values, sum(1 << slot for slot in slots))
+    assert await resumed.page(115, 2) == [116, 130]
+
+
+@pytest.mark.asyncio
+async def test_segment_index_combines_segments(members):
+    old = datetime.now() - timedelta(days=30)
+    members.create(telegram_id=1)
+    members.create(telegram_id=2, is_banned=True)
+    members.create(telegram_id=3, last_activity=old)
+    index = index_of(members)
+
+    await index.refresh()
+    recent_active = index.recipients(['active', 'recent'])
+    assert await recent_active.page(None, 10) == [1]
+    inactive = index.recipients(['active'], exclude=['recent'])
+    assert await inactive.page(None, 10) == [3]
+
+
+@pytest.mark.asyncio
+async def test_segment_index_reads_new_and_touched_rows(members):
+    members.create(telegram_id=1)
+    index = index_of(members)
+    await index.refresh()
+
+    members.create(telegram_id=2)
+    members.update(is_banned=True).where(members.telegram_id == 1).execute()
+    index.touch(1)
+    await index.refresh()
+
+    assert await index.recipients(['active']).page(None, 10) == [2]
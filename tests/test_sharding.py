@@ -0,0 +1,124 @@
+import asyncio
+import functools
+import json
+from typing import List
+
+import pytest
+from aiogram import Bot, Dispatcher, types
+
+from app.supervisor import Supervisor
+from app.utils.sharding import ShardRouter, ShardWorker, WorkerChannel
+from app.utils.sharding.protocol import read_frame
+
+
+def raw_update(update_id: int, chat_id: int) -> dict:
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': 0,
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': {'id': chat_id, 'is_bot': False, 'first_name': 'T'},
+            'text': str(update_id),
+        },
+    }
+
+
+def worker(path: str, handled: List[int]) -> ShardWorker:
+    dp = Dispatcher(Bot('123456:' + 'A' * 35))
+
+    @dp.message_handler()
+    async def handler(message: types.Message):
+        handled.append(message.message_id)
+
+    return ShardWorker(dp, path)
+
+
+@pytest.mark.asyncio
+async def test_route_returns_once_the_worker_acknowledged(tmp_path):
+    path = str(tmp_path / 'worker.sock')
+    handled: List[int] = []
+    shard = worker(path, handled)
+    serving = asyncio.create_task(shard.serve())
+
+    channel = WorkerChannel(0, path, retry_interval=0.01)
+    channel.start()
+    router = ShardRouter([channel])
+    await router.route([raw_update(i, 1) for i in range(5)])
+
+    assert channel.sent == 1
+    assert channel.pending == 0
+    await channel.close()
+    shard.stop()
+    await serving
+    await shard.close()
+    assert handled == [0, 1, 2, 3, 4]
+
+
+@pytest.mark.asyncio
+async def test_unacknowledged_frames_are_sent_again(tmp_path):
+    path = str(tmp_path / 'worker.sock')
+    received = []
+
+    # Takes one frame and dies before acknowledging it
+    async def crashing(reader, writer):
+        received.append(json.loads(await read_frame(reader)))
+        writer.close()
+
+    server = await asyncio.start_unix_server(crashing, path)
+    channel = WorkerChannel(0, path, retry_interval=0.01)
+    channel.start()
+    router = ShardRouter([channel])
+    routing = asyncio.create_task(router.route([raw_update(7, 1)]))
+    while not received:
+        await asyncio.sleep(0.01)
+    server.close()
+    await server.wait_closed()
+    assert not routing.done()
+
+    handled: List[int] = []
+    shard = worker(path, handled)
+    serving = asyncio.create_task(shard.serve())
+    await asyncio.wait_for(routing, 5)
+
+    await channel.close()
+    shard.stop()
+    await serving
+    await shard.close()
+    assert received[0]['updates'][0]['update_id'] == 7
+    assert handled == [7]
+
+
+@pytest.mark.asyncio
+async def test_events_reach_the_other_workers(tmp_path):
+    bot = Bot('123456:' + 'A' * 35)
+    supervisor = Supervisor(bot, 2)
+    events: List[List] = [[], []]
+    shards = []
+    for index in range(2):
+        path = str(tmp_path / f'worker-{index}.sock')
+        shard = ShardWorker(
+            Dispatcher(bot), path, on_event=events[index].append
+        )
+        shards.append((shard, asyncio.create_task(shard.serve())))
+        channel = WorkerChannel(index, path, retry_interval=0.01)
+        channel.on_event = functools.partial(supervisor.relay, index)
+        channel.start()
+        supervisor.channels.append(channel)
+
+    while any(channel._writer is None for channel in supervisor.channels):
+        await asyncio.sleep(0.01)
+    while not shards[0][0]._writers:
+        await asyncio.sleep(0.01)
+    shards[0][0].publish({'users': [42]})
+    for _ in range(100):
+        if events[1]:
+            break
+        await asyncio.sleep(0.01)
+
+    for channel in supervisor.channels:
+        await channel.close()
+    for shard, serving in shards:
+        shard.stop()
+        await serving
+    assert events == [[], [{'users': [42]}]]